@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from account.models import Customer, BankAccount, Transaction
+from account.models import Customer, BankAccount, Transaction, LedgerEntry, BalanceShard, BalanceSnapshot,\
+    ExchangeRate, OutboxEvent, OutboxOffset, IdempotencyKey, ApiRequestLog
 
 
 class CustomerAdmin(admin.ModelAdmin):
@@ -14,6 +15,46 @@ class BankAccountAdmin(admin.ModelAdmin):
 class TransactionAdmin(admin.ModelAdmin):
     pass
 
+
+class LedgerEntryAdmin(admin.ModelAdmin):
+    pass
+
+
+class BalanceShardAdmin(admin.ModelAdmin):
+    pass
+
+
+class BalanceSnapshotAdmin(admin.ModelAdmin):
+    pass
+
+
+class ExchangeRateAdmin(admin.ModelAdmin):
+    pass
+
+
+class OutboxEventAdmin(admin.ModelAdmin):
+    pass
+
+
+class OutboxOffsetAdmin(admin.ModelAdmin):
+    pass
+
+
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    pass
+
+
+class ApiRequestLogAdmin(admin.ModelAdmin):
+    pass
+
 admin.site.register(Customer, CustomerAdmin)
 admin.site.register(BankAccount, BankAccountAdmin)
 admin.site.register(Transaction, TransactionAdmin)
+admin.site.register(LedgerEntry, LedgerEntryAdmin)
+admin.site.register(BalanceShard, BalanceShardAdmin)
+admin.site.register(BalanceSnapshot, BalanceSnapshotAdmin)
+admin.site.register(ExchangeRate, ExchangeRateAdmin)
+admin.site.register(OutboxEvent, OutboxEventAdmin)
+admin.site.register(OutboxOffset, OutboxOffsetAdmin)
+admin.site.register(IdempotencyKey, IdempotencyKeyAdmin)
+admin.site.register(ApiRequestLog, ApiRequestLogAdmin)
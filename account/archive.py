@@ -0,0 +1,245 @@
+"""
+Archival of cold transaction history.
+
+``archive_transactions`` moves transactions of whole months older than a cutoff out of the database
+into one gzipped NDJSON file per month in ``TRANSACTION_ARCHIVE_DIR``. Every line is the transaction
+exactly as ``get-history`` renders it. The month is written to the file first and then removed from
+the database: a partition is dropped at once where the table is partitioned, see
+``account.partitions``, rows are deleted otherwise. Ledger entries stay in place.
+
+``get-history?archived=true`` reads the history of an account from the archive instead of the
+database. Files are in (date, id) order, only the files of months within the requested range and
+after the cursor are scanned, and scanning stops once a page is full.
+"""
+
+import gzip
+import heapq
+import json
+import os
+import re
+from datetime import datetime, timezone as dt_timezone
+from itertools import islice
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.utils.urls import replace_query_param
+
+from account.history import ASCENDING, DESCENDING, encode_position
+from account.models import Transaction
+from account.partitions import add_months, drop_partition, is_partitioned, month_start, partition_months
+from account.serializers import TRANSACTION_HISTORY_ENCODER
+from account.streaming import CONTENT_TYPES, ITERATOR_CHUNK_SIZE, NDJSON
+
+ARCHIVE_FILE = re.compile(r"^transactions-(\d{4})-(\d{2})\.ndjson\.gz$")
+
+
+def archive_path(month, directory=None):
+    return os.path.join(
+        directory or settings.TRANSACTION_ARCHIVE_DIR, "transactions-%04d-%02d.ndjson.gz" % (month.year, month.month)
+    )
+
+
+def archived_months(directory=None):
+    """ Returns the months which have an archive file, in ascending order """
+
+    directory = directory or settings.TRANSACTION_ARCHIVE_DIR
+    if not os.path.isdir(directory):
+        return []
+
+    months = []
+    for name in os.listdir(directory):
+        match = ARCHIVE_FILE.match(name)
+        if match:
+            months.append(datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=dt_timezone.utc))
+    return sorted(months)
+
+
+def _read_lines(path):
+    with gzip.open(path, "rb") as archive:
+        for line in archive:
+            line = line.rstrip(b"\n")
+            if line:
+                yield line
+
+
+def _position(item):
+    return parse_datetime(item["date"]), item["id"]
+
+
+def _write(path, lines):
+    # Written aside and renamed, a crash never leaves a truncated archive behind
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = path + ".partial"
+    lines = iter(lines)
+    with open(partial, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as archive:
+            while True:
+                chunk = list(islice(lines, ITERATOR_CHUNK_SIZE))
+                if not chunk:
+                    break
+                archive.write(b"".join(line + b"\n" for line in chunk))
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(partial, path)
+
+
+def _merged(archived, rows):
+    """
+    Merges two streams of (position, line) in (date, id) order into lines in that order, transactions
+    present in both keep their archived line
+    """
+
+    previous = None
+    for position, line in heapq.merge(archived, rows, key=itemgetter(0)):
+        if position != previous:
+            yield line
+        previous = position
+
+
+def archive_month(month, directory=None):
+    """
+    Moves the transactions of a month into its archive file and returns how many were moved.
+
+    Transactions are streamed from the database in (date, id) order and merged with the lines of the
+    existing file, if any, so memory stays constant whatever the size of the month. Transactions already
+    archived by an earlier run, which failed before removing them from the database, are written once only.
+    """
+
+    path = archive_path(month, directory)
+    archived = ()
+    if os.path.exists(path):
+        archived = ((_position(json.loads(line)), line) for line in _read_lines(path))
+
+    encoder = TRANSACTION_HISTORY_ENCODER
+    date, pk = encoder.column("date"), encoder.column("id")
+    transactions = Transaction.objects.filter(date__gte=month, date__lt=add_months(month, 1))
+    moved = 0
+
+    def encoded(rows):
+        nonlocal moved
+        for row in rows:
+            moved += 1
+            yield (row[date], row[pk]), encoder.encode(row)
+
+    with db_transaction.atomic():
+        rows = encoder.rows(transactions.order_by("date", "id")).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+        _write(path, _merged(archived, encoded(rows)))
+
+        if not (is_partitioned() and drop_partition(month)):
+            transactions.delete()
+    return moved
+
+
+def archive_transactions(older_than_months=None, directory=None, now=None):
+    """
+    Archives every month which ended more than ``older_than_months`` months ago,
+    ``TRANSACTION_ARCHIVE_AFTER_MONTHS`` by default, yields (month, transactions moved) for each.
+    """
+
+    if older_than_months is None:
+        older_than_months = settings.TRANSACTION_ARCHIVE_AFTER_MONTHS
+    cutoff = add_months(month_start(now or timezone.now()), -older_than_months)
+
+    months = set(Transaction.objects.filter(date__lt=cutoff).datetimes("date", "month", tzinfo=dt_timezone.utc))
+    if is_partitioned():
+        # Empty partitions of old months go as well
+        months.update(month for month in partition_months() if month < cutoff)
+    for month in sorted(months):
+        yield month, archive_month(month, directory)
+
+
+def _skipped(month, since, until, direction, after):
+    """ Whether none of the transactions of a month are within since/until and after the cursor """
+
+    end = add_months(month, 1)
+    if since is not None and end <= since or until is not None and month >= until:
+        return True
+    if after is None:
+        return False
+    return end <= after[0] if direction != DESCENDING else month > after[0]
+
+
+def _month_history(account_id, path, since, until, direction, after):
+    """ Yields ((date, id), line) of the transactions of the account in an archive file, in (date, id) order """
+
+    for line in _read_lines(path):
+        item = json.loads(line)
+        if account_id not in (item["sender_account"], item["recipient_account"]):
+            continue
+        position = _position(item)
+        if until is not None and position[0] >= until:
+            # Lines are in (date, id) order, the rest of the file is past ``until``
+            return
+        if since is not None and position[0] < since:
+            continue
+        if after is not None and (position <= after if direction != DESCENDING else position >= after):
+            continue
+        yield position, line
+
+
+def archived_history(account_id, since=None, until=None, direction=ASCENDING, after=None, directory=None):
+    """
+    Yields ((date, id), line) of archived transactions sent or received by the account ordered by
+    (date, id), ``line`` being the transaction rendered as JSON. Arguments are the ones of
+    ``account_history``. Only the archive files of months within since/until and after the cursor are
+    read, lazily: ascending history is yielded as the file is read, descending history a month at a time,
+    so a page stops reading files once it is full.
+    """
+
+    try:
+        account_id = int(account_id)
+    except (TypeError, ValueError):
+        return
+
+    months = archived_months(directory)
+    if direction == DESCENDING:
+        months.reverse()
+
+    for month in months:
+        if _skipped(month, since, until, direction, after):
+            continue
+
+        rows = _month_history(account_id, archive_path(month, directory), since, until, direction, after)
+        if direction == DESCENDING:
+            rows = reversed(list(rows))
+        yield from rows
+
+
+def archived_history_response(request, account_id, params):
+    """
+    Renders archived history the way get-history renders history from the database, for the same
+    query parameters. Archived history is cold, responses are built in memory rather than streamed.
+    """
+
+    rows = archived_history(
+        account_id,
+        since=params.get("since"),
+        until=params.get("until"),
+        direction=params["direction"],
+        after=params.get("cursor"),
+    )
+
+    if "stream" in params:
+        lines = [line for _, line in rows]
+        if params["stream"] == NDJSON:
+            content = b"".join(line + b"\n" for line in lines)
+        else:
+            content = b"[" + b",".join(lines) + b"]"
+        return HttpResponse(content, content_type=CONTENT_TYPES[params["stream"]])
+
+    if "limit" not in params and "cursor" not in params:
+        return HttpResponse(b"[" + b",".join(line for _, line in rows) + b"]", content_type="application/json")
+
+    limit = params.get("limit", settings.HISTORY_PAGE_SIZE)
+    page = list(islice(rows, limit + 1))
+    next_url = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_url = replace_query_param(request.build_absolute_uri(), "cursor", encode_position(*page[-1][0]))
+
+    content = b'{"next":%s,"results":[%s]}' % (json.dumps(next_url).encode(), b",".join(line for _, line in page))
+    return HttpResponse(content, content_type="application/json")
@@ -0,0 +1,193 @@
+"""
+Async-native read endpoints.
+
+DRF viewsets are synchronous, under an ASGI server each of their requests holds a worker thread for
+the whole duration of its queries. These views serve the same routes, with the same responses, on
+top of Django's async ORM, see ``mock_api.async_urls`` and the ``ASYNC_READ_ENDPOINTS`` setting.
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.urls import replace_query_param
+
+from account.archive import archived_history_response
+from account.cache import acached_account, acached_customer_accounts
+from account.encoders import fast_serialization
+from account.events import async_event_stream_response, events_query, start_position
+from account.history import account_history, encode_cursor, encode_position
+from account.metrics import serialization
+from account.models import BankAccount, Customer
+from account.serializers import TransactionHistoryResponseSerializer, BankingAccountResponseSerializer,\
+    HistoryQuerySerializer, EventsQuerySerializer, StatementQuerySerializer, TRANSACTION_HISTORY_ENCODER
+from account.shards import total_balance, with_total_balance
+from account.statements import account_statement, customer_statement, statement_response
+from account.streaming import async_streaming_response
+
+
+def _response(data, status=status.HTTP_200_OK):
+    # Rendered the same way DRF renders responses of the sync views
+    with serialization():
+        content = JSONRenderer().render(data)
+    return HttpResponse(content, status=status, content_type="application/json")
+
+
+def _error_response(e):
+    # Mirrors ``raise APIException(e)`` of the sync views
+    return _response({"detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+async def _load_account(pk):
+    return dict(BankingAccountResponseSerializer(total_balance(await with_total_balance(BankAccount.objects).aget(id=pk))).data)
+
+
+async def _load_customer_accounts(pk):
+    owner = await Customer.objects.aget(pk=pk)
+    accounts = [total_balance(account) async for account in with_total_balance(BankAccount.objects.filter(owner=owner))]
+    return [dict(account) for account in BankingAccountResponseSerializer(accounts, many=True).data]
+
+
+async def _load_accounts(account_ids):
+    accounts = [total_balance(account) async for account in with_total_balance(BankAccount.objects.filter(pk__in=account_ids))]
+    return [dict(account) for account in BankingAccountResponseSerializer(accounts, many=True).data]
+
+
+@require_GET
+async def get_balance(request, pk):
+    try:
+        return _response(await acached_account(pk, _load_account))
+    except ObjectDoesNotExist:
+        return _response({"detail": "Banking account with id %s does not exist" % pk}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return _error_response(e)
+
+
+@require_GET
+async def get_history(request, pk):
+    try:
+        query = HistoryQuerySerializer(data=request.GET)
+        if not query.is_valid():
+            return _response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        params = query.validated_data
+        if params["archived"]:
+            # Archive files are read in a worker thread
+            return await sync_to_async(archived_history_response)(request, pk, params)
+
+        paginate = "stream" not in params and ("limit" in params or "cursor" in params)
+        limit = params.get("limit", settings.HISTORY_PAGE_SIZE)
+        transactions = account_history(
+            pk,
+            since=params.get("since"),
+            until=params.get("until"),
+            direction=params["direction"],
+            after=params.get("cursor"),
+            limit=limit + 1 if paginate else None
+        )
+
+        if fast_serialization(request):
+            return await _encoded_history(request, transactions, params, paginate, limit)
+
+        if "stream" in params:
+            return async_streaming_response(transactions, TransactionHistoryResponseSerializer(), params["stream"])
+
+        if not paginate:
+            history = TransactionHistoryResponseSerializer([t async for t in transactions], many=True)
+            return _response(history.data)
+
+        page = [t async for t in transactions[:limit + 1]]
+        next_url = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_url = replace_query_param(request.build_absolute_uri(), "cursor", encode_cursor(page[-1]))
+
+        history = TransactionHistoryResponseSerializer(page, many=True)
+        return _response({"next": next_url, "results": history.data})
+    except Exception as e:
+        return _error_response(e)
+
+
+async def _encoded_history(request, transactions, params, paginate, limit):
+    # Mirrors BankingAccountsViewSet._encoded_history
+    encoder = TRANSACTION_HISTORY_ENCODER
+    if "stream" in params:
+        return async_streaming_response(transactions, encoder, params["stream"])
+
+    if not paginate:
+        rows = [row async for row in encoder.rows(transactions)]
+        with serialization():
+            return HttpResponse(encoder.encode_many(rows), content_type="application/json")
+
+    page = [row async for row in encoder.rows(transactions)[:limit + 1]]
+    next_url = None
+    if len(page) > limit:
+        page = page[:limit]
+        last = page[-1]
+        cursor = encode_position(last[encoder.column("date")], last[encoder.column("id")])
+        next_url = replace_query_param(request.build_absolute_uri(), "cursor", cursor)
+
+    with serialization():
+        content = encoder.encode_page(page, next_url)
+    return HttpResponse(content, content_type="application/json")
+
+
+@require_GET
+async def get_balances(request, pk):
+    try:
+        return _response(await acached_customer_accounts(pk, _load_customer_accounts, _load_accounts))
+    except ObjectDoesNotExist:
+        return _response({"detail": "Account with id %s does not exist" % pk}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return _error_response(e)
+
+
+@require_GET
+async def get_events(request, pk):
+    try:
+        query = EventsQuerySerializer(data=events_query(request.GET, request.headers))
+        if not query.is_valid():
+            return _response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        account_id = await BankAccount.objects.values_list("pk", flat=True).aget(pk=pk)
+        position = await sync_to_async(start_position)(query.validated_data)
+        return async_event_stream_response(account_id, position, query.validated_data)
+    except ObjectDoesNotExist:
+        return _response({"detail": "Banking account with id %s does not exist" % pk}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return _error_response(e)
+
+
+async def _statement(request, pk, statement, filename):
+    query = StatementQuerySerializer(data=request.GET)
+    if not query.is_valid():
+        return _response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    params = query.validated_data
+    # Unknown ids raise right away, reading the rows is deferred to the iteration of the response
+    rows = await sync_to_async(statement)(pk, params["since"], params.get("until"))
+    return statement_response(request, rows, filename % pk, params["stream"], params["gzip"], asynchronous=True)
+
+
+@require_GET
+async def get_account_statement(request, pk):
+    try:
+        return await _statement(request, pk, account_statement, "statement-account-%s")
+    except ObjectDoesNotExist:
+        return _response({"detail": "Banking account with id %s does not exist" % pk}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return _error_response(e)
+
+
+@require_GET
+async def get_customer_statement(request, pk):
+    try:
+        return await _statement(request, pk, customer_statement, "statement-customer-%s")
+    except ObjectDoesNotExist:
+        return _response({"detail": "Customer with id %s does not exist" % pk}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return _error_response(e)
@@ -0,0 +1,248 @@
+import threading
+import uuid
+
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.db import transaction as db_transaction
+
+from account.replicas import current_replica
+
+BALANCE_CACHE = "balances"
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _cache():
+    return caches[BALANCE_CACHE]
+
+
+def _count(hits=0, misses=0):
+    with _stats_lock:
+        _stats["hits"] += hits
+        _stats["misses"] += misses
+
+
+def _cache_id(pk):
+    """ Normalizes a primary key for a cache key, None when it is not a valid id or caching is disabled """
+
+    if isinstance(_cache(), DummyCache):
+        # Saves the round trips, a thread hop each on the async path, to a cache which never hits
+        return None
+    try:
+        return int(pk)
+    except (TypeError, ValueError):
+        return None
+
+
+def _storable():
+    # Replicas may lag behind the invalidations made by transfers, balances read from them aren't cached
+    return current_replica() is None
+
+
+def account_key(pk):
+    return "account:%s" % pk
+
+
+def customer_key(pk):
+    return "customer:%s" % pk
+
+
+def generation_key(key):
+    return "generation:%s" % key
+
+
+def _new_generation():
+    return uuid.uuid4().hex
+
+
+def _current(found, keys):
+    """
+    Splits the entries of ``keys`` read along with their generations into the values cached under the
+    current generation of their key and the generation of every key, which misses are stored under.
+    Returns (values, generations, new generations to store for keys without one).
+
+    Generations are read before loading on a miss and bumped when transfers commit, so a reader which
+    loaded a balance before a transfer committed stores it under a generation nobody reads anymore.
+    """
+
+    values, generations, new = {}, {}, {}
+    for key in keys:
+        generation = found.get(generation_key(key))
+        if generation is None:
+            generation = new[generation_key(key)] = _new_generation()
+        generations[key] = generation
+        entry = found.get(key)
+        if entry is not None and entry[0] == generation:
+            values[key] = entry[1]
+    return values, generations, new
+
+
+def _read(cache, keys):
+    """ Reads cached values of ``keys`` with their generations in a single round trip, see _current """
+
+    values, generations, new = _current(cache.get_many(keys + [generation_key(key) for key in keys]), keys)
+    if new:
+        # Generations outlive the entries, an evicted one only turns the entries of its key into misses
+        cache.set_many(new, timeout=None)
+    return values, generations
+
+
+async def _aread(cache, keys):
+    values, generations, new = _current(await cache.aget_many(keys + [generation_key(key) for key in keys]), keys)
+    if new:
+        await cache.aset_many(new, timeout=None)
+    return values, generations
+
+
+def _entries(accounts, generations):
+    return {
+        account_key(account["id"]): (generations[account_key(account["id"])], account) for account in accounts
+    }
+
+
+def cache_stats():
+    """ Returns hit and miss counters of the balance cache in this process """
+
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.update(hits=0, misses=0)
+
+
+def cached_account(pk, load):
+    """ Returns the representation of a banking account, calling load(pk) and caching its result on a miss """
+
+    cache_id = _cache_id(pk)
+    if cache_id is None:
+        # Malformed ids are reported by the loader, without caching it is all there is
+        return load(pk)
+
+    cache = _cache()
+    key = account_key(cache_id)
+    values, generations = _read(cache, [key])
+    if key in values:
+        _count(hits=1)
+        return values[key]
+
+    _count(misses=1)
+    data = load(cache_id)
+    if _storable():
+        cache.set(key, (generations[key], data))
+    return data
+
+
+def cached_customer_accounts(pk, load, load_accounts):
+    """
+    Returns representations of all banking accounts of a customer.
+
+    The customer entry only holds account ids, balances are shared with the per-account entries, so a
+    transfer only has to invalidate the two accounts it touched. On a customer miss ``load(pk)`` returns
+    all account representations, accounts missing from the cache are fetched with ``load_accounts(ids)``.
+    Balances loaded on a customer miss aren't cached, the generations of their accounts weren't known
+    before loading them, see _current.
+    """
+
+    cache_id = _cache_id(pk)
+    if cache_id is None:
+        return load(pk)
+
+    cache = _cache()
+    key = customer_key(cache_id)
+    values, generations = _read(cache, [key])
+    if key not in values:
+        _count(misses=1)
+        accounts = load(cache_id)
+        if _storable():
+            cache.set(key, (generations[key], [account["id"] for account in accounts]))
+        return accounts
+
+    account_ids = values[key]
+    cached, generations = _read(cache, [account_key(account_id) for account_id in account_ids])
+    missing = [account_id for account_id in account_ids if account_key(account_id) not in cached]
+    _count(hits=len(account_ids) - len(missing) + 1, misses=len(missing))
+    if missing:
+        loaded = load_accounts(missing)
+        if _storable():
+            cache.set_many(_entries(loaded, generations))
+        cached.update((account_key(account["id"]), account) for account in loaded)
+
+    return [cached[account_key(account_id)] for account_id in account_ids if account_key(account_id) in cached]
+
+
+async def acached_account(pk, load):
+    """ Async counterpart of cached_account, ``load`` is a coroutine function """
+
+    cache_id = _cache_id(pk)
+    if cache_id is None:
+        return await load(pk)
+
+    cache = _cache()
+    key = account_key(cache_id)
+    values, generations = await _aread(cache, [key])
+    if key in values:
+        _count(hits=1)
+        return values[key]
+
+    _count(misses=1)
+    data = await load(cache_id)
+    if _storable():
+        await cache.aset(key, (generations[key], data))
+    return data
+
+
+async def acached_customer_accounts(pk, load, load_accounts):
+    """ Async counterpart of cached_customer_accounts, ``load`` and ``load_accounts`` are coroutine functions """
+
+    cache_id = _cache_id(pk)
+    if cache_id is None:
+        return await load(pk)
+
+    cache = _cache()
+    key = customer_key(cache_id)
+    values, generations = await _aread(cache, [key])
+    if key not in values:
+        _count(misses=1)
+        accounts = await load(cache_id)
+        if _storable():
+            await cache.aset(key, (generations[key], [account["id"] for account in accounts]))
+        return accounts
+
+    account_ids = values[key]
+    cached, generations = await _aread(cache, [account_key(account_id) for account_id in account_ids])
+    missing = [account_id for account_id in account_ids if account_key(account_id) not in cached]
+    _count(hits=len(account_ids) - len(missing) + 1, misses=len(missing))
+    if missing:
+        loaded = await load_accounts(missing)
+        if _storable():
+            await cache.aset_many(_entries(loaded, generations))
+        cached.update((account_key(account["id"]), account) for account in loaded)
+
+    return [cached[account_key(account_id)] for account_id in account_ids if account_key(account_id) in cached]
+
+
+def _bump(cache, keys):
+    cache.set_many({generation_key(key): _new_generation() for key in keys}, timeout=None)
+
+
+def _bump_now_and_on_commit(keys):
+    # Bumping right away keeps this request consistent, bumping again after commit orphans entries
+    # that concurrent readers stored from state loaded before the commit, see _current
+    cache = _cache()
+    _bump(cache, keys)
+    db_transaction.on_commit(lambda: _bump(cache, keys))
+
+
+def invalidate_accounts(account_ids):
+    """ Drops cached balances of the given banking accounts """
+
+    _bump_now_and_on_commit([account_key(pk) for pk in account_ids])
+
+
+def invalidate_customers(customer_ids):
+    """ Drops cached account lists of the given customers """
+
+    _bump_now_and_on_commit([customer_key(pk) for pk in customer_ids])
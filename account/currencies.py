@@ -0,0 +1,80 @@
+"""
+Compact currency columns.
+
+django-money keeps the currency of every money field in a column of its own, a 3 letter code repeated
+on every row with choices listing every currency py-moneyed knows. ``MoneyField`` here adds a
+``CurrencyField`` storing the ISO 4217 numeric code of the currency in a smallint column instead,
+choices are limited to the ``CURRENCIES`` setting. Currencies still read and write as 3 letter codes,
+the mapping between both is built once per process from ``CURRENCIES``.
+"""
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from djmoney.models import fields as money_fields
+from djmoney.utils import get_currency_field_name
+from moneyed import CURRENCIES
+
+
+def _numbers(codes):
+    numbers = {}
+    for code in codes:
+        if code not in CURRENCIES or not CURRENCIES[code].numeric:
+            raise ImproperlyConfigured("Currency %s has no ISO 4217 numeric code" % code)
+        numbers[code] = int(CURRENCIES[code].numeric)
+    if len(set(numbers.values())) != len(numbers):
+        raise ImproperlyConfigured("CURRENCIES share ISO 4217 numeric codes: %s" % ", ".join(codes))
+    return numbers
+
+
+# ISO 4217 numeric codes by currency code, and the other way round
+NUMBERS = _numbers(settings.CURRENCIES)
+CODES = {number: code for code, number in NUMBERS.items()}
+
+
+def currency_number(code):
+    """ Returns the stored numeric code of a currency, raises ValueError for currencies not in CURRENCIES """
+
+    try:
+        return NUMBERS[code]
+    except KeyError:
+        raise ValueError("Currency %s is not one of CURRENCIES" % code)
+
+
+class CurrencyField(money_fields.CurrencyField):
+    """ Currency of a money field stored as its ISO 4217 numeric code, read back as its 3 letter code """
+
+    description = "A currency stored as its ISO 4217 numeric code"
+
+    def get_internal_type(self):
+        return "PositiveSmallIntegerField"
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else CODES[value]
+
+    def to_python(self, value):
+        if isinstance(value, int):
+            return CODES[value]
+        return super().to_python(value)
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        return None if value is None else currency_number(value)
+
+
+class MoneyField(money_fields.MoneyField):
+    """ django-money's MoneyField with its currency kept in a CurrencyField above """
+
+    def add_currency_field(self, cls, name):
+        currency_field = CurrencyField(
+            price_field=self,
+            max_length=self.currency_max_length,
+            default=self.default_currency,
+            editable=False,
+            choices=self.currency_choices,
+            null=self.null,
+        )
+        currency_field.creation_counter = self.creation_counter - 1
+        cls.add_to_class(get_currency_field_name(name, self), currency_field)
+        self._currency_field = currency_field
+
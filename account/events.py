@@ -0,0 +1,137 @@
+"""
+Server-Sent Events streams of the outbox events of a banking account.
+
+A stream sends the events of an account with ids after a position: the Last-Event-ID header of a client
+reconnecting, the ``after`` query parameter, or otherwise the id up to which events are settled when the
+stream opens. It looks for new events every ``EVENTS_POLL_INTERVAL`` seconds, up to the horizon of the
+process, see ``account.outbox.HORIZON``, so streams cost one indexed query per poll however many events
+are written meanwhile. A comment is sent after ``EVENTS_HEARTBEAT_INTERVAL`` seconds without events so
+proxies keep the connection open, and the stream ends after ``seconds``, ``EVENTS_STREAM_SECONDS`` at
+most; EventSource clients connect again on their own with the id of the last event they got. Streams are
+only served by the async views of ``ASYNC_READ_ENDPOINTS``, where they wait on the event loop instead of
+holding a worker.
+"""
+
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from account.outbox import HORIZON, account_events
+
+EVENT_STREAM = "text/event-stream"
+
+LAST_EVENT_ID_HEADER = "Last-Event-ID"
+
+HEARTBEAT = b": heartbeat\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """ Accepts requests for text/event-stream, streams bypass renderers and errors are rendered as JSON """
+
+    media_type = EVENT_STREAM
+    format = "event-stream"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data)
+
+
+def events_query(request_params, headers):
+    """ Returns the query parameters of a stream, the Last-Event-ID header taking the place of ``after`` """
+
+    data = request_params.copy()
+    if LAST_EVENT_ID_HEADER in headers:
+        data["after"] = headers[LAST_EVENT_ID_HEADER]
+    return data
+
+
+def _frame(pk, topic, payload):
+    return ("id: %d\nevent: %s\ndata: %s\n\n" % (pk, topic, payload)).encode()
+
+
+def start_position(params):
+    """ Returns the id a stream sends events after """
+
+    after = params.get("after")
+    return HORIZON.position() if after is None else after
+
+
+def _poll(account_id, position):
+    """ Returns the next events of an account after ``position`` and the position to poll from next """
+
+    until = HORIZON.position()
+    events = account_events(account_id, position, until, settings.OUTBOX_BATCH_SIZE)
+    if len(events) == settings.OUTBOX_BATCH_SIZE:
+        return events, events[-1][0]
+    # No event of the account up to the horizon is left
+    return events, max(position, until)
+
+
+class _Stream:
+    """ Timing of a stream: when it ends and when the next heartbeat is due """
+
+    def __init__(self, seconds):
+        now = time.monotonic()
+        self.deadline = now + seconds
+        self.heartbeat = now + settings.EVENTS_HEARTBEAT_INTERVAL
+
+    def frames(self, events):
+        now = time.monotonic()
+        frames = [_frame(*event) for event in events]
+        if frames:
+            self.heartbeat = now + settings.EVENTS_HEARTBEAT_INTERVAL
+        elif now >= self.heartbeat:
+            frames.append(HEARTBEAT)
+            self.heartbeat = now + settings.EVENTS_HEARTBEAT_INTERVAL
+        return frames
+
+    def wait(self, events):
+        """ Seconds to wait before the next poll, None once the stream is over """
+
+        now = time.monotonic()
+        if now >= self.deadline:
+            return None
+        # A full batch means more events are waiting
+        if len(events) == settings.OUTBOX_BATCH_SIZE:
+            return 0
+        return min(settings.EVENTS_POLL_INTERVAL, self.deadline - now)
+
+
+async def aiter_events(account_id, position, seconds):
+    """
+    Yields the frames of an event stream, starting with a comment so the response headers go out, polling
+    in a worker thread
+    """
+
+    stream = _Stream(seconds)
+    poll = sync_to_async(_poll)
+    yield HEARTBEAT
+    while True:
+        events, position = await poll(account_id, position)
+        for frame in stream.frames(events):
+            yield frame
+        wait = stream.wait(events)
+        if wait is None:
+            return
+        await asyncio.sleep(wait)
+
+
+def async_event_stream_response(account_id, position, params):
+    """
+    Streams the events of an account after ``position``, see ``start_position``, for the validated
+    EventsQuerySerializer parameters
+    """
+
+    response = StreamingHttpResponse(
+        aiter_events(account_id, position, params.get("seconds", settings.EVENTS_STREAM_SECONDS)),
+        content_type=EVENT_STREAM
+    )
+    response["Cache-Control"] = "no-cache"
+    # Keeps nginx from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,164 @@
+"""
+Currency conversion of transfers between banking accounts held in different currencies.
+
+Exchange rates are read from a local CSV file into ``ExchangeRate`` rows by ``load_exchange_rates``,
+every load being a new version. Every process keeps the rates of the latest version in memory,
+``RATES``, and checks for a newer one at most every ``EXCHANGE_RATES_REFRESH_INTERVAL`` seconds, so
+converting a transfer costs no query. Rates are kept as exact fractions, the rate of the opposite pair
+being the inverse fraction unless the file gives it. Amounts are converted in integer minor units and
+rounded half to even, the same way one at a time and in batches, see ``convert`` and ``convert_many``.
+"""
+
+import csv
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Max
+
+from account.models import ExchangeRate
+from account.money import from_minor, to_minor
+
+# Versions of exchange rates kept by load_exchange_rates, older ones are deleted
+KEEP_VERSIONS = 10
+
+RATE_FIELD = ExchangeRate._meta.get_field("rate")
+
+
+class ExchangeRateUnavailable(LookupError):
+    """ No exchange rate is loaded for a currency pair """
+
+    def __init__(self, source, target):
+        super().__init__("No exchange rate from %s to %s" % (source, target))
+        self.source = source
+        self.target = target
+
+
+def _fractions(rates):
+    """ Builds {(source, target): (numerator, denominator)} from (base, quote, rate) rows, inverses included """
+
+    fractions = {}
+    for base, quote, rate in rates:
+        fractions[base, quote] = Decimal(rate).as_integer_ratio()
+    for (base, quote), (numerator, denominator) in list(fractions.items()):
+        fractions.setdefault((quote, base), (denominator, numerator))
+    return fractions
+
+
+class RateCache:
+    """ Exchange rates of the latest version in this process """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self._fractions = {}
+        self._checked = None
+
+    def fractions(self):
+        """ Returns the rates, looking for a newer version first when the refresh interval has passed """
+
+        checked = self._checked
+        if checked is None or time.monotonic() - checked >= settings.EXCHANGE_RATES_REFRESH_INTERVAL:
+            self.refresh()
+        return self._fractions
+
+    def refresh(self):
+        """ Reads the latest version of the rates unless it is the one already held """
+
+        with self._lock:
+            version = ExchangeRate.objects.aggregate(version=Max("version"))["version"]
+            if version != self.version:
+                self._fractions = _fractions(
+                    ExchangeRate.objects.filter(version=version).values_list("base", "quote", "rate")
+                )
+                self.version = version
+            self._checked = time.monotonic()
+
+    def clear(self):
+        """ Forgets the rates, the next conversion reads them again """
+
+        with self._lock:
+            self.version = None
+            self._fractions = {}
+            self._checked = None
+
+    def rate(self, source, target):
+        """ Returns the rate of a currency pair as a (numerator, denominator) fraction """
+
+        try:
+            return self.fractions()[source, target]
+        except KeyError:
+            raise ExchangeRateUnavailable(source, target)
+
+
+RATES = RateCache()
+
+
+def _convert_units(units, numerator, denominator):
+    # Rounds half to even, the remainder of a floor division being within [0, denominator)
+    quotient, remainder = divmod(units * numerator, denominator)
+    if 2 * remainder > denominator or (2 * remainder == denominator and quotient & 1):
+        quotient += 1
+    return quotient
+
+
+def convert(amount, source, target):
+    """ Converts a decimal amount from the ``source`` currency to the ``target`` one """
+
+    if source == target:
+        return amount
+    return from_minor(_convert_units(to_minor(amount), *RATES.rate(source, target)))
+
+
+def convert_many(amounts, source, target):
+    """ Converts decimal amounts of a currency pair at once, giving the same results as ``convert`` """
+
+    if source == target:
+        return list(amounts)
+    numerator, denominator = RATES.rate(source, target)
+    return [from_minor(_convert_units(to_minor(amount), numerator, denominator)) for amount in amounts]
+
+
+def read_rates(path):
+    """
+    Reads (base, quote, rate) rows from a CSV file with a ``base,quote,rate`` header, raises ValueError
+    for currencies not in CURRENCIES, rates which aren't positive or have more decimal places than the
+    rate column, and pairs given twice
+    """
+
+    rates, pairs = [], set()
+    with open(path, newline="") as rates_file:
+        for line, row in enumerate(csv.DictReader(rates_file), start=2):
+            try:
+                base, quote, rate = row["base"].strip(), row["quote"].strip(), Decimal(row["rate"].strip())
+            except (AttributeError, KeyError, InvalidOperation):
+                raise ValueError("Line %s: expected base, quote and rate" % line)
+            for currency in (base, quote):
+                if currency not in settings.CURRENCIES:
+                    raise ValueError("Line %s: currency %s is not one of CURRENCIES" % (line, currency))
+            if base == quote or not rate.is_finite() or rate <= 0 or rate != round(rate, RATE_FIELD.decimal_places):
+                raise ValueError("Line %s: invalid rate %s for %s/%s" % (line, rate, base, quote))
+            if (base, quote) in pairs:
+                raise ValueError("Line %s: %s/%s is given twice" % (line, base, quote))
+            pairs.add((base, quote))
+            rates.append((base, quote, rate))
+    return rates
+
+
+def load_rates(rates, keep=KEEP_VERSIONS):
+    """
+    Writes (base, quote, rate) rows as a new version of the exchange rates, deletes versions beyond the
+    latest ``keep`` ones and returns the new version number
+    """
+
+    with db_transaction.atomic():
+        # Concurrent loads would race for the same version number, the unique constraint stops the later one
+        version = (ExchangeRate.objects.aggregate(version=Max("version"))["version"] or 0) + 1
+        ExchangeRate.objects.bulk_create([
+            ExchangeRate(version=version, base=base, quote=quote, rate=rate) for base, quote, rate in rates
+        ])
+        ExchangeRate.objects.filter(version__lte=version - keep).delete()
+    RATES.clear()
+    return version
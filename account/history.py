@@ -0,0 +1,82 @@
+import base64
+import json
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from account.models import Transaction
+
+ASCENDING = "asc"
+DESCENDING = "desc"
+
+
+def encode_cursor(transaction):
+    """ Builds an opaque cursor pointing right after the given transaction """
+
+    return encode_position(transaction.date, transaction.pk)
+
+
+def encode_position(date, pk):
+    """ Builds an opaque cursor pointing right after the (date, id) position """
+
+    position = json.dumps([date.isoformat(), pk], separators=(",", ":"))
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """ Returns the (date, id) position encoded in a cursor, raises ValueError for malformed cursors """
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date, pk = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        date = parse_datetime(date)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+    if date is None or not isinstance(pk, int):
+        raise ValueError("Invalid cursor")
+    return date, pk
+
+
+def _filter_range(transactions, since, until, direction, after):
+    if since is not None:
+        transactions = transactions.filter(date__gte=since)
+    if until is not None:
+        transactions = transactions.filter(date__lt=until)
+
+    if after is not None:
+        date, pk = after
+        if direction == DESCENDING:
+            transactions = transactions.filter(Q(date__lt=date) | Q(date=date, pk__lt=pk))
+        else:
+            transactions = transactions.filter(Q(date__gt=date) | Q(date=date, pk__gt=pk))
+    return transactions
+
+
+def account_history(account_id, since=None, until=None, direction=ASCENDING, after=None, limit=None):
+    """
+    Returns transactions sent or received by the account ordered by (date, id).
+
+    The query is a UNION ALL of the sent and received sides, each one served by its own
+    (account, date, id) index, instead of an OR filter which forces a bitmap OR plus a sort.
+    ``after`` is a (date, id) keyset position, only transactions strictly after it in the requested
+    direction are returned. When ``limit`` is given and the backend allows it, every side is
+    limited on its own as well, so a page never reads more than ``limit`` rows per side.
+    """
+
+    ordering = ("-date", "-id") if direction == DESCENDING else ("date", "id")
+
+    sent = _filter_range(Transaction.objects.filter(sender_account_id=account_id), since, until, direction, after)
+    # Transfers to self (only possible in legacy data) are already part of the sent side
+    received = _filter_range(
+        Transaction.objects.filter(recipient_account_id=account_id).exclude(sender_account_id=account_id),
+        since, until, direction, after
+    )
+
+    if limit is not None and connection.features.supports_slicing_ordering_in_compound:
+        sent, received = sent.order_by(*ordering)[:limit], received.order_by(*ordering)[:limit]
+    else:
+        sent, received = sent.order_by(), received.order_by()
+
+    return sent.union(received, all=True).order_by(*ordering)
@@ -0,0 +1,133 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.utils import IntegrityError
+from django.http import HttpResponse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from account.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+KEY_MAX_LENGTH = 255
+
+PURGE_CHUNK_SIZE = 1000
+
+
+def request_fingerprint(request):
+    """ Returns a SHA-256 digest of the method, path and parsed body of a DRF request """
+
+    data = request.data
+    if hasattr(data, "lists"):
+        # Form and multipart bodies are parsed into a QueryDict
+        data = dict(data.lists())
+    payload = json.dumps([request.method, request.path, data], cls=JSONEncoder, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _claim(scope, key, fingerprint):
+    """ Inserts a pending record for the key, False when another request already holds it """
+
+    try:
+        # A savepoint, so a duplicate key doesn't break the surrounding transaction
+        with db_transaction.atomic():
+            IdempotencyKey.objects.create(
+                scope=scope,
+                key=key,
+                fingerprint=fingerprint,
+                expires=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+            )
+        return True
+    except IntegrityError:
+        return False
+
+
+def _replay(record, fingerprint):
+    if record.fingerprint != fingerprint:
+        return Response(
+            {"detail": "%s has already been used with a different request" % IDEMPOTENCY_HEADER},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+
+    response = HttpResponse(record.response, status=record.status_code, content_type="application/json")
+    response[REPLAYED_HEADER] = "true"
+    return response
+
+
+def idempotent(scope):
+    """
+    Makes a ViewSet action honor the Idempotency-Key header.
+
+    The first request with a key runs the action and stores its status code and rendered body in the
+    same database transaction as its writes, repeating the request within IDEMPOTENCY_KEY_TTL replays
+    the stored response with a single lookup by the (scope, key) unique index. A concurrent duplicate
+    blocks on that index until the first request commits and then gets its response as well. Client
+    errors are stored like successful responses, server errors aren't and leave the key free for a
+    retry. Requests without the header are unaffected.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(viewset, request, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if key is None:
+                return view(viewset, request, *args, **kwargs)
+            if not key or len(key) > KEY_MAX_LENGTH:
+                return Response(
+                    {"detail": "%s must be 1 to %s characters long" % (IDEMPOTENCY_HEADER, KEY_MAX_LENGTH)},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            fingerprint = request_fingerprint(request)
+            record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+            if record is not None:
+                if record.expires > timezone.now():
+                    return _replay(record, fingerprint)
+                # Expired but not purged yet, the key is free again
+                record.delete()
+
+            with db_transaction.atomic():
+                if not _claim(scope, key, fingerprint):
+                    return _replay(IdempotencyKey.objects.get(scope=scope, key=key), fingerprint)
+
+                try:
+                    response = view(viewset, request, *args, **kwargs)
+                except APIException as e:
+                    # Validation errors are raised by the actions, render them here so they are stored too
+                    response = viewset.handle_exception(e)
+                if response.status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR:
+                    db_transaction.set_rollback(True)
+                    return response
+
+                IdempotencyKey.objects.filter(scope=scope, key=key).update(
+                    status_code=response.status_code,
+                    response=JSONRenderer().render(response.data).decode()
+                )
+                return response
+
+        return wrapper
+
+    return decorator
+
+
+def purge_expired_keys(chunk_size=PURGE_CHUNK_SIZE):
+    """ Deletes expired idempotency keys chunk by chunk, yields the number of keys deleted by every chunk """
+
+    now = timezone.now()
+    while True:
+        chunk = list(IdempotencyKey.objects.filter(expires__lte=now).values_list("pk", flat=True)[:chunk_size])
+        if not chunk:
+            return
+        IdempotencyKey.objects.filter(pk__in=chunk).delete()
+        yield len(chunk)
@@ -0,0 +1,170 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction as db_transaction
+from django.db.models import Exists, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from account.models import BalanceShard, BankAccount, LedgerEntry, Transaction
+
+CENT = Decimal("0.01")
+
+BACKFILL_CHUNK_SIZE = 100
+
+
+def _cents(value):
+    # SQLite hands decimal aggregates back as floats
+    return Decimal(value or 0).quantize(CENT)
+
+
+def write_ledger_entries(items, currencies):
+    """
+    Writes the ledger entries of transactions.
+
+    ``items`` are (transaction, movements) tuples where movements are the (account_id, shard, amount,
+    balance) changes made by the transaction: a debit and a credit, or more when the debit was drawn
+    from several shards of a sharded account. ``balance`` is the running balance of the banking account
+    row, or of the shard, right after the transaction. Entries are in the currency of their account,
+    given by ``currencies`` as {account_id: currency}. Nothing is written unless ``LEDGER_ENTRIES`` is on.
+    """
+
+    if not settings.LEDGER_ENTRIES:
+        return
+    LedgerEntry.objects.bulk_create([
+        LedgerEntry(
+            account_id=account_id,
+            transaction=transaction,
+            shard=shard,
+            amount=amount,
+            amount_currency=currencies[account_id],
+            balance=balance,
+            balance_currency=currencies[account_id],
+            date=transaction.date
+        )
+        for transaction, movements in items for account_id, shard, amount, balance in movements
+    ])
+
+
+def open_ledgers(accounts):
+    """ Writes the opening entry, carrying the initial deposit, of new banking accounts when LEDGER_ENTRIES is on """
+
+    if not settings.LEDGER_ENTRIES:
+        return
+    now = timezone.now()
+    LedgerEntry.objects.bulk_create([
+        LedgerEntry(account_id=account.pk, amount=account.balance, balance=account.balance, date=now)
+        for account in accounts
+    ])
+
+
+def _account_chunks(queryset, chunk_size):
+    """ Yields chunks of account ids in ascending order using keyset pagination over primary keys """
+
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1]
+
+
+def _backfill_chunk(account_ids):
+    """ Rebuilds the ledger of the given accounts from their balances and transactions """
+
+    with db_transaction.atomic():
+        accounts = BankAccount.objects.filter(pk__in=account_ids).order_by("pk")
+        if connection.features.has_select_for_update:
+            accounts = accounts.select_for_update()
+        balances, currencies = {}, {}
+        for pk, balance, currency in accounts.values_list("pk", "balance", "balance_currency"):
+            balances[pk], currencies[pk] = balance, currency
+        opened = dict(BankAccount.objects.filter(pk__in=account_ids).values_list("pk", "owner__created"))
+
+        movements = defaultdict(list)
+        transactions = Transaction.objects.filter(Q(sender_account_id__in=account_ids) | Q(recipient_account_id__in=account_ids))\
+            .order_by("date", "id").values_list("id", "sender_account_id", "recipient_account_id", "amount", "credit", "date")
+        for pk, sender_id, recipient_id, amount, credit, date in transactions.iterator():
+            if sender_id in balances:
+                movements[sender_id].append((pk, -amount, date))
+            if recipient_id in balances:
+                # Transfers between currencies credited their conversion
+                movements[recipient_id].append((pk, amount if credit is None else credit, date))
+
+        LedgerEntry.objects.filter(account_id__in=account_ids).delete()
+
+        entries = []
+        for account_id, balance in balances.items():
+            account_movements = movements[account_id]
+            running = balance - sum((amount for _, amount, _ in account_movements), Decimal(0))
+            opened_at = opened.get(account_id) or timezone.now()
+            if account_movements:
+                opened_at = min(opened_at, account_movements[0][2])
+
+            currency = currencies[account_id]
+            entries.append(LedgerEntry(
+                account_id=account_id, amount=running, amount_currency=currency, balance=running,
+                balance_currency=currency, date=opened_at
+            ))
+            for transaction_id, amount, date in account_movements:
+                running += amount
+                entries.append(LedgerEntry(
+                    account_id=account_id, transaction_id=transaction_id, amount=amount, amount_currency=currency,
+                    balance=running, balance_currency=currency, date=date
+                ))
+        LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+    return len(entries)
+
+
+def backfill_ledger(chunk_size=BACKFILL_CHUNK_SIZE):
+    """
+    Builds ledgers from existing transactions for accounts which have no opening entry yet.
+
+    Accounts are processed in chunks, each chunk in its own database transaction with the account rows
+    locked. Yields (accounts, entries) counts after every chunk.
+    """
+
+    missing = BankAccount.objects.filter(
+        ~Exists(LedgerEntry.objects.filter(account=OuterRef("pk"), transaction__isnull=True))
+    )
+    for chunk in _account_chunks(missing, chunk_size):
+        yield len(chunk), _backfill_chunk(chunk)
+
+
+def verify_ledger(chunk_size=BACKFILL_CHUNK_SIZE):
+    """
+    Reconciles ledgers with banking account balances.
+
+    Yields a dict for every account whose ledger sum or latest running balance differs from its balance,
+    the row and shards of sharded accounts adding up.
+    """
+
+    latest_balance = LedgerEntry.objects.filter(account=OuterRef("pk"), shard__isnull=True)\
+        .order_by("-date", "-id").values("balance")[:1]
+    latest_shard_balance = LedgerEntry.objects.filter(account=OuterRef("account"), shard=OuterRef("shard"))\
+        .order_by("-date", "-id").values("balance")[:1]
+
+    for chunk in _account_chunks(BankAccount.objects.all(), chunk_size):
+        totals = dict(
+            LedgerEntry.objects.filter(account_id__in=chunk).order_by().values("account_id")
+            .annotate(total=Sum("amount")).values_list("account_id", "total")
+        )
+        shards = defaultdict(lambda: (Decimal(0), Decimal(0)))
+        shard_balances = BalanceShard.objects.filter(account_id__in=chunk).annotate(
+            latest_balance=Subquery(latest_shard_balance)
+        ).values_list("account_id", "balance", "latest_balance")
+        for account_id, balance, latest in shard_balances:
+            shards[account_id] = (shards[account_id][0] + balance, shards[account_id][1] + _cents(latest))
+
+        accounts = BankAccount.objects.filter(pk__in=chunk).annotate(latest_balance=Subquery(latest_balance))\
+            .values_list("pk", "balance", "latest_balance")
+
+        for pk, balance, latest in accounts:
+            shards_balance, shards_latest = shards.get(pk, (Decimal(0), Decimal(0)))
+            balance = _cents(balance) + shards_balance
+            total = _cents(totals.get(pk))
+            latest = None if latest is None else _cents(latest) + shards_latest
+            if total != balance or latest != balance:
+                yield {"account": pk, "balance": balance, "ledger_total": total, "latest_balance": latest}
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from account.archive import archive_transactions
+
+
+class Command(BaseCommand):
+    help = "Moves transactions of months older than a cutoff into gzipped NDJSON archive files"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-months", type=int, default=settings.TRANSACTION_ARCHIVE_AFTER_MONTHS,
+            help="Archives months which ended more than this many months ago"
+        )
+        parser.add_argument("--directory", default=settings.TRANSACTION_ARCHIVE_DIR, help="Directory of the archive files")
+
+    def handle(self, *args, **options):
+        months = total = 0
+        for month, moved in archive_transactions(options["older_than_months"], options["directory"]):
+            months += 1
+            total += moved
+            self.stdout.write("Archived %s: %s transactions" % (month.strftime("%Y-%m"), moved))
+
+        self.stdout.write(self.style.SUCCESS("Transaction archival finished: %s months, %s transactions" % (months, total)))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from account.ledger import BACKFILL_CHUNK_SIZE, backfill_ledger
+
+
+class Command(BaseCommand):
+    help = "Builds ledger entries from existing transactions for accounts without a ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK_SIZE, help="Accounts per database transaction")
+
+    def handle(self, *args, **options):
+        total_accounts = total_entries = 0
+        for accounts, entries in backfill_ledger(chunk_size=options["chunk_size"]):
+            total_accounts += accounts
+            total_entries += entries
+            self.stdout.write("Backfilled %s accounts (%s entries)" % (total_accounts, total_entries))
+
+        self.stdout.write(self.style.SUCCESS("Ledger backfill finished: %s accounts, %s entries" % (total_accounts, total_entries)))
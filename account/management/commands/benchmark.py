@@ -0,0 +1,38 @@
+import importlib
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import execute, parse_options
+from benchmarks.compare import DEFAULT_THRESHOLD, compare, load
+
+
+class Command(BaseCommand):
+    help = "Runs a benchmark from the benchmarks package against a throwaway database and prints JSON results"
+
+    def add_arguments(self, parser):
+        parser.add_argument("benchmark", nargs="?", default="endpoints", help="Module of the benchmarks package")
+        parser.add_argument("options", nargs="*", help="Benchmark options as key=value, e.g. requests=500")
+        parser.add_argument("--output", help="Write the results to this file")
+        parser.add_argument("--compare", help="Compare the results with a previous result file, fails on regressions")
+        parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Tolerated relative change")
+
+    def handle(self, *args, **options):
+        try:
+            module = importlib.import_module("benchmarks.%s" % options["benchmark"])
+        except ImportError:
+            raise CommandError("Unknown benchmark '%s'" % options["benchmark"])
+
+        results = execute(module.run, parse_options(module.run, options["options"]))
+        output = json.dumps(results, indent=2, default=str)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+        self.stdout.write(output)
+
+        if options["compare"]:
+            changes, regressions = compare(load(options["compare"]), results, options["threshold"])
+            self.stdout.write(json.dumps(changes, indent=2))
+            if regressions:
+                raise CommandError("Regressions against %s:\n%s" % (options["compare"], "\n".join(regressions)))
+            self.stdout.write(self.style.SUCCESS("No regressions against %s" % options["compare"]))
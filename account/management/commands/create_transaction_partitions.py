@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from account.partitions import create_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = "Creates monthly partitions of the transaction table for the current and upcoming months"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months", type=int, default=settings.TRANSACTION_PARTITIONS_AHEAD, help="Months to create ahead of the current one"
+        )
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            self.stdout.write("The transaction table isn't partitioned, partitions need PostgreSQL")
+            return
+
+        created = create_partitions(options["months"])
+        for name in created:
+            self.stdout.write("Created %s" % name)
+        self.stdout.write(self.style.SUCCESS("Transaction partitions ready: %s created" % len(created)))
@@ -0,0 +1,85 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from account.models import BankAccount
+from account.partitions import add_months, month_start
+from account.statements import CSV, export_account_statement, init_export_worker
+from account.streaming import NDJSON
+
+# Accounts handed to a worker process at once
+ACCOUNTS_PER_TASK = 50
+
+
+class Command(BaseCommand):
+    help = "Writes statements of banking accounts to files from a pool of processes, the last calendar month by default"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="ISO 8601 start of the statements, inclusive, with a time zone")
+        parser.add_argument("--until", help="ISO 8601 end of the statements, exclusive, with a time zone")
+        parser.add_argument("--accounts", type=int, nargs="+", help="Banking accounts to export, all by default")
+        parser.add_argument("--directory", default=settings.STATEMENTS_DIR, help="Directory of the statement files")
+        parser.add_argument("--stream", choices=[CSV, NDJSON], default=CSV, help="Format of the statement files")
+        parser.add_argument("--gzip", action="store_true", help="Gzip the statement files")
+        parser.add_argument(
+            "--workers", type=int, default=settings.STATEMENT_EXPORT_WORKERS,
+            help="Worker processes, 0 exports in this process"
+        )
+
+    def _datetime(self, options, name, default):
+        if not options[name]:
+            return default
+        value = parse_datetime(options[name])
+        if value is None or value.tzinfo is None:
+            raise CommandError("--%s must be an ISO 8601 datetime with a time zone" % name)
+        return value
+
+    def handle(self, *args, **options):
+        current_month = month_start(timezone.now())
+        since = self._datetime(options, "since", add_months(current_month, -1))
+        until = self._datetime(options, "until", current_month)
+        if until <= since:
+            raise CommandError("--until must be after --since")
+        if options["workers"] < 0:
+            raise CommandError("--workers can't be negative")
+
+        accounts = BankAccount.objects.order_by("pk").values_list("pk", flat=True)
+        if options["accounts"]:
+            accounts = accounts.filter(pk__in=options["accounts"])
+        account_ids = list(accounts)
+        missing = set(options["accounts"] or []) - set(account_ids)
+        if missing:
+            raise CommandError("Banking accounts %s do not exist" % ", ".join(map(str, sorted(missing))))
+
+        os.makedirs(options["directory"], exist_ok=True)
+        export = partial(
+            export_account_statement, since=since, until=until, directory=options["directory"],
+            output_format=options["stream"], compress=options["gzip"]
+        )
+
+        if options["workers"]:
+            # Forked workers would otherwise share the connections of this process
+            connections.close_all()
+            with ProcessPoolExecutor(options["workers"], initializer=init_export_worker) as pool:
+                total = self._report(pool.map(export, account_ids, chunksize=ACCOUNTS_PER_TASK))
+        else:
+            total = self._report(map(export, account_ids))
+
+        self.stdout.write(self.style.SUCCESS("Exported statements of %s accounts, %s transactions, to %s" % (
+            len(account_ids), total, options["directory"]
+        )))
+
+    def _report(self, results):
+        exported = total = 0
+        for _, transactions in results:
+            exported += 1
+            total += transactions
+            if exported % 1000 == 0:
+                self.stdout.write("Exported %s statements" % exported)
+        return total
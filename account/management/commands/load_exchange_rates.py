@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from account.exchange import KEEP_VERSIONS, load_rates, read_rates
+
+
+class Command(BaseCommand):
+    help = "Loads exchange rates from a CSV file with base,quote,rate columns as a new version of the rates"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", help="Rates file, EXCHANGE_RATES_FILE by default")
+        parser.add_argument("--keep", type=int, default=KEEP_VERSIONS, help="Versions of the rates kept")
+
+    def handle(self, *args, **options):
+        path = options["path"] or settings.EXCHANGE_RATES_FILE
+        if options["keep"] < 1:
+            raise CommandError("--keep must be at least 1")
+        try:
+            rates = read_rates(path)
+        except OSError as e:
+            raise CommandError("Unable to read %s: %s" % (path, e))
+        except ValueError as e:
+            raise CommandError("%s: %s" % (path, e))
+
+        version = load_rates(rates, keep=options["keep"])
+        self.stdout.write(self.style.SUCCESS("Loaded %s exchange rates as version %s" % (len(rates), version)))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from account.idempotency import PURGE_CHUNK_SIZE, purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = "Deletes expired idempotency keys, meant to be run periodically"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=PURGE_CHUNK_SIZE, help="Keys deleted per statement")
+
+    def handle(self, *args, **options):
+        total = 0
+        for deleted in purge_expired_keys(chunk_size=options["chunk_size"]):
+            total += deleted
+
+        self.stdout.write(self.style.SUCCESS("Purged %s expired idempotency keys" % total))
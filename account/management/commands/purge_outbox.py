@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from account.outbox import PURGE_CHUNK_SIZE, purge_events
+
+
+class Command(BaseCommand):
+    help = "Deletes outbox events past OUTBOX_RETENTION_HOURS which every consumer got, meant to be run periodically"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=PURGE_CHUNK_SIZE, help="Events deleted per statement")
+
+    def handle(self, *args, **options):
+        total = 0
+        for deleted in purge_events(chunk_size=options["chunk_size"]):
+            total += deleted
+
+        self.stdout.write(self.style.SUCCESS("Purged %s outbox events" % total))
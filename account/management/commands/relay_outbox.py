@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from account.outbox import DEFAULT_CONSUMER, Relay, get_sink
+
+
+class Command(BaseCommand):
+    help = "Publishes outbox events to a sink, at least once and in id order, until interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--consumer", default=DEFAULT_CONSUMER, help="Name the position of the relay is kept under")
+        parser.add_argument("--sink", help="file:<path> or socket:<path>, OUTBOX_SINK by default")
+        parser.add_argument("--batch-size", type=int, help="Events per batch, OUTBOX_BATCH_SIZE by default")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to wait once the outbox is drained")
+        parser.add_argument("--once", action="store_true", help="Stop once the outbox is drained")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] is not None and options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        try:
+            sink = get_sink(options["sink"] or settings.OUTBOX_SINK)
+        except ImproperlyConfigured as e:
+            raise CommandError(e)
+
+        relay = Relay(sink, consumer=options["consumer"], batch_size=options["batch_size"])
+        total = 0
+        try:
+            if options["once"]:
+                while True:
+                    published = relay.relay_batch()
+                    total += published
+                    if published < relay.batch_size:
+                        break
+            else:
+                for published in relay.run(options["poll_interval"]):
+                    total += published
+                    self.stdout.write("Relayed %s events" % total)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sink.close()
+
+        self.stdout.write(self.style.SUCCESS("Relayed %s outbox events to %s" % (total, options["consumer"])))
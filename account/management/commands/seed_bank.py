@@ -0,0 +1,62 @@
+from argparse import BooleanOptionalAction
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from account.seeding import SEED_CHUNK_SIZE, peak_memory_mb, seed_bank
+
+
+class Command(BaseCommand):
+    help = "Generates synthetic customers, banking accounts and transactions in bulk"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=1000, help="Customers to create")
+        parser.add_argument("--accounts-per-customer", type=int, default=2, help="Banking accounts of every customer")
+        parser.add_argument("--transactions", type=int, default=100000, help="Transfers between the new accounts")
+        parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of account popularity, 0 for uniform")
+        parser.add_argument("--days", type=int, default=365, help="Transfer dates are spread over this many past days")
+        parser.add_argument("--deposit", type=Decimal, default=Decimal("1000.00"), help="Minimum opening deposit")
+        parser.add_argument("--max-amount", type=Decimal, default=Decimal("100.00"), help="Maximum transfer amount")
+        parser.add_argument("--seed", type=int, default=42, help="Random seed, equal seeds generate equal data")
+        parser.add_argument("--workers", type=int, default=1, help="Worker processes, ignored on SQLite")
+        parser.add_argument("--partitions", type=int, help="Id ranges to split the work into, --workers by default")
+        parser.add_argument("--chunk-size", type=int, default=SEED_CHUNK_SIZE, help="Rows per database transaction")
+        parser.add_argument(
+            "--ledger", action=BooleanOptionalAction, help="Write ledger entries, as LEDGER_ENTRIES does by default"
+        )
+        parser.add_argument("--no-copy", action="store_false", dest="copy", help="Use bulk_create on PostgreSQL as well")
+
+    def handle(self, *args, **options):
+        if options["customers"] < 1 or options["accounts_per_customer"] < 1 or options["transactions"] < 0:
+            raise CommandError("--customers and --accounts-per-customer must be positive")
+        if options["transactions"] and options["customers"] * options["accounts_per_customer"] < 2:
+            raise CommandError("Transfers need at least two banking accounts")
+
+        total_rows = total_seconds = 0
+        phases = seed_bank(
+            options["customers"],
+            accounts_per_customer=options["accounts_per_customer"],
+            transactions=options["transactions"],
+            skew=options["skew"],
+            days=options["days"],
+            deposit=options["deposit"],
+            max_amount=options["max_amount"],
+            seed=options["seed"],
+            workers=options["workers"],
+            partitions=options["partitions"],
+            chunk_size=options["chunk_size"],
+            ledger=options["ledger"],
+            use_copy=None if options["copy"] else False,
+        )
+        for phase, rows, seconds in phases:
+            total_seconds += seconds
+            if phase != "plan":
+                total_rows += rows
+            self.stdout.write("%s: %s rows in %.1fs (%.0f rows/s)" % (phase, rows, seconds, rows / max(seconds, 1e-9)))
+
+        memory = peak_memory_mb()
+        self.stdout.write(self.style.SUCCESS(
+            "Seeded %s rows in %.1fs (%.0f rows/s), peak memory %s MB, %s MB per worker" % (
+                total_rows, total_seconds, total_rows / max(total_seconds, 1e-9), memory["main"], memory["workers"]
+            )
+        ))
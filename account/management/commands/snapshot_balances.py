@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from account.snapshots import SNAPSHOT_CHUNK_SIZE, take_snapshots
+
+
+class Command(BaseCommand):
+    help = "Records balance snapshots of all banking accounts, as of the start of the current UTC day by default"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--at", help="ISO 8601 moment to record the balances at, with a time zone")
+        parser.add_argument("--chunk-size", type=int, default=SNAPSHOT_CHUNK_SIZE, help="Accounts per query")
+
+    def handle(self, *args, **options):
+        at = None
+        if options["at"]:
+            at = parse_datetime(options["at"])
+            if at is None or at.tzinfo is None:
+                raise CommandError("--at must be an ISO 8601 datetime with a time zone")
+
+        total = 0
+        for accounts in take_snapshots(at, chunk_size=options["chunk_size"]):
+            total += accounts
+            self.stdout.write("Snapshotted %s accounts" % total)
+
+        self.stdout.write(self.style.SUCCESS("Balance snapshots finished: %s accounts" % total))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from account.shards import sync_balance_shards
+
+
+class Command(BaseCommand):
+    help = "Creates balance shards of accounts listed in BALANCE_SHARDS and folds the ones no longer configured back"
+
+    def handle(self, *args, **options):
+        accounts = 0
+        for account_id, created, folded in sync_balance_shards():
+            accounts += 1
+            self.stdout.write("Account %s: %s shards created, %s folded" % (account_id, created, folded))
+
+        self.stdout.write(self.style.SUCCESS("Balance shards synced: %s accounts" % accounts))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from account.ledger import BACKFILL_CHUNK_SIZE, verify_ledger
+
+
+class Command(BaseCommand):
+    help = "Reconciles ledger entries with banking account balances"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK_SIZE, help="Accounts per query")
+
+    def handle(self, *args, **options):
+        mismatches = 0
+        for mismatch in verify_ledger(chunk_size=options["chunk_size"]):
+            mismatches += 1
+            self.stdout.write(self.style.ERROR(
+                "Account {account}: balance {balance}, ledger total {ledger_total}, latest ledger balance {latest_balance}".format(**mismatch)
+            ))
+
+        if mismatches:
+            raise CommandError("%s accounts do not reconcile with their ledger" % mismatches)
+        self.stdout.write(self.style.SUCCESS("All accounts reconcile with their ledger"))
@@ -0,0 +1,352 @@
+"""
+Per-route request metrics in the Prometheus text format.
+
+``MetricsMiddleware`` counts requests and observes their latency per route, method and status,
+a database execute wrapper adds the number of queries and the time spent in the database, and
+response serializers add the time spent turning objects into JSON. ``metrics_view`` exposes the
+totals on ``/metrics``.
+
+Every process aggregates its own samples in memory. With ``METRICS_DIR`` set, processes also dump
+them to a file of their own in that directory from a background thread every
+``METRICS_FLUSH_INTERVAL`` seconds, and ``/metrics`` sums the files of all gunicorn workers, dead
+ones included so counters never go back. The directory is cleared when gunicorn starts. With
+``METRICS_ENABLED`` off the middleware removes itself and nothing is recorded.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+SKIPPED_PREFIXES = ("/metrics", "/static/")
+
+logger = logging.getLogger(__name__)
+
+# Requests which didn't resolve are reported together, raw paths would make a label per URL
+UNMATCHED_ROUTE = "unmatched"
+
+REQUESTS = "api_requests_total"
+DURATION = "api_request_duration_seconds"
+DB_QUERIES = "api_db_queries_total"
+DB_DURATION = "api_db_duration_seconds_total"
+SERIALIZER_DURATION = "api_serializer_duration_seconds_total"
+
+METRICS = (
+    (REQUESTS, "counter", "Requests by route, method and status code"),
+    (DURATION, "histogram", "Request latency in seconds, streamed bodies excluded"),
+    (DB_QUERIES, "counter", "SQL queries made by requests"),
+    (DB_DURATION, "counter", "Seconds requests spent executing SQL queries"),
+    (SERIALIZER_DURATION, "counter", "Seconds requests spent serializing and rendering responses"),
+)
+
+
+class RequestMetrics:
+    """ Measurements of the request being served """
+
+    __slots__ = ("queries", "db_time", "serializer_time", "serializing", "render_started")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = 0
+        self.render_started = None
+
+
+# Context variables follow requests into the threads running their sync code under ASGI
+_current = ContextVar("request_metrics", default=None)
+
+
+class MetricsRegistry:
+    """ Samples of this process, optionally shared with other processes through files in METRICS_DIR """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(float)
+        self._pid = None
+        self._file = None
+        self._dirty = False
+        self._flusher = None
+
+    def observe(self, route, method, status_code, duration, request):
+        labels = (("method", method), ("route", route))
+        bucket = next((str(bound) for bound in LATENCY_BUCKETS if duration <= bound), "+Inf")
+        with self._lock:
+            self._check_process()
+            samples = self._samples
+            samples[(REQUESTS, labels + (("status", str(status_code)),))] += 1
+            samples[(DURATION + "_bucket", labels + (("le", bucket),))] += 1
+            samples[(DURATION + "_sum", labels)] += duration
+            samples[(DURATION + "_count", labels)] += 1
+            samples[(DB_QUERIES, labels)] += request.queries
+            samples[(DB_DURATION, labels)] += request.db_time
+            samples[(SERIALIZER_DURATION, labels)] += request.serializer_time
+            self._dirty = True
+
+    def _check_process(self):
+        # Forked workers start with a copy of the samples of the parent, they start over with a file of their
+        # own and a flusher thread, threads don't survive a fork
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._file = "%s-%s.json" % (self._pid, uuid.uuid4().hex)
+            self._samples.clear()
+            self._flusher = None
+        if self._flusher is None and settings.METRICS_DIR:
+            self._flusher = threading.Thread(target=self._flush_periodically, name="metrics-flush", daemon=True)
+            self._flusher.start()
+
+    def _flush_periodically(self):
+        while self._pid == os.getpid():
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError as e:
+                logger.warning("Failed to write metrics to %s: %s", settings.METRICS_DIR, e)
+
+    def samples(self):
+        with self._lock:
+            self._check_process()
+            return dict(self._samples)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+    def flush(self, force=False):
+        """ Dumps the samples to the file of this process if anything changed since the last flush """
+
+        if not settings.METRICS_DIR or not (self._dirty or force):
+            return
+
+        with self._lock:
+            self._check_process()
+            path = os.path.join(settings.METRICS_DIR, self._file)
+            samples = [[name, labels, value] for (name, labels), value in self._samples.items()]
+            self._dirty = False
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(samples, f)
+        # Readers never see a half-written file
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        """ Returns the samples of all processes summed up """
+
+        samples = defaultdict(float, self.samples())
+        if not settings.METRICS_DIR or not os.path.isdir(settings.METRICS_DIR):
+            return samples
+
+        for name in os.listdir(settings.METRICS_DIR):
+            if name == self._file or not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(settings.METRICS_DIR, name)) as f:
+                    for sample, labels, value in json.load(f):
+                        samples[(sample, tuple(tuple(label) for label in labels))] += value
+            except (OSError, ValueError):
+                # Removed or replaced in the meantime
+                continue
+        return samples
+
+
+registry = MetricsRegistry()
+
+
+def clear_metrics_dir():
+    """ Removes the files of previous server runs, called when gunicorn starts """
+
+    if not settings.METRICS_DIR or not os.path.isdir(settings.METRICS_DIR):
+        return
+    for name in os.listdir(settings.METRICS_DIR):
+        if name.endswith((".json", ".tmp")):
+            os.remove(os.path.join(settings.METRICS_DIR, name))
+
+
+def _record_query(execute, sql, params, many, context):
+    request = _current.get()
+    if request is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request.queries += 1
+        request.db_time += time.perf_counter() - started
+
+
+def _install_wrapper(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def install_query_recorder():
+    """
+    Adds the query recording execute wrapper to every database connection opened from now on and
+    to the ones already open in this thread. Called when the app is ready, before any connection is
+    opened, async views query the database from other threads than the middleware runs in.
+    """
+
+    connection_created.connect(_install_wrapper, dispatch_uid="account.metrics")
+    for connection in connections.all(initialized_only=True):
+        _install_wrapper(connection)
+
+
+@contextmanager
+def serialization():
+    """ Adds the time spent in the block to the serializer time of the current request """
+
+    request = _current.get()
+    if request is None or request.serializing:
+        # Nested serializers are covered by the outermost one
+        yield
+        return
+
+    request.serializing += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        request.serializing -= 1
+        request.serializer_time += time.perf_counter() - started
+
+
+class TimedRepresentationMixin:
+    """ Serializer mixin reporting to_representation time to the request metrics """
+
+    def to_representation(self, instance):
+        request = _current.get()
+        if request is None or request.serializing:
+            # Metrics off, or covered by an outer serializer, rows of history and list endpoints skip the wrapper
+            return super().to_representation(instance)
+        with serialization():
+            return super().to_representation(instance)
+
+
+def _route(request):
+    match = request.resolver_match
+    return match.url_name or match.view_name if match else UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """ Records latency, database and serializer time of every request """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+        install_query_recorder()
+
+    def _finish(self, request, response, metrics, started):
+        registry.observe(
+            _route(request), request.method, response.status_code, time.perf_counter() - started, metrics
+        )
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if request.path.startswith(SKIPPED_PREFIXES):
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._finish(request, response, metrics, started)
+        return response
+
+    async def __acall__(self, request):
+        if request.path.startswith(SKIPPED_PREFIXES):
+            return await self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._finish(request, response, metrics, started)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after the template response hooks
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.render_started = time.perf_counter()
+            response.add_post_render_callback(lambda _: self._rendered(metrics))
+        return response
+
+    @staticmethod
+    def _rendered(metrics):
+        metrics.serializer_time += time.perf_counter() - metrics.render_started
+
+
+def _format_labels(labels):
+    return ",".join('%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"')) for name, value in labels)
+
+
+def _format_sample(name, labels, value):
+    return "%s{%s} %s" % (name, _format_labels(labels), repr(float(value)))
+
+
+def render(samples):
+    """ Renders samples in the Prometheus text exposition format """
+
+    lines = []
+    for name, kind, description in METRICS:
+        lines.append("# HELP %s %s" % (name, description))
+        lines.append("# TYPE %s %s" % (name, kind))
+        if kind != "histogram":
+            for (sample, labels), value in sorted(samples.items()):
+                if sample == name:
+                    lines.append(_format_sample(name, labels, value))
+            continue
+
+        buckets = defaultdict(dict)
+        for (sample, labels), value in samples.items():
+            if sample == name + "_bucket":
+                bucket = dict(labels)["le"]
+                buckets[tuple(label for label in labels if label[0] != "le")][bucket] = value
+        for labels, counts in sorted(buckets.items()):
+            cumulative = 0
+            for bucket in [str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"]:
+                cumulative += counts.get(bucket, 0)
+                lines.append(_format_sample(name + "_bucket", labels + (("le", bucket),), cumulative))
+            lines.append(_format_sample(name + "_sum", labels, samples.get((name + "_sum", labels), 0)))
+            lines.append(_format_sample(name + "_count", labels, samples.get((name + "_count", labels), 0)))
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """ Prometheus scrape endpoint, routed only with METRICS_ENABLED """
+
+    return HttpResponse(render(registry.collect()), content_type=CONTENT_TYPE)
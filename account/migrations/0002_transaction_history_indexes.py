@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['sender_account', 'date', 'id'], name='transaction_sender_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['recipient_account', 'date', 'id'], name='transaction_recipient_date_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0004_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApiRequestLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('api', models.CharField(max_length=1024)),
+                ('method', models.CharField(max_length=10)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('execution_time', models.FloatField()),
+                ('client_ip_address', models.CharField(blank=True, max_length=50)),
+                ('body', models.TextField(blank=True)),
+                ('response', models.TextField(blank=True)),
+                ('added_on', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'API request log',
+                'verbose_name_plural': 'API request logs',
+                'ordering': ['-added_on'],
+            },
+        ),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:40
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TABLE = "account_transaction"
+UNPARTITIONED = "account_transaction_unpartitioned"
+SEQUENCE = "account_transaction_partitioned_id_seq"
+DEFAULT_PARTITION = "account_transaction_default"
+
+# Future months partitioned right away, create_transaction_partitions keeps creating them afterwards
+MONTHS_AHEAD = 3
+
+
+def _next_month(month):
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def _definitions(cursor):
+    """ Returns the index and foreign key definitions of the transaction table, primary key excluded """
+
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s"
+        " AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p')",
+        [TABLE, TABLE]
+    )
+    indexes = [definition for definition, in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [TABLE]
+    )
+    return indexes, cursor.fetchall()
+
+
+def _rebuild(schema_editor, partitioned):
+    """
+    Recreates the transaction table, partitioned by month of ``date`` or not, and copies its rows over.
+    Indexes and foreign keys keep their names and definitions.
+    """
+
+    quote = schema_editor.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        indexes, foreign_keys = _definitions(cursor)
+        cursor.execute("ALTER TABLE %s RENAME TO %s" % (quote(TABLE), quote(UNPARTITIONED)))
+
+        if partitioned:
+            # Identity columns can't be added to partitioned tables before PostgreSQL 17
+            cursor.execute("CREATE SEQUENCE %s" % quote(SEQUENCE))
+            cursor.execute("CREATE TABLE %s (LIKE %s) PARTITION BY RANGE (date)" % (quote(TABLE), quote(UNPARTITIONED)))
+            cursor.execute("ALTER TABLE %s ALTER COLUMN id SET DEFAULT nextval('%s')" % (quote(TABLE), SEQUENCE))
+            cursor.execute("ALTER SEQUENCE %s OWNED BY %s.id" % (quote(SEQUENCE), quote(TABLE)))
+
+            cursor.execute("SELECT min(date) FROM %s" % quote(UNPARTITIONED))
+            now = datetime.datetime.now(datetime.timezone.utc)
+            month = (cursor.fetchone()[0] or now).astimezone(datetime.timezone.utc)\
+                .replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            last = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            for _ in range(MONTHS_AHEAD):
+                last = _next_month(last)
+            while month <= last:
+                cursor.execute("CREATE TABLE %s PARTITION OF %s FOR VALUES FROM ('%s') TO ('%s')" % (
+                    quote("%s_p%04d_%02d" % (TABLE, month.year, month.month)), quote(TABLE),
+                    month.isoformat(), _next_month(month).isoformat()
+                ))
+                month = _next_month(month)
+            cursor.execute("CREATE TABLE %s PARTITION OF %s DEFAULT" % (quote(DEFAULT_PARTITION), quote(TABLE)))
+        else:
+            cursor.execute("CREATE TABLE %s (LIKE %s)" % (quote(TABLE), quote(UNPARTITIONED)))
+            cursor.execute("ALTER TABLE %s ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY" % quote(TABLE))
+
+        cursor.execute("INSERT INTO %s SELECT * FROM %s" % (quote(TABLE), quote(UNPARTITIONED)))
+        cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), coalesce(max(id), 0) + 1, false) FROM " + quote(TABLE), [TABLE])
+        cursor.execute("DROP TABLE %s" % quote(UNPARTITIONED))
+
+        # Primary keys of partitioned tables have to contain the partition key
+        cursor.execute("ALTER TABLE %s ADD PRIMARY KEY (%s)" % (quote(TABLE), "id, date" if partitioned else "id"))
+        for definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute("ALTER TABLE %s ADD CONSTRAINT %s %s" % (quote(TABLE), quote(name), definition))
+
+
+def partition_transactions(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        _rebuild(schema_editor, partitioned=True)
+
+
+def unpartition_transactions(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        _rebuild(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0006_balanceshard'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='transaction',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='%(class)s_transaction', to='account.transaction'),
+        ),
+        migrations.RunPython(partition_transactions, unpartition_transactions),
+    ]
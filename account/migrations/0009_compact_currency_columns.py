@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:40
+
+import account.currencies
+import djmoney.money
+from django.conf import settings
+from django.db import migrations
+from moneyed import CURRENCIES
+
+# (model, money field) of every money field, their currencies are kept in "<field>_currency"
+MONEY_FIELDS = [
+    ("bankaccount", "balance"),
+    ("transaction", "amount"),
+    ("ledgerentry", "amount"),
+    ("ledgerentry", "balance"),
+    ("balanceshard", "balance"),
+    ("balancesnapshot", "balance"),
+]
+
+
+def _recode(apps, mapping):
+    for model_name, field in MONEY_FIELDS:
+        model = apps.get_model("account", model_name)
+        column = field + "_currency"
+        for value in model.objects.order_by().values_list(column, flat=True).distinct():
+            if value not in mapping:
+                raise ValueError("Currency %s of %s.%s has no ISO 4217 numeric code" % (value, model_name, column))
+            model.objects.filter(**{column: value}).update(**{column: mapping[value]})
+
+
+def codes_to_numbers(apps, schema_editor):
+    # Numbers are written as text first, the column type changes to smallint afterwards
+    _recode(apps, {code: str(int(currency.numeric)) for code, currency in CURRENCIES.items() if currency.numeric})
+
+
+def numbers_to_codes(apps, schema_editor):
+    # Some historic currencies share their numbers, configured ones win
+    codes = {str(int(currency.numeric)): code for code, currency in CURRENCIES.items() if currency.numeric}
+    codes.update((str(int(CURRENCIES[code].numeric)), code) for code in settings.CURRENCIES)
+    _recode(apps, codes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0008_balancesnapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(codes_to_numbers, numbers_to_codes),
+    ] + [
+        migrations.AlterField(
+            model_name=model_name,
+            name=field + '_currency',
+            field=account.currencies.CurrencyField(choices=[('GBP', 'British Pound')], default='GBP', editable=False, max_length=3),
+        )
+        for model_name, field in MONEY_FIELDS
+    ] + [
+        migrations.AlterField(
+            model_name='balanceshard',
+            name='balance',
+            field=account.currencies.MoneyField(decimal_places=2, default=djmoney.money.Money(0, 'GBP'), default_currency='GBP', max_digits=19),
+        ),
+    ] + [
+        migrations.AlterField(
+            model_name=model_name,
+            name=field,
+            field=account.currencies.MoneyField(decimal_places=2, default_currency='GBP', max_digits=19),
+        )
+        for model_name, field in MONEY_FIELDS if model_name != 'balanceshard'
+    ]
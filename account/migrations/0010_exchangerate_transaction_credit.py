@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:40
+
+import account.currencies
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0009_compact_currency_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='credit_currency',
+            field=account.currencies.CurrencyField(choices=[('GBP', 'British Pound'), ('EUR', 'Euro'), ('USD', 'US Dollar')], default=None, editable=False, max_length=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='credit',
+            field=account.currencies.MoneyField(blank=True, decimal_places=2, max_digits=19, null=True),
+        ),
+        migrations.AlterField(
+            model_name='balanceshard',
+            name='balance_currency',
+            field=account.currencies.CurrencyField(choices=[('GBP', 'British Pound'), ('EUR', 'Euro'), ('USD', 'US Dollar')], default='GBP', editable=False, max_length=3),
+        ),
+        migrations.AlterField(
+            model_name='balancesnapshot',
+            name='balance_currency',
+            field=account.currencies.CurrencyField(choices=[('GBP', 'British Pound'), ('EUR', 'Euro'), ('USD', 'US Dollar')], default='GBP', editable=False, max_length=3),
+        ),
+        migrations.AlterField(
+            model_name='bankaccount',
+            name='balance_currency',
+            field=account.currencies.CurrencyField(choices=[('GBP', 'British Pound'), ('EUR', 'Euro'), ('USD', 'US Dollar')], default='GBP', editable=False, max_length=3),
+        ),
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='amount_currency',
+            field=account.currencies.CurrencyField(choices=[('GBP', 'British Pound'), ('EUR', 'Euro'), ('USD', 'US Dollar')], default='GBP', editable=False, max_length=3),
+        ),
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='balance_currency',
+            field=account.currencies.CurrencyField(choices=[('GBP', 'British Pound'), ('EUR', 'Euro'), ('USD', 'US Dollar')], default='GBP', editable=False, max_length=3),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='amount_currency',
+            field=account.currencies.CurrencyField(choices=[('GBP', 'British Pound'), ('EUR', 'Euro'), ('USD', 'US Dollar')], default='GBP', editable=False, max_length=3),
+        ),
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('base', account.currencies.CurrencyField(choices=[('GBP', 'British Pound'), ('EUR', 'Euro'), ('USD', 'US Dollar')], default=None, max_length=3)),
+                ('quote', account.currencies.CurrencyField(choices=[('GBP', 'British Pound'), ('EUR', 'Euro'), ('USD', 'US Dollar')], default=None, max_length=3)),
+                ('rate', models.DecimalField(decimal_places=10, max_digits=20)),
+            ],
+            options={
+                'verbose_name': 'Exchange rate',
+                'verbose_name_plural': 'Exchange rates',
+                'ordering': ['version', 'base', 'quote'],
+                'constraints': [models.UniqueConstraint(fields=('version', 'base', 'quote'), name='exchange_rate_version_pair_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0010_exchangerate_transaction_credit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(max_length=64)),
+                ('payload', models.TextField()),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('recipient_account', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='%(class)s_recipient_account', to='account.bankaccount')),
+                ('sender_account', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='%(class)s_sender_account', to='account.bankaccount')),
+            ],
+            options={
+                'verbose_name': 'Outbox event',
+                'verbose_name_plural': 'Outbox events',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['sender_account', 'id'], name='outbox_sender_id_idx'), models.Index(fields=['recipient_account', 'id'], name='outbox_recipient_id_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OutboxOffset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('consumer', models.CharField(max_length=255, unique=True)),
+                ('position', models.BigIntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Outbox offset',
+                'verbose_name_plural': 'Outbox offsets',
+                'ordering': ['consumer'],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:40
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_created(apps, schema_editor):
+    # Accounts were opened with their opening ledger entry, or along with their owner when they predate the ledger
+    BankAccount = apps.get_model("account", "BankAccount")
+    Customer = apps.get_model("account", "Customer")
+    LedgerEntry = apps.get_model("account", "LedgerEntry")
+
+    opening = LedgerEntry.objects.filter(account_id=OuterRef("pk"), transaction__isnull=True, shard__isnull=True)\
+        .order_by("date", "id").values("date")[:1]
+    owner = Customer.objects.filter(pk=OuterRef("owner_id")).values("created")[:1]
+    BankAccount.objects.using(schema_editor.connection.alias).update(
+        created=Coalesce(Subquery(opening), Subquery(owner))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0011_outboxevent_outboxoffset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bankaccount',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_created, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
+from django.utils import timezone
 
-from djmoney.models.fields import MoneyField
+from djmoney.settings import CURRENCY_CHOICES
+
+from account.currencies import CurrencyField, MoneyField
 from django.conf import settings
 
 
@@ -24,6 +27,8 @@ class BankAccount(models.Model):
 
     owner = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='%(class)s_owner')
     balance = MoneyField(max_digits=19, decimal_places=2, default_currency='GBP')
+    # Point-in-time balances before it are zero, see account.snapshots
+    created = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return "{} bank account: {}".format(self.owner.name, self.id)
@@ -40,6 +45,9 @@ class Transaction(models.Model):
     sender_account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name='%(class)s_sender_account')
     recipient_account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name='%(class)s_recipient_account')
     amount = MoneyField(max_digits=19, decimal_places=2, default_currency='GBP')
+    # Amount credited to the recipient in the currency of its account when it differs from the sender's,
+    # see account.exchange. Null when both accounts are held in the same currency.
+    credit = MoneyField(max_digits=19, decimal_places=2, default_currency=None, null=True, blank=True)
     date = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -49,3 +57,194 @@ class Transaction(models.Model):
         verbose_name = "Transaction"
         verbose_name_plural = "Transactions"
         ordering = ['date']
+        indexes = [
+            # Account history is read per side in (date, id) order, see account.history
+            models.Index(fields=['sender_account', 'date', 'id'], name='transaction_sender_date_idx'),
+            models.Index(fields=['recipient_account', 'date', 'id'], name='transaction_recipient_date_idx'),
+        ]
+
+
+class LedgerEntry(models.Model):
+    """ Model represents an append-only entry of a banking account ledger """
+
+    # Covered by the (account, date, id) index below
+    account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name='%(class)s_account', db_index=False)
+    # Opening entries of an account have no transaction. Entries outlive transactions moved to the archive, and
+    # partitioned transaction tables can't be referenced by a foreign key constraint, see account.partitions
+    transaction = models.ForeignKey(
+        Transaction, on_delete=models.DO_NOTHING, related_name='%(class)s_transaction', null=True, blank=True,
+        db_constraint=False
+    )
+    amount = MoneyField(max_digits=19, decimal_places=2, default_currency='GBP')
+    balance = MoneyField(max_digits=19, decimal_places=2, default_currency='GBP')
+    date = models.DateTimeField(default=timezone.now)
+    # Balance shard the entry moved money on, None for the balance of the banking account row itself.
+    # ``balance`` is the running balance of that row.
+    shard = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    def __str__(self):
+        return "Account: {} Amount: {} Balance: {}".format(self.account_id, self.amount, self.balance)
+
+    class Meta:
+        verbose_name = "Ledger entry"
+        verbose_name_plural = "Ledger entries"
+        ordering = ['date', 'id']
+        indexes = [
+            models.Index(fields=['account', 'date', 'id'], name='ledger_account_date_idx'),
+        ]
+
+
+class BalanceShard(models.Model):
+    """ Model represents a part of the balance of a hot banking account, see account.shards """
+
+    # Covered by the (account, shard) unique constraint below
+    account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name='%(class)s_account', db_index=False)
+    shard = models.PositiveSmallIntegerField()
+    balance = MoneyField(max_digits=19, decimal_places=2, default_currency='GBP', default=0)
+
+    def __str__(self):
+        return "Account: {} Shard: {} Balance: {}".format(self.account_id, self.shard, self.balance)
+
+    class Meta:
+        verbose_name = "Balance shard"
+        verbose_name_plural = "Balance shards"
+        ordering = ['account', 'shard']
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'shard'], name='balance_shard_account_shard_uniq'),
+        ]
+
+
+class BalanceSnapshot(models.Model):
+    """ Model represents the balance of a banking account at a moment, see account.snapshots """
+
+    # Covered by the (account, date) unique constraint below
+    account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name='%(class)s_account', db_index=False)
+    balance = MoneyField(max_digits=19, decimal_places=2, default_currency='GBP')
+    date = models.DateTimeField()
+
+    def __str__(self):
+        return "Account: {} Date: {} Balance: {}".format(self.account_id, self.date, self.balance)
+
+    class Meta:
+        verbose_name = "Balance snapshot"
+        verbose_name_plural = "Balance snapshots"
+        ordering = ['account', 'date']
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'date'], name='balance_snapshot_account_date_uniq'),
+        ]
+
+
+class ExchangeRate(models.Model):
+    """ Model represents the rate of a currency pair in a version of exchange rates, see account.exchange """
+
+    # Every load_exchange_rates run writes a new version, processes use the latest one
+    version = models.PositiveIntegerField()
+    base = CurrencyField(choices=CURRENCY_CHOICES)
+    quote = CurrencyField(choices=CURRENCY_CHOICES)
+    # Units of the quote currency one unit of the base currency buys
+    rate = models.DecimalField(max_digits=20, decimal_places=10)
+
+    def __str__(self):
+        return "{}/{} {} (version {})".format(self.base, self.quote, self.rate, self.version)
+
+    class Meta:
+        verbose_name = "Exchange rate"
+        verbose_name_plural = "Exchange rates"
+        ordering = ['version', 'base', 'quote']
+        constraints = [
+            models.UniqueConstraint(fields=['version', 'base', 'quote'], name='exchange_rate_version_pair_uniq'),
+        ]
+
+
+class OutboxEvent(models.Model):
+    """ Model represents an event of the transactional outbox, see account.outbox """
+
+    topic = models.CharField(max_length=64)
+    # Accounts the event concerns, events of an account are read through the (account, id) indexes below. Events
+    # outlive the rows they describe until purged, so there's no constraint.
+    sender_account = models.ForeignKey(
+        BankAccount, on_delete=models.DO_NOTHING, related_name='%(class)s_sender_account', db_index=False,
+        db_constraint=False
+    )
+    recipient_account = models.ForeignKey(
+        BankAccount, on_delete=models.DO_NOTHING, related_name='%(class)s_recipient_account', db_index=False,
+        db_constraint=False
+    )
+    # Rendered JSON of the event
+    payload = models.TextField()
+    created = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return "{} {}".format(self.topic, self.id)
+
+    class Meta:
+        verbose_name = "Outbox event"
+        verbose_name_plural = "Outbox events"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['sender_account', 'id'], name='outbox_sender_id_idx'),
+            models.Index(fields=['recipient_account', 'id'], name='outbox_recipient_id_idx'),
+        ]
+
+
+class OutboxOffset(models.Model):
+    """ Model represents the position of a consumer of the outbox, the id of the last event relayed to it """
+
+    consumer = models.CharField(max_length=255, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return "{}: {}".format(self.consumer, self.position)
+
+    class Meta:
+        verbose_name = "Outbox offset"
+        verbose_name_plural = "Outbox offsets"
+        ordering = ['consumer']
+
+
+class IdempotencyKey(models.Model):
+    """ Model represents the stored outcome of a request made with an Idempotency-Key header """
+
+    # API action the key was used with, keys of different actions never collide
+    scope = models.CharField(max_length=64)
+    key = models.CharField(max_length=255)
+    # SHA-256 of the request, replays of a key with a different request are rejected
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    # Rendered JSON body, empty until the request completes
+    response = models.TextField(null=True, blank=True)
+    expires = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return "{}: {}".format(self.scope, self.key)
+
+    class Meta:
+        verbose_name = "Idempotency key"
+        verbose_name_plural = "Idempotency keys"
+        constraints = [
+            # Serves replay lookups and serializes concurrent requests with the same key
+            models.UniqueConstraint(fields=['scope', 'key'], name='idempotency_scope_key_uniq'),
+        ]
+
+
+class ApiRequestLog(models.Model):
+    """ Model represents a logged API request, written in batches by account.request_log """
+
+    api = models.CharField(max_length=1024)
+    method = models.CharField(max_length=10)
+    status_code = models.PositiveSmallIntegerField()
+    # Seconds spent in the application, network time excluded
+    execution_time = models.FloatField()
+    client_ip_address = models.CharField(max_length=50, blank=True)
+    body = models.TextField(blank=True)
+    response = models.TextField(blank=True)
+    added_on = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return "{} {} {}".format(self.method, self.api, self.status_code)
+
+    class Meta:
+        verbose_name = "API request log"
+        verbose_name_plural = "API request logs"
+        ordering = ['-added_on']
@@ -0,0 +1,28 @@
+"""
+Integer minor-unit money arithmetic.
+
+Balances and amounts are stored as decimals by django-money's ``MoneyField``. Exchange rate conversions
+work on integers of minor units (pence) so they round exactly, see ``account.exchange``.
+"""
+
+from decimal import Decimal
+
+from account.models import BankAccount
+
+# Decimal places of the balance and amount columns, minor units being 10 ** DECIMAL_PLACES of a major unit
+DECIMAL_PLACES = BankAccount._meta.get_field("balance").decimal_places
+
+
+def to_minor(amount):
+    """ Converts a decimal amount to an integer of minor units, refusing fractions of a minor unit """
+
+    units = amount.scaleb(DECIMAL_PLACES)
+    if units != units.to_integral_value():
+        raise ValueError("%s has more than %s decimal places" % (amount, DECIMAL_PLACES))
+    return int(units)
+
+
+def from_minor(units):
+    """ Converts an integer of minor units back to a decimal amount with the column's decimal places """
+
+    return Decimal(units).scaleb(-DECIMAL_PLACES)
@@ -0,0 +1,83 @@
+from django.db import connection, transaction as db_transaction
+from django.db.utils import IntegrityError
+
+from djmoney.money import Money
+
+from account.ledger import open_ledgers
+from account.models import BankAccount, Customer
+
+# A customer created concurrently between the duplicate check and the insert fails the whole insert,
+# the next attempt sees it and reports the name as a duplicate
+ATTEMPTS = 2
+
+
+class OnboardingError(Exception):
+    """ Base class for errors of customer onboarding """
+
+
+class CustomerAlreadyExists(OnboardingError):
+    """ A customer with the same name exists or comes earlier in the same batch """
+
+    def __init__(self, name):
+        super().__init__("Customer '%s' already exists" % name)
+        self.name = name
+
+
+def _create(model, objects):
+    """ Inserts objects in bulk where the backend returns primary keys from bulk inserts """
+
+    if connection.features.can_return_rows_from_bulk_insert:
+        return model.objects.bulk_create(objects)
+
+    for obj in objects:
+        obj.save()
+    return objects
+
+
+def _onboard(customers, atomic):
+    results = [None] * len(customers)
+    names = {name for name, _, _ in customers}
+    taken = set(Customer.objects.filter(name__in=names).order_by().values_list("name", flat=True))
+
+    accepted = []
+    for index, (name, _, _) in enumerate(customers):
+        if name in taken:
+            results[index] = CustomerAlreadyExists(name)
+            continue
+        taken.add(name)
+        accepted.append(index)
+
+    if atomic and len(accepted) != len(customers):
+        return results
+
+    with db_transaction.atomic():
+        created = _create(Customer, [Customer(name=customers[index][0]) for index in accepted])
+        accounts = _create(BankAccount, [
+            BankAccount(owner=customer, balance=Money(*customers[index][1:])) for index, customer in zip(accepted, created)
+        ])
+        open_ledgers(accounts)
+
+    for index, customer, account in zip(accepted, created, accounts):
+        results[index] = (customer, account)
+    return results
+
+
+def onboard_customers(customers, atomic=True):
+    """
+    Creates many customers, each one with a banking account holding the initial deposit, given as
+    (name, deposit_amount, currency) tuples.
+
+    Names already taken are found with a single ``name__in`` query, customers, accounts and their
+    opening ledger entries are written with ``bulk_create`` in one transaction. Returns a list aligned
+    with ``customers`` holding the created (Customer, BankAccount) pair or the OnboardingError of every
+    item. When ``atomic`` is set, a single failure means nothing is created and successful items are
+    returned as None.
+    """
+
+    customers = list(customers)
+    for attempt in range(1, ATTEMPTS + 1):
+        try:
+            return _onboard(customers, atomic)
+        except IntegrityError:
+            if attempt == ATTEMPTS:
+                raise
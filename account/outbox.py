@@ -0,0 +1,402 @@
+"""
+Transactional outbox of transaction events.
+
+Every Transaction is written with an ``OutboxEvent`` holding its JSON in the same database transaction,
+so an event exists exactly when its transaction committed. ``Relay`` tails the outbox in batches of
+``OUTBOX_BATCH_SIZE`` events, publishes them to a sink, see ``get_sink``, and only then moves the
+``OutboxOffset`` of its consumer past them: delivery is at least once, a relay stopped in between
+publishes the batch again and consumers tell repeated events apart by their id. Event streams of
+``/accounts/<id>/events/`` read the same rows, see ``account.events``.
+
+Event ids are handed out when rows are inserted, not when their transactions commit, so an event may
+become visible after events with higher ids were read. Readers stop at a gap in ids until it fills or
+every transaction running when the ids after it were read is over, the missing id having rolled back
+then, see ``Gaps``. No clock is involved, a late commit is never skipped.
+"""
+
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from itertools import takewhile
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction as db_transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from account.models import OutboxEvent, OutboxOffset
+
+TRANSACTION_CREATED = "transaction.created"
+
+DEFAULT_CONSUMER = "default"
+
+CENT = Decimal("0.01")
+
+# Events inserted per statement
+WRITE_CHUNK_SIZE = 1000
+
+PURGE_CHUNK_SIZE = 1000
+
+# Seconds a socket sink waits to connect or to send a batch
+SOCKET_TIMEOUT = 10.0
+
+# Seconds between two looks at the running transactions while waiting for them to end
+SNAPSHOT_WAIT = 0.01
+
+
+def _amount(money):
+    return None if money is None else format(Decimal(money.amount).quantize(CENT), "f")
+
+
+def _currency(money):
+    return None if money is None else str(money.currency)
+
+
+def _datetime(value):
+    value = value.isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def transaction_payload(transaction):
+    """ Returns the JSON of a transaction event, the fields of a transaction in the history of an account """
+
+    return json.dumps({
+        "id": transaction.pk,
+        "amount_currency": _currency(transaction.amount),
+        "amount": _amount(transaction.amount),
+        "credit_currency": _currency(transaction.credit),
+        "credit": _amount(transaction.credit),
+        "date": _datetime(transaction.date),
+        "sender_account": transaction.sender_account_id,
+        "recipient_account": transaction.recipient_account_id,
+    }, separators=(",", ":"))
+
+
+def write_transaction_events(transactions):
+    """ Writes a transaction.created event per saved transaction, within the database transaction creating them """
+
+    if not settings.OUTBOX_ENABLED:
+        return
+    created = timezone.now()
+    OutboxEvent.objects.bulk_create([
+        OutboxEvent(
+            topic=TRANSACTION_CREATED,
+            sender_account_id=transaction.sender_account_id,
+            recipient_account_id=transaction.recipient_account_id,
+            payload=transaction_payload(transaction),
+            created=created
+        )
+        for transaction in transactions
+    ], batch_size=WRITE_CHUNK_SIZE)
+
+
+def transaction_snapshot():
+    """
+    Returns (xmin, xmax) of the current PostgreSQL snapshot: transactions below xmin are over, those from
+    xmax on started after it. Returns None on other databases, which run one writer at a time, so ids
+    missing below the highest committed one are final.
+    """
+
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT txid_snapshot_xmin(txid_current_snapshot()), txid_snapshot_xmax(txid_current_snapshot())"
+        )
+        return cursor.fetchone()
+
+
+class Gaps:
+    """
+    Tells the gaps in event ids which are final. Writers take their transaction id before the id of their
+    events, so an id missing from a read belongs to a transaction which started before the read or is
+    gone. Once the oldest running transaction started after the read, ids missing up to the highest id it
+    returned never show up.
+    """
+
+    def __init__(self, snapshot=transaction_snapshot):
+        self._snapshot = snapshot
+        # Ids up to this one are either readable or gone
+        self.final = 0
+        # (xmax after a read, highest id it returned)
+        self._fence = None
+
+    def check(self):
+        """ Moves ``final`` past the ids of a read whose transactions are over, called before reading """
+
+        if self._fence is None:
+            return
+        snapshot = self._snapshot()
+        if snapshot is None or snapshot[0] >= self._fence[0]:
+            self.final = max(self.final, self._fence[1])
+            self._fence = None
+
+    def settled(self, events, after):
+        """
+        Returns the leading events of rows read in id order after the id ``after``, starting with their id,
+        up to the first gap in ids which isn't final yet
+        """
+
+        expected = after + 1
+        for index, event in enumerate(events):
+            if event[0] != expected and event[0] - 1 > self.final:
+                snapshot = self._snapshot()
+                if snapshot is None:
+                    self.final = events[-1][0]
+                    return events
+                if self._fence is None:
+                    self._fence = (snapshot[1], events[-1][0])
+                return events[:index]
+            expected = event[0] + 1
+        return events
+
+    def wait(self, last):
+        """ Waits until ids missing up to ``last``, read before the call, are final """
+
+        fence = self._snapshot()
+        while fence is not None and self._snapshot()[0] < fence[1]:
+            time.sleep(SNAPSHOT_WAIT)
+        self.final = max(self.final, last)
+
+
+def first_position():
+    """ Returns the id before the oldest event kept, where a reader without a position starts """
+
+    first = OutboxEvent.objects.aggregate(first=Min("pk"))["first"]
+    return 0 if first is None else first - 1
+
+
+def event_line(pk, topic, created, payload):
+    """ Returns an event as a line of NDJSON, its payload under "data" """
+
+    return ('{"id":%d,"topic":%s,"created":"%s","data":%s}\n' % (
+        pk, json.dumps(topic), _datetime(created), payload
+    )).encode()
+
+
+class Horizon:
+    """
+    Id up to which every event of the outbox is settled, as seen by this process. It is advanced at most
+    every EVENTS_POLL_INTERVAL seconds, however many event streams ask for it.
+    """
+
+    def __init__(self, snapshot=transaction_snapshot):
+        self._snapshot = snapshot
+        self._lock = threading.Lock()
+        self._position = None
+        self._checked = None
+        self._gaps = Gaps(snapshot)
+
+    def position(self):
+        checked = self._checked
+        if checked is None or time.monotonic() - checked >= settings.EVENTS_POLL_INTERVAL:
+            with self._lock:
+                if self._checked is checked:
+                    self._advance()
+        return self._position
+
+    def _advance(self):
+        if self._position is None:
+            # Starts at the latest event once the transactions which may hold lower ids are over
+            last = OutboxEvent.objects.aggregate(last=Max("pk"))["last"]
+            if last is None:
+                self._position = first_position()
+            else:
+                self._gaps.wait(last)
+                self._position = last
+
+        batch_size = settings.OUTBOX_BATCH_SIZE
+        while True:
+            self._gaps.check()
+            events = self._gaps.settled(list(
+                OutboxEvent.objects.filter(pk__gt=self._position).order_by("pk").values_list("pk")[:batch_size]
+            ), self._position)
+            if events:
+                self._position = events[-1][0]
+            if len(events) < batch_size:
+                break
+        self._checked = time.monotonic()
+
+    def reset(self):
+        """ Forgets the position, the next call reads it again """
+
+        with self._lock:
+            self._position = None
+            self._checked = None
+            self._gaps = Gaps(self._snapshot)
+
+
+HORIZON = Horizon()
+
+
+def account_events(account_id, after, until, limit):
+    """ Returns (id, topic, payload) of up to ``limit`` events of an account with ids in (after, until] """
+
+    events = OutboxEvent.objects.filter(pk__gt=after, pk__lte=until)
+    sent = events.filter(sender_account_id=account_id).values_list("pk", "topic", "payload")
+    received = events.filter(recipient_account_id=account_id).values_list("pk", "topic", "payload")
+    if connection.features.supports_slicing_ordering_in_compound:
+        sent, received = sent.order_by("pk")[:limit], received.order_by("pk")[:limit]
+    else:
+        sent, received = sent.order_by(), received.order_by()
+    # Transfers never go from an account to itself, the two halves don't overlap
+    return list(sent.union(received, all=True).order_by("pk")[:limit])
+
+
+class FileSink:
+    """ Appends events to an NDJSON file, flushed to disk before the relay moves its position """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def publish(self, lines):
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, "ab")
+        self._file.write(b"".join(lines))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SocketSink:
+    """
+    Writes events as NDJSON to a Unix stream socket, connecting again after a failure. A batch which
+    failed midway is sent again in full, readers skip a partial line and events already seen.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._socket = None
+
+    def publish(self, lines):
+        if self._socket is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(SOCKET_TIMEOUT)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            self._socket = sock
+        try:
+            self._socket.sendall(b"".join(lines))
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+class QueueSink:
+    """ Puts event lines on a queue of this process, for tests and consumers living next to the relay """
+
+    def __init__(self, events=None):
+        self.queue = queue.Queue() if events is None else events
+
+    def publish(self, lines):
+        for line in lines:
+            self.queue.put(line)
+
+    def close(self):
+        pass
+
+
+def get_sink(spec):
+    """ Returns the sink of a "file:<path>" or "socket:<path>" spec, such as OUTBOX_SINK """
+
+    kind, _, path = spec.partition(":")
+    if kind == "file" and path:
+        return FileSink(path)
+    if kind == "socket" and path:
+        return SocketSink(path)
+    raise ImproperlyConfigured("Unknown outbox sink %r, expected file:<path> or socket:<path>" % spec)
+
+
+class Relay:
+    """ Publishes the events of the outbox to a sink in batches and keeps the position of its consumer """
+
+    def __init__(self, sink, consumer=DEFAULT_CONSUMER, batch_size=None, snapshot=transaction_snapshot):
+        self.sink = sink
+        self.consumer = consumer
+        self.batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        self.gaps = Gaps(snapshot)
+
+    def relay_batch(self):
+        """ Publishes the next batch of settled events, returns the number of events published """
+
+        with db_transaction.atomic():
+            offsets = OutboxOffset.objects.all()
+            # Relays of the same consumer take turns, a second one waits rather than publishing twice
+            if connection.features.has_select_for_update:
+                offsets = offsets.select_for_update()
+            offset = offsets.filter(consumer=self.consumer).first()
+            if offset is None:
+                offset = OutboxOffset.objects.create(consumer=self.consumer, position=first_position())
+
+            self.gaps.check()
+            events = self.gaps.settled(list(
+                OutboxEvent.objects.filter(pk__gt=offset.position).order_by("pk")
+                .values_list("pk", "created", "topic", "payload")[:self.batch_size]
+            ), offset.position)
+            if not events:
+                return 0
+
+            self.sink.publish([event_line(pk, topic, created, payload) for pk, created, topic, payload in events])
+            offset.position = events[-1][0]
+            offset.save(update_fields=["position", "updated"])
+        return len(events)
+
+    def run(self, poll_interval, stop=None):
+        """
+        Relays batches until ``stop``, a threading.Event, is set, waiting ``poll_interval`` seconds whenever
+        the outbox is drained. Yields the number of events published by every batch.
+        """
+
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            published = self.relay_batch()
+            if published:
+                yield published
+            if published < self.batch_size:
+                stop.wait(poll_interval)
+
+
+def purge_events(now=None, chunk_size=PURGE_CHUNK_SIZE):
+    """
+    Deletes events older than OUTBOX_RETENTION_HOURS which every consumer got, chunk by chunk in id order,
+    yields the number of events deleted by every chunk
+    """
+
+    cutoff = (now or timezone.now()) - timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+    events = OutboxEvent.objects.all()
+    delivered = OutboxOffset.objects.aggregate(position=Min("position"))["position"]
+    if delivered is not None:
+        events = events.filter(pk__lte=delivered)
+
+    last = 0
+    while True:
+        chunk = list(events.filter(pk__gt=last).order_by("pk").values_list("pk", "created")[:chunk_size])
+        expired = [pk for pk, _ in takewhile(lambda event: event[1] < cutoff, chunk)]
+        if expired:
+            OutboxEvent.objects.filter(pk__in=expired).delete()
+            yield len(expired)
+            last = expired[-1]
+        if len(expired) < chunk_size:
+            return
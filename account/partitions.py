@@ -0,0 +1,117 @@
+"""
+Monthly range partitions of the transaction table.
+
+On PostgreSQL migration 0007 turns ``account_transaction`` into a table partitioned by month of
+``date`` with a default partition catching rows of months without their own partition.
+``create_partitions`` creates the partitions of upcoming months ahead of time, see the
+``create_transaction_partitions`` command, and ``drop_partition`` lets the archival drop a whole month
+at once, see ``account.archive``. Other backends keep a plain table.
+"""
+
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction as db_transaction
+from django.utils import timezone
+
+from account.models import Transaction
+
+TABLE = Transaction._meta.db_table
+DEFAULT_PARTITION = "%s_default" % TABLE
+
+PARTITION_NAME = re.compile(r"^%s_p(\d{4})_(\d{2})$" % TABLE)
+
+
+def month_start(value):
+    """ Returns the first moment of the month of an aware datetime, in UTC """
+
+    return value.astimezone(dt_timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, count):
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return month.replace(year=month.year + years, month=month_index + 1)
+
+
+def partition_name(month):
+    return "%s_p%04d_%02d" % (TABLE, month.year, month.month)
+
+
+def is_partitioned():
+    """ Tells whether the transaction table is partitioned, which it only is on PostgreSQL """
+
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [TABLE])
+        return cursor.fetchone() is not None
+
+
+def partitions():
+    """ Returns the names of the partitions of the transaction table """
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid"
+            " WHERE pg_inherits.inhparent = to_regclass(%s) ORDER BY child.relname",
+            [TABLE]
+        )
+        return [name for name, in cursor.fetchall()]
+
+
+def partition_months():
+    """ Returns the months which have their own partition, in ascending order """
+
+    months = []
+    for name in partitions():
+        match = PARTITION_NAME.match(name)
+        if match:
+            months.append(datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=dt_timezone.utc))
+    return months
+
+
+def _bounds(month):
+    return "FOR VALUES FROM ('%s') TO ('%s')" % (month.isoformat(), add_months(month, 1).isoformat())
+
+
+def create_partition(month):
+    """
+    Creates the partition of a month. Rows of the month which went to the default partition meanwhile
+    are moved over, the partition is attached only once it holds them.
+    """
+
+    quote = connection.ops.quote_name
+    name = partition_name(month)
+    condition = "date >= '%s' AND date < '%s'" % (month.isoformat(), add_months(month, 1).isoformat())
+    with db_transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("CREATE TABLE %s (LIKE %s INCLUDING DEFAULTS)" % (quote(name), quote(TABLE)))
+        cursor.execute("INSERT INTO %s SELECT * FROM %s WHERE %s" % (quote(name), quote(DEFAULT_PARTITION), condition))
+        cursor.execute("DELETE FROM %s WHERE %s" % (quote(DEFAULT_PARTITION), condition))
+        cursor.execute("ALTER TABLE %s ATTACH PARTITION %s %s" % (quote(TABLE), quote(name), _bounds(month)))
+
+
+def create_partitions(months_ahead, now=None):
+    """ Creates the missing partitions of the current and the next ``months_ahead`` months, returns their names """
+
+    existing = set(partitions())
+    current = month_start(now or timezone.now())
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if partition_name(month) not in existing:
+            create_partition(month)
+            created.append(partition_name(month))
+    return created
+
+
+def drop_partition(month):
+    """ Detaches and drops the partition of a month, returns False when the month has no partition """
+
+    if partition_name(month) not in partitions():
+        return False
+
+    quote = connection.ops.quote_name
+    with db_transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("ALTER TABLE %s DETACH PARTITION %s" % (quote(TABLE), quote(partition_name(month))))
+        cursor.execute("DROP TABLE %s" % quote(partition_name(month)))
+    return True
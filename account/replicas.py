@@ -0,0 +1,143 @@
+"""
+Read replica routing.
+
+Requests to the read-only endpoints listed in ``REPLICA_READ_VIEWS`` read from one of the replica
+databases configured with ``SQL_REPLICAS``, chosen at random. Everything else, writes and reads made
+within a transaction included, goes to the primary. A client which has just written something gets a
+cookie pinning its reads to the primary for ``REPLICA_STICKY_SECONDS``, so it reads its own writes
+even while the replicas lag behind.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import StreamingHttpResponse
+from django.urls import Resolver404, resolve
+
+STICKY_COOKIE = "db_primary"
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Alias of the replica the current request reads from, None reads from the primary
+_read_alias = ContextVar("replica_read_alias", default=None)
+
+
+def current_replica():
+    """ Returns the alias of the replica the current request reads from, None for the primary """
+
+    return _read_alias.get()
+
+
+@contextmanager
+def use_replica(alias):
+    """ Routes reads made within the block, outside of transactions, to the given database alias """
+
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """ Sends reads to the replica chosen for the request, see ReplicaMiddleware, and writes to the primary """
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        return db == DEFAULT_DB_ALIAS
+
+
+def _stream(content, alias):
+    # Streamed bodies are read after the middleware returned, every chunk is routed again
+    iterator = iter(content)
+    while True:
+        with use_replica(alias):
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+        yield chunk
+
+
+async def _astream(content, alias):
+    iterator = aiter(content)
+    while True:
+        with use_replica(alias):
+            try:
+                chunk = await anext(iterator)
+            except StopAsyncIteration:
+                return
+        yield chunk
+
+
+class ReplicaMiddleware:
+    """ Chooses the database reads of a request go to and pins clients which have just written to the primary """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _replica(request):
+        if STICKY_COOKIE in request.COOKIES:
+            return None
+        try:
+            match = resolve(request.path_info, getattr(request, "urlconf", None))
+        except Resolver404:
+            return None
+        if match.url_name not in settings.REPLICA_READ_VIEWS:
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    @staticmethod
+    def _finish(request, response, alias):
+        if alias is not None:
+            if isinstance(response, StreamingHttpResponse):
+                stream = _astream if response.is_async else _stream
+                response.streaming_content = stream(response.streaming_content, alias)
+        elif request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                STICKY_COOKIE, "1", max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite="Lax"
+            )
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        alias = self._replica(request)
+        with use_replica(alias):
+            response = self.get_response(request)
+        return self._finish(request, response, alias)
+
+    async def __acall__(self, request):
+        alias = self._replica(request)
+        with use_replica(alias):
+            response = await self.get_response(request)
+        return self._finish(request, response, alias)
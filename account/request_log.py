@@ -0,0 +1,241 @@
+"""
+Batched API request logging.
+
+``ApiRequestLogMiddleware`` collects a record per API request and hands it to ``writer``, which
+buffers records in a bounded in-process queue and writes them from a background thread, in batches of
+``API_LOG_BATCH_SIZE`` or every ``API_LOG_FLUSH_INTERVAL`` seconds, either to the ``ApiRequestLog``
+table with a single ``bulk_create`` or to a rotating NDJSON file, depending on ``API_LOG_SINK``.
+Requests never wait for the log: when the queue fills up successful requests are sampled and once
+it is full records are dropped, both counted in ``writer.stats()``.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from account.models import ApiRequestLog
+
+DATABASE = "database"
+NDJSON = "ndjson"
+
+# Share of the queue filled before successful requests are sampled
+PRESSURE_RATIO = 0.75
+
+BODY_MAX_LENGTH = 4096
+
+LOG_FILE_MAX_BYTES = 100 * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 5
+
+SKIPPED_PREFIXES = ("/admin/", "/static/", "/api/schema/", "/metrics")
+
+logger = logging.getLogger(__name__)
+
+
+class RequestLogWriter:
+    """ Buffers API request records and writes them in batches """
+
+    def __init__(self, background=True):
+        self.background = background
+        self._queue = None
+        self._pid = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stats = Counter()
+        self._file_handler = None
+
+    def _ensure_started(self):
+        # Threads don't survive a fork, so the queue and the thread are set up lazily in every worker
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=settings.API_LOG_QUEUE_SIZE)
+            self._stop = threading.Event()
+            if self.background:
+                self._thread = threading.Thread(target=self._run, name="api-request-log", daemon=True)
+                self._thread.start()
+            self._pid = os.getpid()
+
+    def enqueue(self, record):
+        """ Queues a record without blocking, returns False if it was sampled out or dropped """
+
+        self._ensure_started()
+        if (
+            self._queue.qsize() >= self._queue.maxsize * PRESSURE_RATIO
+            and record["status_code"] < 400
+            and random.random() >= settings.API_LOG_PRESSURE_SAMPLE_RATE
+        ):
+            self._count(sampled_out=1)
+            return False
+
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._count(dropped=1)
+            return False
+
+        self._count(queued=1)
+        return True
+
+    def stats(self):
+        with self._start_lock:
+            return dict(self._stats)
+
+    def _count(self, **counters):
+        with self._start_lock:
+            self._stats.update(counters)
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+                # The thread keeps its own connection, honor CONN_MAX_AGE like requests do
+                close_old_connections()
+
+    def _collect(self):
+        """ Waits for a full batch or the flush interval, whichever comes first """
+
+        batch = []
+        deadline = time.monotonic() + settings.API_LOG_FLUSH_INTERVAL
+        while len(batch) < settings.API_LOG_BATCH_SIZE and not self._stop.is_set():
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(timeout, 0.5)))
+            except queue.Empty:
+                pass
+        return batch
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def flush(self):
+        """ Writes all queued records from the calling thread """
+
+        if self._queue is None:
+            return
+        batch = self._drain()
+        for start in range(0, len(batch), settings.API_LOG_BATCH_SIZE):
+            self._write(batch[start:start + settings.API_LOG_BATCH_SIZE])
+
+    def close(self):
+        """ Stops the background thread and flushes what is left, called on worker shutdown """
+
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=settings.API_LOG_FLUSH_INTERVAL + 5)
+        self.flush()
+        # The next record starts over with a new queue and thread
+        self._pid = None
+
+    def _write(self, batch):
+        sink = settings.API_LOG_SINK
+        with self._write_lock:
+            try:
+                if sink == NDJSON:
+                    self._write_ndjson(batch)
+                elif sink == DATABASE:
+                    ApiRequestLog.objects.bulk_create([ApiRequestLog(**record) for record in batch])
+            except Exception as e:
+                self._count(failed=len(batch))
+                logger.warning("Failed to write %s API request log records: %s", len(batch), e)
+            else:
+                self._count(written=len(batch))
+
+    def _write_ndjson(self, batch):
+        if self._file_handler is None or self._file_handler.baseFilename != os.path.abspath(settings.API_LOG_FILE):
+            os.makedirs(os.path.dirname(os.path.abspath(settings.API_LOG_FILE)), exist_ok=True)
+            self._file_handler = logging.handlers.RotatingFileHandler(
+                settings.API_LOG_FILE, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUP_COUNT, delay=True
+            )
+        for record in batch:
+            line = json.dumps(record, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":"))
+            self._file_handler.handle(logging.makeLogRecord({"msg": line}))
+
+
+writer = RequestLogWriter()
+atexit.register(writer.close)
+
+
+def _truncate(content):
+    if isinstance(content, bytes):
+        content = content[:BODY_MAX_LENGTH].decode(errors="replace")
+    return content[:BODY_MAX_LENGTH]
+
+
+class ApiRequestLogMiddleware:
+    """ Collects a record of every API request and response for the request log writer """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _enabled(self, request):
+        return settings.API_LOG_SINK and not request.path.startswith(SKIPPED_PREFIXES)
+
+    def _record(self, request, body, response, execution_time):
+        return {
+            "api": request.get_full_path()[:1024],
+            "method": request.method,
+            "status_code": response.status_code,
+            "execution_time": execution_time,
+            "client_ip_address": request.META.get("REMOTE_ADDR") or "",
+            "body": body,
+            # Streaming responses aren't consumed here
+            "response": "" if response.streaming else _truncate(response.content),
+            "added_on": timezone.now(),
+        }
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self._enabled(request):
+            return self.get_response(request)
+
+        # Read before the view, which consumes the request stream
+        body = _truncate(request.body)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        writer.enqueue(self._record(request, body, response, time.perf_counter() - started))
+        return response
+
+    async def __acall__(self, request):
+        if not self._enabled(request):
+            return await self.get_response(request)
+
+        body = _truncate(request.body)
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        writer.enqueue(self._record(request, body, response, time.perf_counter() - started))
+        return response
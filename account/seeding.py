@@ -0,0 +1,360 @@
+"""
+Bulk synthetic data generator.
+
+Creates customers, their banking accounts and transfers between them at a scale the API can't reach
+in reasonable time. Rows get explicit primary keys past the current maximum, so id ranges can be
+split between worker processes which write without coordinating. Account popularity follows a Zipf
+distribution, a few hot accounts take part in most transfers, and transfer dates are spread evenly
+over the last ``days`` days in id order.
+
+Balances stay consistent with the transfers: a planning pass replays the transfers of every
+partition without touching the database and tops up the opening deposit of every account which
+would otherwise be overdrawn at some point. Accounts are then written with their final balances and
+transfers with their ledger entries, when written, so the result reconciles with ``verify_ledger``.
+
+Rows are written in chunks with ``COPY`` on PostgreSQL and ``bulk_create`` elsewhere, each chunk in
+its own database transaction. A failed run leaves the chunks written so far behind.
+"""
+
+import io
+import random
+import resource
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from functools import lru_cache
+from itertools import accumulate
+from math import gcd
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction as db_transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from account.currencies import CurrencyField, currency_number
+from account.models import BankAccount, Customer, LedgerEntry, Transaction
+
+SEED_CHUNK_SIZE = 10000
+
+CURRENCY = "GBP"
+
+CUSTOMER_FIELDS = ("id", "name", "created")
+ACCOUNT_FIELDS = ("id", "owner_id", "balance", "balance_currency", "created")
+TRANSACTION_FIELDS = ("id", "sender_account_id", "recipient_account_id", "amount", "amount_currency", "date")
+LEDGER_FIELDS = ("account_id", "transaction_id", "amount", "amount_currency", "balance", "balance_currency", "date")
+
+
+def _is_psycopg3():
+    # Imported on PostgreSQL only, it imports the driver; Django prefers psycopg 3 when both are installed
+    from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+    return is_psycopg3
+
+
+def _money(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+@lru_cache(maxsize=4)
+def _zipf_weights(n, skew):
+    """ Cumulative Zipf weights of n ranks, the rank r is picked with probability proportional to 1 / r ** skew """
+
+    return array("d", accumulate(1 / rank ** skew for rank in range(1, n + 1)))
+
+
+class Plan:
+    """ Parameters of a seeding run shared by every partition """
+
+    def __init__(self, customers, accounts_per_customer, transactions, skew, days, deposit, max_amount, seed,
+                 partitions, chunk_size, ledger, use_copy):
+        self.customers = customers
+        self.accounts_per_customer = accounts_per_customer
+        self.accounts = customers * accounts_per_customer
+        self.transactions = transactions
+        self.skew = skew
+        self.deposit = int(Decimal(deposit) * 100)
+        self.max_amount = int(Decimal(max_amount) * 100)
+        self.seed = seed
+        self.partitions = partitions
+        self.chunk_size = chunk_size
+        self.ledger = ledger
+        self.use_copy = use_copy
+
+        self.end = timezone.now()
+        self.start = self.end - timedelta(days=days)
+
+        self.customer_base = (Customer.objects.aggregate(pk=Max("pk"))["pk"] or 0) + 1
+        self.account_base = (BankAccount.objects.aggregate(pk=Max("pk"))["pk"] or 0) + 1
+        self.transaction_base = (Transaction.objects.aggregate(pk=Max("pk"))["pk"] or 0) + 1
+        # Unique among runs, ids never repeat
+        self.name_prefix = "seed-%s" % self.customer_base
+
+        # Hot ranks are scattered over the accounts instead of being the lowest ids
+        self.stride = random.Random(seed).randrange(1, max(self.accounts, 2))
+        while gcd(self.stride, self.accounts) != 1:
+            self.stride += 1
+
+    def slice(self, total, partition):
+        """ Returns the [start, end) range of ``total`` items belonging to the partition """
+
+        return total * partition // self.partitions, total * (partition + 1) // self.partitions
+
+    def transfers(self, partition):
+        """
+        Yields (index, sender, recipient, cents, date) of every transfer of the partition, the same on
+        every call
+        """
+
+        rnd = random.Random("%s:%s" % (self.seed, partition))
+        first, last = self.slice(self.transactions, partition)
+        if self.accounts < 2 or first == last:
+            return
+
+        weights = _zipf_weights(self.accounts, self.skew)
+        total_weight = weights[-1]
+        span = (self.end - self.start) / self.transactions
+
+        for index in range(first, last):
+            sender = bisect_left(weights, rnd.random() * total_weight) * self.stride % self.accounts
+            recipient = bisect_left(weights, rnd.random() * total_weight) * self.stride % self.accounts
+            if recipient == sender:
+                recipient = (recipient + 1) % self.accounts
+            # Strictly increasing with the index, transaction ids follow dates
+            yield index, sender, recipient, rnd.randint(1, self.max_amount), self.start + span * (index + rnd.random())
+
+
+def _zeros(n):
+    return array("q", bytes(8 * n))
+
+
+def _plan_partition(plan, partition):
+    """ Returns the net change of every account balance and its lowest point within the partition """
+
+    delta = _zeros(plan.accounts)
+    lowest = _zeros(plan.accounts)
+    for _, sender, recipient, cents, _ in plan.transfers(partition):
+        delta[sender] -= cents
+        delta[recipient] += cents
+        if delta[sender] < lowest[sender]:
+            lowest[sender] = delta[sender]
+    return delta, lowest
+
+
+def _opening_balances(plan, results):
+    """
+    Returns opening balances keeping every account solvent, final balances and balances at the start of
+    every partition
+    """
+
+    cumulative = _zeros(plan.accounts)
+    shortfall = _zeros(plan.accounts)
+    starts = []
+    for delta, lowest in results:
+        starts.append(array("q", cumulative))
+        for i in range(plan.accounts):
+            low = cumulative[i] + lowest[i]
+            if low < shortfall[i]:
+                shortfall[i] = low
+            cumulative[i] += delta[i]
+
+    opening = array("q", (plan.deposit - low for low in shortfall))
+    for balances in starts + [cumulative]:
+        for i in range(plan.accounts):
+            balances[i] += opening[i]
+    return opening, cumulative, starts
+
+
+@contextmanager
+def _explicit_dates():
+    # bulk_create stamps auto_now_add fields with the current time, seeded rows carry their own dates
+    fields = [
+        Customer._meta.get_field("created"), BankAccount._meta.get_field("created"), Transaction._meta.get_field("date")
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _insert(plan, model, fields, rows):
+    if not rows:
+        return
+    if plan.use_copy:
+        model_fields = [model._meta.get_field(name) for name in fields]
+        columns = [field.column for field in model_fields]
+        # COPY bypasses field conversions, currencies go in as their numeric codes
+        currencies = [i for i, field in enumerate(model_fields) if isinstance(field, CurrencyField)]
+        data = io.StringIO()
+        for row in rows:
+            if currencies:
+                row = list(row)
+                for i in currencies:
+                    row[i] = currency_number(row[i])
+            data.write("\t".join(_copy_value(value) for value in row))
+            data.write("\n")
+        data.seek(0)
+        statement = "COPY %s (%s) FROM STDIN" % (
+            connection.ops.quote_name(model._meta.db_table),
+            ", ".join(connection.ops.quote_name(column) for column in columns)
+        )
+        with connection.cursor() as cursor:
+            if _is_psycopg3():
+                with cursor.copy(statement) as copy:
+                    copy.write(data.getvalue())
+            else:
+                cursor.copy_expert(statement, data)
+    else:
+        with _explicit_dates():
+            model.objects.bulk_create([model(**dict(zip(fields, row))) for row in rows], batch_size=1000)
+
+
+def _write_accounts(plan, partition, opening, final):
+    """ Writes the customers of the partition with their accounts, returns the number of rows written """
+
+    first, last = plan.slice(plan.customers, partition)
+    # A customer takes a row, every account another one or two with its opening ledger entry
+    step = max(plan.chunk_size // (plan.accounts_per_customer + 1), 1)
+    rows = 0
+    for chunk_start in range(first, last, step):
+        chunk_end = min(chunk_start + step, last)
+        customers = [
+            (plan.customer_base + i, "%s-%s" % (plan.name_prefix, plan.customer_base + i), plan.start)
+            for i in range(chunk_start, chunk_end)
+        ]
+        accounts = [
+            (
+                plan.account_base + i, plan.customer_base + i // plan.accounts_per_customer, _money(final[i]), CURRENCY,
+                plan.start
+            )
+            for i in range(chunk_start * plan.accounts_per_customer, chunk_end * plan.accounts_per_customer)
+        ]
+        ledger = [
+            (plan.account_base + i, None, _money(opening[i]), CURRENCY, _money(opening[i]), CURRENCY, plan.start)
+            for i in range(chunk_start * plan.accounts_per_customer, chunk_end * plan.accounts_per_customer)
+        ] if plan.ledger else []
+
+        with db_transaction.atomic():
+            _insert(plan, Customer, CUSTOMER_FIELDS, customers)
+            _insert(plan, BankAccount, ACCOUNT_FIELDS, accounts)
+            _insert(plan, LedgerEntry, LEDGER_FIELDS, ledger)
+        rows += len(customers) + len(accounts) + len(ledger)
+    return rows
+
+
+def _write_transfers(plan, partition, balances):
+    """ Writes the transfers of the partition with their ledger entries, returns the number of rows written """
+
+    rows = 0
+    transactions = []
+    ledger = []
+
+    def flush():
+        with db_transaction.atomic():
+            _insert(plan, Transaction, TRANSACTION_FIELDS, transactions)
+            _insert(plan, LedgerEntry, LEDGER_FIELDS, ledger)
+        written = len(transactions) + len(ledger)
+        transactions.clear()
+        ledger.clear()
+        return written
+
+    for index, sender, recipient, cents, date in plan.transfers(partition):
+        pk = plan.transaction_base + index
+        amount = _money(cents)
+        transactions.append((pk, plan.account_base + sender, plan.account_base + recipient, amount, CURRENCY, date))
+        if plan.ledger:
+            balances[sender] -= cents
+            balances[recipient] += cents
+            ledger.append((plan.account_base + sender, pk, -amount, CURRENCY, _money(balances[sender]), CURRENCY, date))
+            ledger.append((plan.account_base + recipient, pk, amount, CURRENCY, _money(balances[recipient]), CURRENCY, date))
+        if len(transactions) >= plan.chunk_size:
+            rows += flush()
+    return rows + flush()
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _call(args):
+    function, *args = args
+    return function(*args)
+
+
+def _map(function, tasks, workers):
+    tasks = [(function, *task) for task in tasks]
+    if workers == 1:
+        return [_call(task) for task in tasks]
+
+    # Forked workers must not share the connection of the parent
+    connections.close_all()
+    with Pool(workers, initializer=_init_worker) as pool:
+        return pool.map(_call, tasks, chunksize=1)
+
+
+def peak_memory_mb():
+    """ Returns the peak resident memory of this process and of its finished worker processes """
+
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "main": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "workers": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+
+def seed_bank(customers, accounts_per_customer=2, transactions=0, skew=1.1, days=365, deposit="1000.00",
+              max_amount="100.00", seed=42, workers=1, partitions=None, chunk_size=SEED_CHUNK_SIZE, ledger=None,
+              use_copy=None):
+    """
+    Generates customers, banking accounts and transfers, yields (phase, rows, seconds) after every phase.
+
+    Work is split into ``partitions`` (``workers`` by default) id ranges processed by ``workers``
+    processes. ``use_copy`` defaults to ``COPY`` on PostgreSQL, ``ledger`` to ``LEDGER_ENTRIES``.
+    """
+
+    if connection.vendor == "sqlite":
+        # SQLite allows a single writer at a time
+        workers = 1
+    if use_copy is None:
+        use_copy = connection.vendor == "postgresql"
+    if ledger is None:
+        ledger = bool(settings.LEDGER_ENTRIES)
+
+    plan = Plan(
+        customers, accounts_per_customer, transactions, skew, days, deposit, max_amount, seed,
+        partitions or workers, chunk_size, ledger, use_copy
+    )
+    partitions = range(plan.partitions)
+
+    started = time.perf_counter()
+    opening, final, starts = _opening_balances(plan, _map(_plan_partition, [(plan, p) for p in partitions], workers))
+    yield "plan", transactions, time.perf_counter() - started
+
+    started = time.perf_counter()
+    rows = sum(_map(_write_accounts, [(plan, p, opening, final) for p in partitions], workers))
+    yield "accounts", rows, time.perf_counter() - started
+
+    started = time.perf_counter()
+    rows = sum(_map(_write_transfers, [(plan, p, starts[p]) for p in partitions], workers))
+    # Rows were written with explicit ids, move the sequences past them
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Customer, BankAccount, Transaction]):
+            cursor.execute(sql)
+    yield "transactions", rows, time.perf_counter() - started
@@ -1,12 +1,27 @@
+from django.conf import settings
+from django.db import transaction
 from django.db.utils import IntegrityError
 from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
 
 from rest_framework import serializers
 from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
 
 from djmoney.money import Money
 
+from account.cache import invalidate_customers
+from account.encoders import RowEncoder
+from account.ledger import open_ledgers
+from account.metrics import TimedRepresentationMixin
+from account.history import ASCENDING, DESCENDING, decode_cursor
 from account.models import Customer, BankAccount, Transaction
+from account.onboarding import OnboardingError, onboard_customers
+from account.statements import CSV
+from account.streaming import JSON, NDJSON
+from account.summary import balance_currency
+from account.transfers import make_transfer, make_batch_transfer, TransferError, SameAccountError, SenderDoesNotExist,\
+    RecipientDoesNotExist, InsufficientFunds, CurrencyNotConvertible
 
 
 class BaseBankingSerializer(serializers.Serializer):
@@ -19,14 +34,20 @@ class CreateCustomerSerializer(BaseBankingSerializer):
     """ Serializer class for handling customer creation """
 
     name = serializers.CharField(max_length=1024, required=True)
+    # Currency the banking account is held in, the deposit is made in it
+    currency = serializers.ChoiceField(choices=settings.CURRENCIES, default=balance_currency())
 
     def create(self, validated_data):
-        try:    
-            customer = Customer(name=validated_data["name"])
-            customer.save()
+        try:
+            with transaction.atomic():
+                customer = Customer(name=validated_data["name"])
+                customer.save()
 
-            bank_account = BankAccount(owner=customer, balance=validated_data["deposit_amount"])
-            bank_account.save()
+                bank_account = BankAccount(
+                    owner=customer, balance=Money(validated_data["deposit_amount"], validated_data["currency"])
+                )
+                bank_account.save()
+                open_ledgers([bank_account])
 
             return customer
         except IntegrityError:
@@ -37,12 +58,19 @@ class BankingAccountSerializer(BaseBankingSerializer):
     """ Serializer class for handling banking account creation """
 
     owner_id = serializers.IntegerField(required=True)
+    # Currency the banking account is held in, the deposit is made in it
+    currency = serializers.ChoiceField(choices=settings.CURRENCIES, default=balance_currency())
 
     def create(self, validated_data):
         try:
             customer = Customer.objects.get(id=validated_data["owner_id"])
-            bank_account = BankAccount(owner=customer, balance=Money(validated_data["deposit_amount"], 'GBP'))
-            bank_account.save()
+            with transaction.atomic():
+                bank_account = BankAccount(
+                    owner=customer, balance=Money(validated_data["deposit_amount"], validated_data["currency"])
+                )
+                bank_account.save()
+                open_ledgers([bank_account])
+                invalidate_customers([customer.pk])
 
             return bank_account
         except ObjectDoesNotExist:
@@ -55,45 +83,217 @@ class NewTransactionSerializer(BaseBankingSerializer):
     from_banking_account = serializers.IntegerField(required=True)
     to_banking_account = serializers.IntegerField(required=True)
 
-    def validate(self, data):
+    def create(self, validated_data):
         try:
-            from_account = BankAccount.objects.get(id=data["from_banking_account"])
-        except ObjectDoesNotExist:
-            raise serializers.ValidationError("Sender with id %s does not exist" % data["from_banking_account"])
+            return make_transfer(
+                validated_data["from_banking_account"],
+                validated_data["to_banking_account"],
+                validated_data["deposit_amount"]
+            )
+        except (SameAccountError, SenderDoesNotExist, RecipientDoesNotExist, InsufficientFunds, CurrencyNotConvertible) as e:
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [str(e)]})
+        except TransferError:
+            raise APIException("Unable to make a transaction")
 
-        try:
-            to_acount = BankAccount.objects.get(id=data["to_banking_account"])
-        except ObjectDoesNotExist:
-            raise serializers.ValidationError("Recipient with id %s does not exist" % data["to_banking_account"])
 
-        if from_account.balance.amount < data["deposit_amount"]:
-            raise serializers.ValidationError("Insufficient funds")
+class BatchTransactionSerializer(TimedRepresentationMixin, serializers.Serializer):
+    """ Serializer class for handling a batch of transactions """
 
-        return data
+    ATOMIC = "atomic"
+    BEST_EFFORT = "best-effort"
+
+    mode = serializers.ChoiceField(choices=[ATOMIC, BEST_EFFORT], default=ATOMIC)
+    transfers = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=settings.TRANSACTIONS_BATCH_MAX_SIZE
+    )
 
     def create(self, validated_data):
+        # A single child serializer validates every item, the same way ListSerializer does
+        child = NewTransactionSerializer()
+        results = [None] * len(validated_data["transfers"])
+        transfers, positions = [], []
+
+        for index, item in enumerate(validated_data["transfers"]):
+            try:
+                data = child.run_validation(item)
+            except serializers.ValidationError as e:
+                results[index] = e.detail
+            else:
+                positions.append(index)
+                transfers.append((data["from_banking_account"], data["to_banking_account"], data["deposit_amount"]))
+
+        atomic = validated_data["mode"] == self.ATOMIC
+        if atomic and len(positions) != len(results):
+            return results
+
         try:
-            from_account = BankAccount.objects.get(id=validated_data["from_banking_account"])
-            from_account.balance.amount -= validated_data["deposit_amount"]
+            outcomes = make_batch_transfer(transfers, atomic=atomic)
+        except TransferError:
+            raise APIException("Unable to make transactions")
+
+        for index, outcome in zip(positions, outcomes):
+            if isinstance(outcome, TransferError):
+                outcome = {api_settings.NON_FIELD_ERRORS_KEY: [str(outcome)]}
+            results[index] = outcome
+        return results
+
+    def to_representation(self, results):
+        items = []
+        transaction_serializer = TransactionHistoryResponseSerializer()
+        for result in results:
+            if isinstance(result, Transaction):
+                items.append({"status": "ok", "transaction": transaction_serializer.to_representation(result)})
+            elif result is None:
+                items.append({"status": "skipped"})
+            else:
+                items.append({"status": "failed", "errors": result})
+
+        applied = sum(1 for item in items if item["status"] == "ok")
+        failed = sum(1 for item in items if item["status"] == "failed")
+        return {"mode": self.validated_data["mode"], "applied": applied, "failed": failed, "results": items}
+
+
+class BulkOnboardingSerializer(TimedRepresentationMixin, serializers.Serializer):
+    """ Serializer class for handling onboarding of many customers """
+
+    ATOMIC = "atomic"
+    BEST_EFFORT = "best-effort"
+
+    mode = serializers.ChoiceField(choices=[ATOMIC, BEST_EFFORT], default=ATOMIC)
+    customers = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=settings.ONBOARDING_BATCH_MAX_SIZE
+    )
 
-            to_acount = BankAccount.objects.get(id=validated_data["to_banking_account"])
-            to_acount.balance.amount += validated_data["deposit_amount"]
+    def create(self, validated_data):
+        # A single child serializer validates every item, the same way ListSerializer does
+        child = CreateCustomerSerializer()
+        results = [None] * len(validated_data["customers"])
+        customers, positions = [], []
+
+        for index, item in enumerate(validated_data["customers"]):
+            try:
+                data = child.run_validation(item)
+            except serializers.ValidationError as e:
+                results[index] = e.detail
+            else:
+                positions.append(index)
+                customers.append((data["name"], data["deposit_amount"], data["currency"]))
+
+        atomic = validated_data["mode"] == self.ATOMIC
+        if atomic and len(positions) != len(results):
+            return results
 
-            transaction = Transaction(
-                sender_account=from_account,
-                recipient_account=to_acount,
-                amount=validated_data["deposit_amount"]
-            )
-        except Exception as e:
-            raise APIException("Unable to make a transaction")
-        else:
-            from_account.save()
-            to_acount.save()
-            transaction.save()
-            return transaction
+        try:
+            outcomes = onboard_customers(customers, atomic=atomic)
+        except IntegrityError:
+            raise APIException("Unable to onboard customers")
+
+        for index, outcome in zip(positions, outcomes):
+            if isinstance(outcome, OnboardingError):
+                outcome = {api_settings.NON_FIELD_ERRORS_KEY: [str(outcome)]}
+            results[index] = outcome
+        return results
+
+    def to_representation(self, results):
+        items = []
+        customer_serializer = CustomerResponseSerializer()
+        account_serializer = BankingAccountResponseSerializer()
+        for result in results:
+            if isinstance(result, tuple):
+                customer, account = result
+                items.append({
+                    "status": "ok",
+                    "customer": customer_serializer.to_representation(customer),
+                    "account": account_serializer.to_representation(account)
+                })
+            elif result is None:
+                items.append({"status": "skipped"})
+            else:
+                items.append({"status": "failed", "errors": result})
+
+        created = sum(1 for item in items if item["status"] == "ok")
+        failed = sum(1 for item in items if item["status"] == "failed")
+        return {"mode": self.validated_data["mode"], "created": created, "failed": failed, "results": items}
+
+
+class HistoryCursorField(serializers.CharField):
+    """ Opaque keyset cursor decoded into a (date, id) position """
+
+    default_error_messages = {"invalid": "Invalid cursor."}
+
+    def to_internal_value(self, data):
+        try:
+            return decode_cursor(super().to_internal_value(data))
+        except ValueError:
+            self.fail("invalid")
+
+
+class HistoryQuerySerializer(serializers.Serializer):
+    """ Serializer class for transaction history query parameters """
+
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+    direction = serializers.ChoiceField(choices=[ASCENDING, DESCENDING], default=ASCENDING)
+    cursor = HistoryCursorField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=settings.HISTORY_MAX_PAGE_SIZE, required=False)
+    stream = serializers.ChoiceField(choices=[JSON, NDJSON], required=False)
+    # Reads transactions moved to the archive by archive_transactions instead of the database
+    archived = serializers.BooleanField(default=False)
+
+
+class SummaryQuerySerializer(serializers.Serializer):
+    """ Serializer class for portfolio summary query parameters """
+
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+
+
+class BalanceAtQuerySerializer(serializers.Serializer):
+    """ Serializer class for point-in-time balance query parameters """
+
+    ts = serializers.DateTimeField()
 
 
-class CustomerResponseSerializer(serializers.ModelSerializer):
+class StatementQuerySerializer(serializers.Serializer):
+    """ Serializer class for statement query parameters """
+
+    since = serializers.DateTimeField()
+    # Up to the start of the request when missing
+    until = serializers.DateTimeField(required=False)
+    stream = serializers.ChoiceField(choices=[CSV, NDJSON], default=CSV)
+    # Gzip encoded response, for clients sending Accept-Encoding: gzip
+    gzip = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if "until" in data and data["until"] <= data["since"]:
+            raise serializers.ValidationError({"until": "Must be after since"})
+        # Without until the statement ends when the request starts
+        if "until" not in data and data["since"] >= timezone.now():
+            raise serializers.ValidationError({"since": "Must be in the past"})
+        return data
+
+
+class EventsQuerySerializer(serializers.Serializer):
+    """ Serializer class for event stream query parameters """
+
+    # Id of the last event received, the Last-Event-ID header takes precedence
+    after = serializers.IntegerField(min_value=0, required=False)
+    seconds = serializers.FloatField(min_value=0, max_value=settings.EVENTS_STREAM_SECONDS, required=False)
+
+
+class BulkSummarySerializer(SummaryQuerySerializer):
+    """ Serializer class for a portfolio summary request of many customers """
+
+    customer_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=settings.SUMMARY_MAX_CUSTOMERS
+    )
+
+
+class CustomerResponseSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     """ Serializer class for customer creation response """
 
     class Meta:
@@ -101,7 +301,7 @@ class CustomerResponseSerializer(serializers.ModelSerializer):
         fields = ["id", "name"]
 
 
-class TransactionHistoryResponseSerializer(serializers.ModelSerializer):
+class TransactionHistoryResponseSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     """ Serializer class for transaction history response """
 
     class Meta:
@@ -109,9 +309,45 @@ class TransactionHistoryResponseSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class BankingAccountResponseSerializer(serializers.ModelSerializer):
+class BankingAccountResponseSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     """ Serizlier class banking account balance response """
 
     class Meta:
         model = BankAccount
-        fields = '__all__'
+        exclude = ["created"]
+
+
+class CustomerSummaryResponseSerializer(TimedRepresentationMixin, serializers.Serializer):
+    """ Serializer class for customer portfolio summary response """
+
+    id = serializers.IntegerField()
+    accounts = serializers.IntegerField()
+    balance_currency = serializers.SerializerMethodField()
+    balance = serializers.DecimalField(max_digits=19, decimal_places=2)
+    inflow = serializers.DecimalField(max_digits=19, decimal_places=2)
+    outflow = serializers.DecimalField(max_digits=19, decimal_places=2)
+
+    def get_balance_currency(self, summary) -> str:
+        return balance_currency()
+
+
+class BalanceAtResponseSerializer(TimedRepresentationMixin, serializers.Serializer):
+    """ Serializer class for point-in-time balance response """
+
+    id = serializers.IntegerField()
+    balance_currency = serializers.CharField()
+    balance = serializers.DecimalField(max_digits=19, decimal_places=2)
+    ts = serializers.DateTimeField()
+    # Date of the snapshot the balance was computed from, null when computed from the current balance
+    snapshot = serializers.DateTimeField(allow_null=True)
+
+
+class BulkSummaryResponseSerializer(serializers.Serializer):
+    """ Serializer class for portfolio summaries of many customers """
+
+    results = CustomerSummaryResponseSerializer(many=True)
+    missing = serializers.ListField(child=serializers.IntegerField())
+
+
+# Fast-path encoder of TransactionHistoryResponseSerializer, see account.encoders
+TRANSACTION_HISTORY_ENCODER = RowEncoder(TransactionHistoryResponseSerializer)
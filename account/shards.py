@@ -0,0 +1,118 @@
+"""
+Sharded balances of hot banking accounts.
+
+Every transfer locks the rows holding the balances it changes, so transfers to a popular account queue
+up behind each other. Accounts listed in ``BALANCE_SHARDS`` keep part of their balance in
+``BalanceShard`` rows: a transfer to such an account locks and credits one shard chosen at random
+instead of the banking account row, and transfers from it lock the account row and all its shards and
+draw the amount from them in order, see ``account.transfers``. The visible balance of an account is
+the balance of its row plus the balances of its shards, ledger entries carry the shard they moved
+money on and its running balance.
+"""
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction as db_transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from djmoney.money import Money
+
+from account.cache import invalidate_accounts
+from account.models import BalanceShard, BankAccount, LedgerEntry
+
+CENT = Decimal("0.01")
+
+BALANCE_FIELD = DecimalField(max_digits=19, decimal_places=2)
+
+
+def shard_count(account_id):
+    """ Returns the number of shards the banking account is configured with, 0 for regular accounts """
+
+    return settings.BALANCE_SHARDS.get(account_id, 0)
+
+
+def shards_balance(account=OuterRef("pk")):
+    """ Expression summing up the shards of the banking account referenced by ``account`` """
+
+    total = BalanceShard.objects.filter(account=account).order_by().values("account").annotate(total=Sum("balance"))
+    return Coalesce(
+        Subquery(total.values("total"), output_field=BALANCE_FIELD), Value(Decimal("0.00")), output_field=BALANCE_FIELD
+    )
+
+
+def with_total_balance(queryset):
+    """ Annotates banking accounts with the balance of their shards, see total_balance """
+
+    return queryset.annotate(shards_balance=shards_balance())
+
+
+def total_balance(account):
+    """ Adds the shards to the balance of a banking account fetched through with_total_balance """
+
+    # SQLite hands decimal aggregates back as floats
+    shards = Decimal(account.shards_balance).quantize(CENT)
+    if shards:
+        account.balance = Money(account.balance.amount + shards, account.balance.currency)
+    return account
+
+
+def _lock(account_id):
+    accounts = BankAccount.objects.filter(pk=account_id)
+    shards = BalanceShard.objects.filter(account_id=account_id).order_by("shard")
+    if connection.features.has_select_for_update:
+        accounts, shards = accounts.select_for_update(), shards.select_for_update()
+    else:
+        accounts.update(balance=F("balance"))
+    return accounts.get(), list(shards)
+
+
+def _sync_account(account_id, count):
+    """ Creates the missing shards of an account and folds the ones beyond ``count`` back into its row """
+
+    with db_transaction.atomic():
+        account, shards = _lock(account_id)
+        existing = {shard.shard for shard in shards}
+        currency = account.balance.currency
+        created = [
+            BalanceShard(account=account, shard=shard, balance=Money(0, currency))
+            for shard in range(count) if shard not in existing
+        ]
+        BalanceShard.objects.bulk_create(created)
+
+        folded = [shard for shard in shards if shard.shard >= count and shard.balance.amount]
+        if folded:
+            now = timezone.now()
+            amount = sum((shard.balance.amount for shard in folded), Decimal(0))
+            account.balance = Money(account.balance.amount + amount, account.balance.currency)
+            account.save(update_fields=["balance"])
+            BalanceShard.objects.filter(pk__in=[shard.pk for shard in folded]).update(balance=0)
+            if settings.LEDGER_ENTRIES:
+                # Shards keep their rows, so past balances can still be told from the ledger
+                LedgerEntry.objects.bulk_create([
+                    LedgerEntry(
+                        account=account, shard=shard.shard, amount=-shard.balance, balance=Money(0, currency), date=now
+                    )
+                    for shard in folded
+                ] + [
+                    LedgerEntry(account=account, amount=Money(amount, currency), balance=account.balance, date=now)
+                ])
+            invalidate_accounts([account_id])
+    return len(created), len(folded)
+
+
+def sync_balance_shards():
+    """
+    Makes shard rows match ``BALANCE_SHARDS``: configured accounts get their missing shards, shards of
+    accounts with fewer shards or not listed any more are folded back into the banking account row.
+    Yields (account id, shards created, shards folded) for every account with shards.
+    """
+
+    account_ids = set(settings.BALANCE_SHARDS) | set(
+        BalanceShard.objects.exclude(balance=0).values_list("account_id", flat=True).distinct()
+    )
+    for account_id in sorted(account_ids):
+        if BankAccount.objects.filter(pk=account_id).exists():
+            yield (account_id,) + _sync_account(account_id, shard_count(account_id))
@@ -0,0 +1,136 @@
+"""
+Point-in-time balances of banking accounts.
+
+``take_snapshots`` records the balance of every banking account at a moment in ``BalanceSnapshot``
+rows, the ``snapshot_balances`` command takes one a day at midnight UTC. ``balance_at`` tells the
+balance of an account at any moment from the nearest snapshot and the transactions between the two
+only, served by the (account, date, id) indexes of both transaction sides, so it costs the same for an
+account opened yesterday and one opened years ago. Without snapshots the current balance is the
+starting point. Balances before the creation of an account are zero and snapshots skip accounts created
+after their moment.
+
+Deltas are read from the transaction table, transactions moved to the archive by
+``archive_transactions`` are missed: balances are exact as long as no archived month lies between the
+moment and its nearest snapshot, see ``account.archive``.
+"""
+
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from djmoney.money import Money
+
+from account.models import BalanceSnapshot, BankAccount, Transaction
+from account.shards import CENT, with_total_balance
+
+SNAPSHOT_CHUNK_SIZE = 1000
+
+MONEY = DecimalField(max_digits=19, decimal_places=2)
+
+
+def day_start(value):
+    """ Returns the first moment of the day of an aware datetime, in UTC """
+
+    return value.astimezone(dt_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _flow(side, after, until):
+    """ Expression summing up the amounts the account moved on ``side`` of transactions within (after, until] """
+
+    transactions = Transaction.objects.filter(**{side: OuterRef("pk"), "date__gt": after})
+    if until is not None:
+        transactions = transactions.filter(date__lte=until)
+    # Recipients of transfers between currencies were credited the conversion
+    moved = Coalesce("credit", "amount", output_field=MONEY) if side == "recipient_account" else "amount"
+    total = transactions.order_by().values(side).annotate(total=Sum(moved)).values("total")
+    return Coalesce(Subquery(total, output_field=MONEY), Value(Decimal("0.00")), output_field=MONEY)
+
+
+def _with_delta(queryset, after, until=None):
+    """ Annotates banking accounts with the amounts received and sent within (after, until] """
+
+    return queryset.annotate(
+        received=_flow("recipient_account", after, until),
+        sent=_flow("sender_account", after, until),
+    )
+
+
+def _amount(value):
+    # SQLite hands decimal aggregates back as floats
+    return Decimal(value).quantize(CENT)
+
+
+def take_snapshots(at=None, chunk_size=SNAPSHOT_CHUNK_SIZE):
+    """
+    Records the balance of every banking account at ``at``, the start of the current UTC day by default,
+    and yields the number of snapshots written for every chunk of accounts.
+
+    The balances are the current ones, shards included, minus whatever was received and plus whatever
+    was sent since ``at``, read in a single statement per chunk. Taking snapshots of a past moment never
+    races with transfers being made meanwhile, existing snapshots of the moment are kept as they are.
+    Accounts created after ``at`` are left out.
+    """
+
+    at = at or day_start(timezone.now())
+    last_id = 0
+    while True:
+        rows = list(
+            _with_delta(with_total_balance(BankAccount.objects.filter(pk__gt=last_id, created__lte=at)), at)
+            .order_by("pk")
+            .values_list("pk", "balance", "balance_currency", "shards_balance", "received", "sent")[:chunk_size]
+        )
+        if not rows:
+            return
+
+        BalanceSnapshot.objects.bulk_create([
+            BalanceSnapshot(
+                account_id=pk,
+                balance=Money(balance + _amount(shards) - _amount(received) + _amount(sent), currency),
+                date=at,
+            )
+            for pk, balance, currency, shards, received, sent in rows
+        ], ignore_conflicts=True)
+        last_id = rows[-1][0]
+        yield len(rows)
+
+
+def balance_at(account_id, when):
+    """
+    Returns (balance, snapshot date) of a banking account at ``when``, transactions made exactly at
+    ``when`` included. ``snapshot date`` is the date of the snapshot the balance was computed from,
+    None when it was computed from the current balance. The balance is zero before the account was
+    created. Raises BankAccount.DoesNotExist for unknown accounts.
+
+    The same few queries whatever the age of the account: the nearest snapshot before ``when``, then the
+    account with the transactions between the snapshot and ``when``. Moments before the first snapshot
+    are counted back from it, or from the current balance for accounts without snapshots.
+    """
+
+    snapshots = BalanceSnapshot.objects.filter(account_id=account_id)
+    snapshot = snapshots.filter(date__lte=when).order_by("-date").values_list("date", "balance").first()
+    if snapshot is None:
+        snapshot = snapshots.filter(date__gt=when).order_by("date").values_list("date", "balance").first()
+
+    accounts = BankAccount.objects.filter(pk=account_id)
+    if snapshot is None:
+        account = _with_delta(with_total_balance(accounts), when)\
+            .values_list("balance", "balance_currency", "created", "shards_balance", "received", "sent").get()
+        balance, currency, created, shards, received, sent = account
+        balance, date = balance + _amount(shards) - _amount(received) + _amount(sent), None
+    else:
+        date, balance = snapshot
+        if date <= when:
+            received, sent, currency, created = _with_delta(accounts, date, when)\
+                .values_list("received", "sent", "balance_currency", "created").get()
+            balance += _amount(received) - _amount(sent)
+        else:
+            received, sent, currency, created = _with_delta(accounts, when, date)\
+                .values_list("received", "sent", "balance_currency", "created").get()
+            balance += _amount(sent) - _amount(received)
+
+    if when < created:
+        return Money(0, currency), None
+    return Money(balance, currency), date
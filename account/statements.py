@@ -0,0 +1,235 @@
+"""
+Statements of banking accounts as CSV or NDJSON.
+
+A statement covers the transactions of an account within [since, until): an opening row with the balance
+right before ``since``, see ``account.snapshots.balance_at``, a row per transaction with the amount it
+moved on the account, signed, and the running balance after it, and a closing row. Transactions are read
+in (date, id) order from a server-side cursor, see ``account.history``, and encoded chunk by chunk, so
+memory stays constant whatever the number of rows. Customer statements are the statements of all the
+customer's accounts one after the other. Responses are gzipped on request, and ``export_statements``
+writes statements of many accounts to files from a pool of processes, see ``export_account_statement``.
+Under ASGI the async views stream the same chunks from an async iterator, see ``aiter_chunks``.
+"""
+
+import csv
+import io
+import json
+import os
+import re
+import zlib
+from datetime import timedelta
+from decimal import Decimal
+from itertools import chain, islice
+
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from account.history import account_history
+from account.models import BankAccount, Customer
+from account.snapshots import balance_at
+from account.streaming import ITERATOR_CHUNK_SIZE, NDJSON
+
+CSV = "csv"
+
+CONTENT_TYPES = {
+    CSV: "text/csv; charset=utf-8",
+    NDJSON: "application/x-ndjson",
+}
+
+COLUMNS = ("account", "date", "transaction", "type", "counterparty", "amount", "currency", "balance")
+
+OPENING = "opening"
+DEBIT = "debit"
+CREDIT = "credit"
+CLOSING = "closing"
+
+CENT = Decimal("0.01")
+
+# Timestamps are stored with microseconds, the opening balance is the balance at the last moment before ``since``
+MICROSECOND = timedelta(microseconds=1)
+
+ACCEPTS_GZIP = re.compile(r"\bgzip\b")
+
+
+def _amount(value):
+    return None if value is None else format(Decimal(value).quantize(CENT), "f")
+
+
+def _datetime(value):
+    value = value.isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def _account_rows(account_id, currency, since, until):
+    """ Yields the rows of the statement of an account as tuples of COLUMNS """
+
+    balance = balance_at(account_id, since - MICROSECOND)[0].amount
+    yield account_id, since, None, OPENING, None, None, currency, balance
+
+    transactions = account_history(account_id, since=since, until=until)\
+        .values_list("id", "date", "sender_account_id", "recipient_account_id", "amount", "credit")
+    for pk, date, sender_id, recipient_id, amount, credit in transactions.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        if sender_id == account_id:
+            # Transfers to self, only possible in legacy data, leave the balance as it is
+            amount = Decimal(0) if recipient_id == account_id else -amount
+            kind, counterparty = DEBIT, recipient_id
+        else:
+            # The recipient is credited the conversion of transfers between currencies
+            amount = amount if credit is None else credit
+            kind, counterparty = CREDIT, sender_id
+        balance += amount
+        yield account_id, date, pk, kind, counterparty, amount, currency, balance
+
+    yield account_id, until, None, CLOSING, None, None, currency, balance
+
+
+def _until(until):
+    # Fixed when the statement starts, transactions committed while it is read don't make it in part
+    return timezone.now() if until is None else until
+
+
+def account_statement(account_id, since, until=None):
+    """
+    Returns the rows of the statement of a banking account, raises BankAccount.DoesNotExist right away
+    for unknown accounts, reading the rows is deferred to their iteration
+    """
+
+    currency = BankAccount.objects.values_list("balance_currency", flat=True).get(pk=account_id)
+    return _account_rows(int(account_id), currency, since, _until(until))
+
+
+def customer_statement(customer_id, since, until=None):
+    """ Returns the rows of the statements of all the accounts of a customer, in account id order """
+
+    customer = Customer.objects.get(pk=customer_id)
+    until = _until(until)
+    accounts = BankAccount.objects.filter(owner=customer).order_by("pk").values_list("pk", "balance_currency")
+    return chain.from_iterable(_account_rows(pk, currency, since, until) for pk, currency in accounts)
+
+
+def _csv_chunk(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for account_id, date, pk, kind, counterparty, amount, currency, balance in rows:
+        writer.writerow((
+            account_id, _datetime(date), "" if pk is None else pk, kind, "" if counterparty is None else counterparty,
+            _amount(amount) or "", currency, _amount(balance)
+        ))
+    return buffer.getvalue().encode()
+
+
+def _ndjson_chunk(rows):
+    return "".join(
+        json.dumps(dict(zip(COLUMNS, (
+            account_id, _datetime(date), pk, kind, counterparty, _amount(amount), currency, _amount(balance)
+        ))), separators=(",", ":")) + "\n"
+        for account_id, date, pk, kind, counterparty, amount, currency, balance in rows
+    ).encode()
+
+
+def encode_statement(rows, output_format=CSV):
+    """ Yields a statement encoded as CSV, with a header, or NDJSON, ITERATOR_CHUNK_SIZE rows per chunk """
+
+    if output_format == CSV:
+        encode = _csv_chunk
+        yield (",".join(COLUMNS) + "\r\n").encode()
+    else:
+        encode = _ndjson_chunk
+
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, ITERATOR_CHUNK_SIZE))
+        if not chunk:
+            return
+        yield encode(chunk)
+
+
+def gzip_chunks(chunks):
+    """ Yields a gzip stream of byte chunks, compressed on the fly """
+
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+async def aiter_chunks(chunks):
+    """
+    Yields the chunks of a sync iterator, each one produced in a worker thread. ASGI servers consume sync
+    iterators in full before sending them, a statement would be built in memory.
+    """
+
+    chunks = iter(chunks)
+    next_chunk = sync_to_async(lambda: next(chunks, None))
+    while True:
+        chunk = await next_chunk()
+        if chunk is None:
+            return
+        yield chunk
+
+
+def statement_response(request, rows, filename, output_format=CSV, compress=False, asynchronous=False):
+    """
+    Streams statement rows as a file download, gzipped when ``compress`` is set and the client accepts
+    gzip encoded responses. Async views pass ``asynchronous`` to stream from an async iterator.
+    """
+
+    content = encode_statement(rows, output_format)
+    compress = compress and ACCEPTS_GZIP.search(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+    if compress:
+        content = gzip_chunks(content)
+    if asynchronous:
+        content = aiter_chunks(content)
+
+    response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[output_format])
+    response["Content-Disposition"] = 'attachment; filename="%s.%s"' % (filename, output_format)
+    response["Vary"] = "Accept-Encoding"
+    if compress:
+        response["Content-Encoding"] = "gzip"
+    return response
+
+
+def statement_path(directory, account_id, output_format=CSV, compress=False):
+    """ Returns the path of the statement file of an account written by export_account_statement """
+
+    return os.path.join(directory, "account-%s.%s%s" % (account_id, output_format, ".gz" if compress else ""))
+
+
+def init_export_worker():
+    """ Sets up Django in processes of export_statements, forked ones inherit it, spawned ones don't """
+
+    import django
+
+    django.setup()
+
+
+def export_account_statement(account_id, since, until, directory, output_format=CSV, compress=False):
+    """
+    Writes the statement of an account to a file of ``directory``, replacing the previous one only once the
+    new one is complete. Returns (account id, number of transactions) and runs in the processes of
+    ``export_statements``.
+    """
+
+    path = statement_path(directory, account_id, output_format, compress)
+    transactions = 0
+
+    def count(rows):
+        nonlocal transactions
+        for row in rows:
+            if row[3] in (DEBIT, CREDIT):
+                transactions += 1
+            yield row
+
+    content = encode_statement(count(account_statement(account_id, since, until)), output_format)
+    if compress:
+        content = gzip_chunks(content)
+    with open(path + ".tmp", "wb") as statement_file:
+        for chunk in content:
+            statement_file.write(chunk)
+    os.replace(path + ".tmp", path)
+    return account_id, transactions
@@ -0,0 +1,123 @@
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from account.encoders import RowEncoder
+
+JSON = "json"
+NDJSON = "ndjson"
+
+CONTENT_TYPES = {
+    JSON: "application/json",
+    NDJSON: "application/x-ndjson",
+}
+
+# Rows fetched per round trip from the server-side cursor
+ITERATOR_CHUNK_SIZE = 2000
+
+
+def _encode(data):
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _encoder(serializer):
+    """ Returns a function encoding an item to JSON bytes, either with a serializer or a RowEncoder """
+
+    if isinstance(serializer, RowEncoder):
+        return serializer.encode
+    return lambda item: _encode(serializer.to_representation(item))
+
+
+def iter_json_array(items, serializer):
+    """ Yields a JSON array of serialized items chunk by chunk """
+
+    encode = _encoder(serializer)
+    yield b"["
+    separator = b""
+    for item in items:
+        yield separator + encode(item)
+        separator = b","
+    yield b"]"
+
+
+def iter_ndjson(items, serializer):
+    """ Yields one serialized item per line """
+
+    encode = _encoder(serializer)
+    for item in items:
+        yield encode(item) + b"\n"
+
+
+async def aiter_json_array(items, serializer):
+    """ Async counterpart of iter_json_array consuming an async iterator """
+
+    encode = _encoder(serializer)
+    yield b"["
+    separator = b""
+    async for item in items:
+        yield separator + encode(item)
+        separator = b","
+    yield b"]"
+
+
+async def aiter_ndjson(items, serializer):
+    """ Async counterpart of iter_ndjson consuming an async iterator """
+
+    encode = _encoder(serializer)
+    async for item in items:
+        yield encode(item) + b"\n"
+
+
+def streaming_response(queryset, serializer, output_format=JSON):
+    """
+    Streams a queryset through a serializer instance without building the response in memory.
+
+    Rows are read with ``.iterator()``, which uses a server-side cursor on Postgres, so memory use
+    stays constant regardless of the number of rows. With a ``RowEncoder`` in place of the
+    serializer the queryset is read as ``values_list`` rows of its columns.
+    """
+
+    if isinstance(serializer, RowEncoder):
+        queryset = serializer.rows(queryset)
+    items = queryset.iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    if output_format == NDJSON:
+        content = iter_ndjson(items, serializer)
+    else:
+        content = iter_json_array(items, serializer)
+    return StreamingHttpResponse(content, content_type=CONTENT_TYPES[output_format])
+
+
+async def _aiterate_rows(queryset):
+    # QuerySet.aiterator() of values_list querysets opens the cursor in the async thread, the rows are
+    # fetched from a sync iterator in a worker thread instead
+    rows = queryset.iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    next_chunk = sync_to_async(lambda: list(islice(rows, ITERATOR_CHUNK_SIZE)))
+    while True:
+        chunk = await next_chunk()
+        for row in chunk:
+            yield row
+        if len(chunk) < ITERATOR_CHUNK_SIZE:
+            break
+
+
+def async_streaming_response(queryset, serializer, output_format=JSON):
+    """
+    Async counterpart of streaming_response for async views.
+
+    ASGI servers consume a synchronous iterator in full before sending it, so rows are read with
+    ``.aiterator()`` instead and the response body is an async generator.
+    """
+
+    if isinstance(serializer, RowEncoder):
+        items = _aiterate_rows(serializer.rows(queryset))
+    else:
+        items = queryset.aiterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    if output_format == NDJSON:
+        content = aiter_ndjson(items, serializer)
+    else:
+        content = aiter_json_array(items, serializer)
+    return StreamingHttpResponse(content, content_type=CONTENT_TYPES[output_format])
@@ -0,0 +1,111 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, Min, OuterRef, Q, Subquery, Sum,\
+    Value, When
+from django.db.models.functions import Coalesce
+
+from account.exchange import RATES, ExchangeRateUnavailable
+from account.models import BalanceShard, BankAccount, Customer, Transaction
+
+MONEY = DecimalField(max_digits=19, decimal_places=2)
+
+
+def _zero():
+    return Value(Decimal("0.00"), output_field=MONEY)
+
+
+def _converted(field, fractions):
+    """
+    Expression converting a money column to ``balance_currency`` with exchange ``fractions``, see
+    account.exchange. Amounts in currencies without a rate are left as they are, ``customer_summaries``
+    refuses them.
+    """
+
+    target = balance_currency()
+    whens = [
+        When(**{field + "_currency": source}, then=ExpressionWrapper(
+            F(field) * Value(Decimal(numerator) / denominator), output_field=MONEY
+        ))
+        for (source, quote), (numerator, denominator) in fractions.items() if quote == target
+    ]
+    return Case(*whens, default=F(field), output_field=MONEY) if whens else F(field)
+
+
+def _missing_rates(fractions):
+    """ Returns the currencies without a rate to ``balance_currency`` in ``fractions`` """
+
+    target = balance_currency()
+    return [currency for currency in settings.CURRENCIES if currency != target and (currency, target) not in fractions]
+
+
+def _flow(side, other_side, since, until, fractions):
+    # Transfers between accounts of the same customer don't change the portfolio
+    transactions = Transaction.objects\
+        .filter(**{side + "__owner": OuterRef("pk")})\
+        .exclude(**{other_side + "__owner": OuterRef("pk")})
+    if since is not None:
+        transactions = transactions.filter(date__gte=since)
+    if until is not None:
+        transactions = transactions.filter(date__lt=until)
+
+    if side == "recipient_account":
+        # Recipients of transfers between currencies were credited the conversion
+        moved = Coalesce(_converted("credit", fractions), _converted("amount", fractions), output_field=MONEY)
+    else:
+        moved = _converted("amount", fractions)
+    total = transactions.order_by().values(side + "__owner").annotate(total=Sum(moved)).values("total")
+    return Coalesce(Subquery(total, output_field=MONEY), _zero())
+
+
+def _shards(fractions):
+    # Parts of the balances of sharded accounts kept in their shards
+    total = BalanceShard.objects.filter(account__owner=OuterRef("pk")).order_by().values("account__owner")\
+        .annotate(total=Sum(_converted("balance", fractions))).values("total")
+    return Coalesce(Subquery(total, output_field=MONEY), _zero())
+
+
+def customer_summaries(customer_ids, since=None, until=None):
+    """
+    Returns a list of portfolio summaries of the existing customers among ``customer_ids`` ordered by id.
+
+    Total balance, shards of sharded accounts included, and number of banking accounts are aggregated
+    over the accounts of the customer, inflow and outflow are the amounts received from and sent to
+    other customers between ``since`` (inclusive) and ``until`` (exclusive). Everything is computed by
+    the database in a single query, the transaction sides are correlated subqueries served by the
+    (account, date, id) indexes. Amounts in other currencies are converted to ``balance_currency``, raises
+    ExchangeRateUnavailable when a rate they need isn't loaded rather than adding up different currencies.
+    """
+
+    fractions = RATES.fractions()
+    missing = _missing_rates(fractions)
+    summaries = Customer.objects\
+        .filter(pk__in=customer_ids)\
+        .order_by("pk")\
+        .values("id")\
+        .annotate(
+            balance=Coalesce(
+                Sum(_converted("bankaccount_owner__balance", fractions)), _zero(), output_field=MONEY
+            ) + _shards(fractions),
+            accounts=Count("bankaccount_owner"),
+            inflow=_flow("recipient_account", "sender_account", since, until, fractions),
+            outflow=_flow("sender_account", "recipient_account", since, until, fractions),
+        )
+    if missing:
+        # Transactions and shards of an account are in the currency of the account
+        summaries = summaries.annotate(unconvertible=Min(
+            "bankaccount_owner__balance_currency", filter=Q(bankaccount_owner__balance_currency__in=missing)
+        ))
+
+    summaries = list(summaries)
+    for summary in summaries:
+        currency = summary.pop("unconvertible", None)
+        if currency is not None:
+            raise ExchangeRateUnavailable(str(currency), balance_currency())
+    return summaries
+
+
+def balance_currency():
+    """ Currency of the summed up balances, the one banking accounts are opened in by default """
+
+    return BankAccount._meta.get_field("balance").default_currency
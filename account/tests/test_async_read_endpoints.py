@@ -0,0 +1,141 @@
+import tempfile
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+from django.urls import resolve
+from rest_framework import status
+
+from account import async_views, statements
+from account.archive import archive_transactions
+from account.models import Customer, Transaction, BankAccount
+
+
+@override_settings(ROOT_URLCONF="mock_api.async_urls")
+class TestAsyncReadEndpoints(TestCase):
+    """ Tests for async-native read endpoints, responses must match the sync viewsets """
+
+    def setUp(self):
+        sender = Customer(name="Test Sender")
+        sender.save()
+
+        self.sender_bank_account = BankAccount(owner=sender, balance=100.00)
+        self.sender_bank_account.save()
+
+        reciever = Customer(name="Test Reciever")
+        reciever.save()
+
+        self.reciever_bank_account = BankAccount(owner=reciever, balance=200.00)
+        self.reciever_bank_account.save()
+
+        for amount in (10, 20, 30):
+            Transaction(sender_account=self.sender_bank_account, recipient_account=self.reciever_bank_account, amount=amount).save()
+        Transaction(sender_account=self.reciever_bank_account, recipient_account=self.sender_bank_account, amount=5).save()
+
+        self.sender = sender
+
+    def assertSameAsSync(self, uri, status_code=status.HTTP_200_OK):
+        async_response = self.async_client_get(uri)
+        with override_settings(ROOT_URLCONF="mock_api.urls"):
+            sync_response = self.client.get(uri)
+
+        self.assertEqual(async_response.status_code, status_code)
+        self.assertEqual(sync_response.status_code, status_code)
+        self.assertEqual(async_response.content, sync_response.content)
+        return async_response
+
+    def async_client_get(self, uri):
+        return async_to_sync(self.async_client.get)(uri)
+
+    def test_routes_resolve_to_async_views(self):
+        """ Read routes are served by async views, the rest of the API by the viewsets """
+
+        self.assertIs(resolve('/accounts/1/get-balance/').func, async_views.get_balance)
+        self.assertIs(resolve('/accounts/1/get-history/').func, async_views.get_history)
+        self.assertIs(resolve('/customers/1/accounts-balances/').func, async_views.get_balances)
+        self.assertIs(resolve('/customers/1/statement/').func, async_views.get_customer_statement)
+        self.assertIsNot(resolve('/transactions/make/').func, async_views.get_balance)
+
+    def test_get_balance(self):
+        """ Balance matches the sync endpoint """
+
+        response = self.assertSameAsSync('/accounts/{}/get-balance/'.format(self.sender_bank_account.pk))
+        self.assertEqual(response.json()["balance"], "100.00")
+
+        self.assertSameAsSync('/accounts/42/get-balance/', status.HTTP_404_NOT_FOUND)
+        self.assertSameAsSync('/accounts/foo/get-balance/', status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def test_get_balances(self):
+        """ Customer balances match the sync endpoint """
+
+        response = self.assertSameAsSync('/customers/{}/accounts-balances/'.format(self.sender.pk))
+        self.assertEqual(len(response.json()), 1)
+
+        self.assertSameAsSync('/customers/42/accounts-balances/', status.HTTP_404_NOT_FOUND)
+
+    def test_get_history(self):
+        """ Full, paginated and invalid history queries match the sync endpoint """
+
+        uri = '/accounts/{}/get-history/'.format(self.sender_bank_account.pk)
+        self.assertEqual(len(self.assertSameAsSync(uri).json()), 4)
+
+        page = self.assertSameAsSync(uri + '?limit=3&direction=desc').json()
+        self.assertEqual(len(page["results"]), 3)
+        self.assertIsNotNone(page["next"])
+
+        self.assertSameAsSync(uri + '?cursor=foo', status.HTTP_400_BAD_REQUEST)
+
+    def test_get_history_stream(self):
+        """ Streamed history is produced by an async iterator and matches the sync endpoint """
+
+        uri = '/accounts/{}/get-history/?stream=ndjson'.format(self.sender_bank_account.pk)
+        response = self.async_client_get(uri)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.is_async)
+
+        async def consume():
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        with override_settings(ROOT_URLCONF="mock_api.urls"):
+            sync_response = self.client.get(uri)
+        self.assertEqual(async_to_sync(consume)(), b"".join(sync_response.streaming_content))
+
+    def test_get_statement_stream(self):
+        """ Statements are produced chunk by chunk by an async iterator and match the sync endpoint """
+
+        uri = '/accounts/{}/statement/?since=2000-01-01T00:00:00Z&until=2100-01-01T00:00:00Z'.format(self.sender_bank_account.pk)
+        with mock.patch("account.statements.account_history", wraps=statements.account_history) as history:
+            response = self.async_client_get(uri)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.is_async)
+
+            async def consume():
+                chunks = aiter(response.streaming_content)
+                header = await anext(chunks)
+                # Transactions are only read once the rows after the header are asked for
+                self.assertEqual(history.call_count, 0)
+                return header + b"".join([chunk async for chunk in chunks])
+
+            content = async_to_sync(consume)()
+            self.assertEqual(history.call_count, 1)
+
+        with override_settings(ROOT_URLCONF="mock_api.urls"):
+            sync_response = self.client.get(uri)
+        self.assertEqual(content, b"".join(sync_response.streaming_content))
+        self.assertEqual(len(content.splitlines()), 7)
+
+        self.assertSameAsSync('/accounts/42/statement/?since=2000-01-01T00:00:00Z', status.HTTP_404_NOT_FOUND)
+        self.assertSameAsSync('/customers/42/statement/?since=2000-01-01T00:00:00Z', status.HTTP_404_NOT_FOUND)
+        self.assertSameAsSync('/accounts/{}/statement/'.format(self.sender_bank_account.pk), status.HTTP_400_BAD_REQUEST)
+
+    def test_get_archived_history(self):
+        """ Archived history matches the sync endpoint """
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(TRANSACTION_ARCHIVE_DIR=directory):
+            list(archive_transactions(older_than_months=-1))
+
+            uri = '/accounts/{}/get-history/?archived=true'.format(self.sender_bank_account.pk)
+            response = self.assertSameAsSync(uri)
+            self.assertEqual(len(response.json()), 4)
+            self.assertSameAsSync(uri + '&limit=2')
@@ -0,0 +1,133 @@
+import tempfile
+from decimal import Decimal
+
+from django.core.cache import caches
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework import status
+
+from account.cache import BALANCE_CACHE, cache_stats, cached_account, invalidate_accounts, reset_cache_stats
+from account.models import Customer, BankAccount
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    BALANCE_CACHE: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "test-balances"},
+}
+
+
+class BalanceCacheMixin:
+    """ Creates a customer with two banking accounts on top of an empty balance cache """
+
+    def setUp(self):
+        caches[BALANCE_CACHE].clear()
+        reset_cache_stats()
+
+        response = self.client.post('/customers/create-customer-account/', {"name": "Test Sender", "deposit_amount": 100})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.customer_id = response.json()["id"]
+        self.sender_bank_account = BankAccount.objects.get(owner__pk=self.customer_id)
+
+        reciever = Customer(name="Test Reciever")
+        reciever.save()
+        self.reciever_bank_account = BankAccount(owner=reciever, balance=100.00)
+        self.reciever_bank_account.save()
+
+    def transfer(self, amount):
+        request_data = {
+            "from_banking_account": self.sender_bank_account.pk,
+            "to_banking_account": self.reciever_bank_account.pk,
+            "deposit_amount": amount
+        }
+        response = self.client.post('/transactions/make/', request_data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def get_balance(self, account):
+        response = self.client.get('/accounts/{}/get-balance/'.format(account.pk))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()["balance"]
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestBalanceCache(BalanceCacheMixin, TestCase):
+    """ Tests for the read-through balance cache """
+
+    def test_get_balance_is_cached(self):
+        """ Repeated balance reads are served without touching the database """
+
+        self.assertEqual(self.get_balance(self.sender_bank_account), "100.00")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_balance(self.sender_bank_account), "100.00")
+        self.assertEqual(cache_stats(), {"hits": 1, "misses": 1})
+
+    def test_accounts_balances_is_cached(self):
+        """ Customer balances are cached and refreshed when the customer gets a new account """
+
+        uri = '/customers/{}/accounts-balances/'.format(self.customer_id)
+        self.assertEqual([account["balance"] for account in self.client.get(uri).json()], ["100.00"])
+        # Balances loaded along with the account list are cached once read with their generation
+        with self.assertNumQueries(1):
+            self.assertEqual([account["balance"] for account in self.client.get(uri).json()], ["100.00"])
+        with self.assertNumQueries(0):
+            self.assertEqual([account["balance"] for account in self.client.get(uri).json()], ["100.00"])
+
+        response = self.client.post('/customers/add-banking-account/', {"owner_id": self.customer_id, "deposit_amount": 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([account["balance"] for account in self.client.get(uri).json()], ["100.00", "5.00"])
+
+    def test_transfer_invalidates_balances(self):
+        """ A transfer drops cached balances of both accounts """
+
+        uri = '/customers/{}/accounts-balances/'.format(self.customer_id)
+        self.client.get(uri)
+        self.get_balance(self.reciever_bank_account)
+
+        self.transfer(30)
+
+        self.assertEqual(self.get_balance(self.reciever_bank_account), "130.00")
+        # The account list is still cached, only the changed balance is read again
+        with self.assertNumQueries(1):
+            self.assertEqual([account["balance"] for account in self.client.get(uri).json()], ["70.00"])
+
+    def test_balance_loaded_before_commit_is_not_cached(self):
+        """ A reader which loaded a balance before a transfer committed doesn't cache it past the commit """
+
+        pk = self.sender_bank_account.pk
+        with self.captureOnCommitCallbacks() as callbacks:
+            invalidate_accounts([pk])
+
+        def load_before_commit(cache_id):
+            balance = {"id": cache_id, "balance": "100.00"}
+            # The transfer commits while the reader holds the balance it read
+            for callback in callbacks:
+                callback()
+            return balance
+
+        self.assertEqual(cached_account(pk, load_before_commit)["balance"], "100.00")
+        self.assertEqual(cached_account(pk, lambda cache_id: {"id": cache_id, "balance": "70.00"})["balance"], "70.00")
+        self.assertEqual(cache_stats(), {"hits": 0, "misses": 2})
+
+    def test_unexistent_account_is_not_cached(self):
+        """ Missing accounts are reported every time """
+
+        for _ in range(2):
+            response = self.client.get('/accounts/42/get-balance/')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TestBalanceCacheAfterCommit(BalanceCacheMixin, TransactionTestCase):
+    """ Tests the balance cache across committed database transactions """
+
+    def test_no_stale_balance_after_committed_transfer(self):
+        """ Balances read after a committed transfer are never stale, whatever the backend """
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            file_caches = dict(LOCMEM_CACHES)
+            file_caches[BALANCE_CACHE] = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": cache_dir}
+
+            for cache_settings in (LOCMEM_CACHES, file_caches):
+                with self.subTest(backend=cache_settings[BALANCE_CACHE]["BACKEND"]), override_settings(CACHES=cache_settings):
+                    caches[BALANCE_CACHE].clear()
+                    before = Decimal(self.get_balance(self.sender_bank_account))
+
+                    self.transfer(10)
+
+                    self.assertEqual(Decimal(self.get_balance(self.sender_bank_account)), before - 10)
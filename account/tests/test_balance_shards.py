@@ -0,0 +1,139 @@
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+
+from account.ledger import open_ledgers, verify_ledger
+from account.models import BalanceShard, BankAccount, Customer, LedgerEntry
+from account import transfers
+from account.snapshots import balance_at
+from account.transfers import InsufficientFunds, make_batch_transfer, make_transfer
+
+
+@override_settings(LEDGER_ENTRIES=1)
+class TestBalanceShards(TestCase):
+    """ Tests for hot banking accounts with sharded balances """
+
+    def setUp(self):
+        self.customer = Customer(name="Test Customer")
+        self.customer.save()
+
+        self.hot_bank_account = BankAccount(owner=self.customer, balance=10.00)
+        self.hot_bank_account.save()
+
+        self.other_bank_account = BankAccount(owner=self.customer, balance=100.00)
+        self.other_bank_account.save()
+        open_ledgers([self.hot_bank_account, self.other_bank_account])
+
+        self.shards = override_settings(BALANCE_SHARDS={self.hot_bank_account.pk: 4})
+        self.shards.enable()
+        self.addCleanup(self.shards.disable)
+        call_command("sync_balance_shards", stdout=StringIO())
+
+    def balances(self):
+        account = BankAccount.objects.get(pk=self.hot_bank_account.pk)
+        shards = BalanceShard.objects.filter(account=account).values_list("balance", flat=True)
+        return account.balance.amount, sorted(shards)
+
+    def test_sync_creates_shards(self):
+        """ Configured accounts get their empty shards once """
+
+        self.assertEqual(self.balances(), (Decimal("10.00"), [Decimal("0.00")] * 4))
+        call_command("sync_balance_shards", stdout=StringIO())
+        self.assertEqual(BalanceShard.objects.count(), 4)
+
+    def test_credits_land_on_shards(self):
+        """ Transfers to a sharded account credit its shards, the visible balance adds them up """
+
+        for _ in range(8):
+            make_transfer(self.other_bank_account.pk, self.hot_bank_account.pk, Decimal("5.00"))
+
+        balance, shards = self.balances()
+        self.assertEqual(balance, Decimal("10.00"))
+        self.assertEqual(sum(shards), Decimal("40.00"))
+
+        response = self.client.get('/accounts/{}/get-balance/'.format(self.hot_bank_account.pk))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["balance"], "50.00")
+
+        response = self.client.get('/customers/{}/accounts-balances/'.format(self.customer.pk))
+        self.assertEqual(sorted(account["balance"] for account in response.json()), ["50.00", "60.00"])
+
+        response = self.client.get('/customers/{}/summary/'.format(self.customer.pk))
+        self.assertEqual(response.json()["balance"], "110.00")
+        self.assertEqual(list(verify_ledger()), [])
+
+    def test_debits_draw_from_row_and_shards(self):
+        """ Transfers from a sharded account draw the row first and then the shards, never overdrawing """
+
+        make_batch_transfer([(self.other_bank_account.pk, self.hot_bank_account.pk, Decimal("20.00"))] * 2)
+        transaction = make_transfer(self.hot_bank_account.pk, self.other_bank_account.pk, Decimal("35.00"))
+
+        balance, shards = self.balances()
+        self.assertEqual(balance + sum(shards), Decimal("15.00"))
+        self.assertEqual(balance, Decimal("0.00"))
+        self.assertTrue(all(shard >= 0 for shard in shards))
+
+        debits = LedgerEntry.objects.filter(transaction=transaction, account=self.hot_bank_account)
+        self.assertEqual(sum(debits.values_list("amount", flat=True)), Decimal("-35.00"))
+        self.assertGreater(debits.count(), 1)
+        self.assertEqual(list(verify_ledger()), [])
+        self.assertEqual(balance_at(self.hot_bank_account.pk, timezone.now())[0].amount, Decimal("15.00"))
+
+        with self.assertRaises(InsufficientFunds):
+            make_transfer(self.hot_bank_account.pk, self.other_bank_account.pk, Decimal("15.01"))
+        make_transfer(self.hot_bank_account.pk, self.other_bank_account.pk, Decimal("15.00"))
+        self.assertEqual(sum(self.balances()[1]), Decimal("0.00"))
+
+    def test_missing_shards_lock_account_rows_first(self):
+        """ Accounts whose shards aren't synced yet lock their row along with the other rows, before any shard """
+
+        cold = BankAccount.objects.create(owner=self.customer, balance=0)
+        locks = []
+
+        def record(name, lock):
+            def locked(*args):
+                locks.append(name)
+                return lock(*args)
+            return locked
+
+        with self.settings(BALANCE_SHARDS={self.hot_bank_account.pk: 4, cold.pk: 4}),\
+                mock.patch("account.transfers._lock_balances", record("accounts", transfers._lock_balances)),\
+                mock.patch("account.transfers._lock_shards", record("shards", transfers._lock_shards)):
+            make_batch_transfer([
+                (self.hot_bank_account.pk, self.other_bank_account.pk, Decimal("5.00")),
+                (self.other_bank_account.pk, cold.pk, Decimal("5.00")),
+            ])
+
+        self.assertEqual(locks, ["accounts", "shards"])
+        self.assertEqual(BankAccount.objects.get(pk=cold.pk).balance.amount, Decimal("5.00"))
+        self.assertFalse(BalanceShard.objects.filter(account=cold).exists())
+
+    def test_history_lists_one_row_per_transfer(self):
+        """ Debits split across shards are still one transaction in the history """
+
+        make_transfer(self.other_bank_account.pk, self.hot_bank_account.pk, Decimal("20.00"))
+        make_transfer(self.hot_bank_account.pk, self.other_bank_account.pk, Decimal("25.00"))
+
+        response = self.client.get('/accounts/{}/get-history/'.format(self.hot_bank_account.pk))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([transaction["amount"] for transaction in response.json()], ["20.00", "25.00"])
+
+    def test_sync_folds_unconfigured_shards(self):
+        """ Shards of accounts no longer configured are folded back into the account row """
+
+        make_transfer(self.other_bank_account.pk, self.hot_bank_account.pk, Decimal("20.00"))
+        before = timezone.now()
+
+        with self.settings(BALANCE_SHARDS={}):
+            call_command("sync_balance_shards", stdout=StringIO())
+            self.assertEqual(self.balances(), (Decimal("30.00"), [Decimal("0.00")] * 4))
+            self.assertEqual(list(verify_ledger()), [])
+            self.assertEqual(balance_at(self.hot_bank_account.pk, before)[0].amount, Decimal("30.00"))
+
+            make_transfer(self.other_bank_account.pk, self.hot_bank_account.pk, Decimal("5.00"))
+            self.assertEqual(self.balances()[0], Decimal("35.00"))
@@ -0,0 +1,138 @@
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from rest_framework import status
+
+from djmoney.money import Money
+
+from account.models import BalanceSnapshot, BankAccount, Customer, Transaction
+from account.snapshots import balance_at, take_snapshots
+from account.transfers import make_transfer
+
+START = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class TestBalanceSnapshots(TestCase):
+    """ Tests for point-in-time balances computed from balance snapshots """
+
+    def setUp(self):
+        self.customer = Customer(name="Test Customer")
+        self.customer.save()
+
+        self.accounts = [BankAccount.objects.create(owner=self.customer, balance=1000) for _ in range(3)]
+        BankAccount.objects.update(created=START - timedelta(days=2))
+        self.opening = {account.pk: Decimal("1000.00") for account in self.accounts}
+
+        # Ten days of transfers, a few an hour apart every day
+        rnd = random.Random(7)
+        for day in range(10):
+            for hour in range(4):
+                sender, recipient = rnd.sample(self.accounts, 2)
+                transaction = make_transfer(sender.pk, recipient.pk, Decimal(rnd.randint(1, 5000)) / 100)
+                Transaction.objects.filter(pk=transaction.pk).update(date=START + timedelta(days=day, hours=hour * 6))
+
+    def replay(self, account_id, when):
+        """ Balance at ``when`` replayed from the opening balance through every transaction """
+
+        def total(**filters):
+            return Transaction.objects.filter(date__lte=when, **filters).aggregate(total=Sum("amount"))["total"] or 0
+
+        return self.opening[account_id] + Decimal(total(recipient_account=account_id)).quantize(Decimal("0.01"))\
+            - Decimal(total(sender_account=account_id)).quantize(Decimal("0.01"))
+
+    def moments(self):
+        return [START - timedelta(days=1)] + [START + timedelta(days=day, hours=hour) for day in range(11) for hour in (0, 5, 13)]
+
+    def test_matches_full_replay(self):
+        """ Balances computed from the nearest snapshot are the ones replayed from account opening """
+
+        for day in (2, 5, 9):
+            list(take_snapshots(START + timedelta(days=day, hours=3)))
+        self.assertEqual(BalanceSnapshot.objects.count(), 9)
+
+        for account in self.accounts:
+            for when in self.moments():
+                balance, snapshot = balance_at(account.pk, when)
+                self.assertEqual(balance.amount, self.replay(account.pk, when), (account.pk, when))
+                self.assertIsNotNone(snapshot)
+
+    def test_matches_full_replay_without_snapshots(self):
+        """ Accounts without snapshots are counted back from their current balance """
+
+        for account in self.accounts:
+            for when in self.moments():
+                balance, snapshot = balance_at(account.pk, when)
+                self.assertEqual(balance.amount, self.replay(account.pk, when), (account.pk, when))
+                self.assertIsNone(snapshot)
+
+    def test_sharded_account(self):
+        """ Snapshots of sharded accounts add up their shards """
+
+        account = self.accounts[0]
+        with override_settings(BALANCE_SHARDS={account.pk: 4}):
+            call_command("sync_balance_shards", stdout=StringIO())
+            for _ in range(5):
+                make_transfer(self.accounts[1].pk, account.pk, Decimal("3.00"))
+
+            list(take_snapshots(START + timedelta(days=4)))
+            for when in self.moments():
+                self.assertEqual(balance_at(account.pk, when)[0].amount, self.replay(account.pk, when))
+
+    def test_before_account_creation(self):
+        """ Balances before an account was created are zero and snapshots leave it out """
+
+        account = BankAccount.objects.create(owner=self.customer, balance=250)
+        BankAccount.objects.filter(pk=account.pk).update(created=START + timedelta(days=3))
+
+        list(take_snapshots(START + timedelta(days=2)))
+        self.assertFalse(BalanceSnapshot.objects.filter(account=account).exists())
+        self.assertEqual(BalanceSnapshot.objects.count(), len(self.accounts))
+        self.assertEqual(balance_at(account.pk, START + timedelta(days=2)), (Money("0.00", "GBP"), None))
+        self.assertEqual(balance_at(account.pk, START + timedelta(days=4))[0].amount, Decimal("250.00"))
+
+        list(take_snapshots(START + timedelta(days=5)))
+        self.assertTrue(BalanceSnapshot.objects.filter(account=account).exists())
+        response = self.client.get("/accounts/%s/balance-at/" % account.pk, {"ts": START.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Decimal(response.data["balance"]), Decimal("0.00"))
+
+    def test_constant_queries(self):
+        """ The number of queries doesn't grow with the number of transactions """
+
+        list(take_snapshots(START + timedelta(days=9)))
+        with self.assertNumQueries(2):
+            balance_at(self.accounts[0].pk, START + timedelta(days=9, hours=20))
+
+    def test_command_keeps_existing_snapshots(self):
+        """ Running the command twice for the same moment writes every snapshot once """
+
+        for _ in range(2):
+            call_command("snapshot_balances", "--at", "2026-01-05T00:00:00Z", stdout=StringIO())
+        self.assertEqual(BalanceSnapshot.objects.count(), len(self.accounts))
+
+    def test_get_balance_at(self):
+        """ The balance-at action returns the balance and the snapshot it was computed from """
+
+        list(take_snapshots(START + timedelta(days=5)))
+        account = self.accounts[1]
+        when = START + timedelta(days=7, hours=1)
+        response = self.client.get("/accounts/%s/balance-at/" % account.pk, {"ts": when.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["id"], account.pk)
+        self.assertEqual(response.data["balance_currency"], "GBP")
+        self.assertEqual(Decimal(response.data["balance"]), self.replay(account.pk, when))
+        self.assertEqual(response.data["snapshot"], "2026-01-06T00:00:00Z")
+
+    def test_get_balance_at_invalid_request(self):
+        """ A missing timestamp and an unknown account are refused """
+
+        response = self.client.get("/accounts/%s/balance-at/" % self.accounts[0].pk)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get("/accounts/0/balance-at/", {"ts": START.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
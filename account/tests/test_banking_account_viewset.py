@@ -1,3 +1,5 @@
+import json
+
 from django.test import TestCase
 from rest_framework import status
 
@@ -110,6 +112,8 @@ class TestBakingAccountVieSet(TestCase):
                 "id": 1,
                 "amount_currency": "GBP",
                 "amount": "50.01",
+                "credit_currency": None,
+                "credit": None,
                 "date": "2021-07-08T12:00:00Z",
                 "sender_account": self.default_sender_bank_account_one.pk,
                 "recipient_account": self.default_reciever_one_bank_account.pk
@@ -118,6 +122,8 @@ class TestBakingAccountVieSet(TestCase):
                 "id": 2,
                 "amount_currency": "GBP",
                 "amount": "13.12",
+                "credit_currency": None,
+                "credit": None,
                 "date": "2021-07-08T12:00:00Z",
                 "sender_account": self.default_sender_bank_account_one.pk,
                 "recipient_account": self.default_reciever_two_bank_account.pk
@@ -136,6 +142,8 @@ class TestBakingAccountVieSet(TestCase):
                 "id": 3,
                 "amount_currency": "GBP",
                 "amount": "5.01",
+                "credit_currency": None,
+                "credit": None,
                 "date": "2021-07-08T12:00:00Z",
                 "sender_account": self.default_sender_bank_account_two.pk,
                 "recipient_account": self.default_reciever_one_bank_account.pk
@@ -144,6 +152,8 @@ class TestBakingAccountVieSet(TestCase):
                 "id": 4,
                 "amount_currency": "GBP",
                 "amount": "4.99",
+                "credit_currency": None,
+                "credit": None,
                 "date": "2021-07-08T12:00:00Z",
                 "sender_account": self.default_reciever_one_bank_account.pk,
                 "recipient_account": self.default_sender_bank_account_two.pk
@@ -158,18 +168,12 @@ class TestBakingAccountVieSet(TestCase):
         response = self.client.get(uri)
         response_json = response.json()        
         expected_response_json = [
-            {
-                "id": 4,
-                "amount_currency": "GBP",
-                "amount": "4.99",
-                "date": "2021-07-08T12:00:00Z",
-                "sender_account": self.default_reciever_one_bank_account.pk,
-                "recipient_account": self.default_sender_bank_account_two.pk
-            },
             {
                 "id": 1,
                 "amount_currency": "GBP",
                 "amount": "50.01",
+                "credit_currency": None,
+                "credit": None,
                 "date": "2021-07-08T12:00:00Z",
                 "sender_account": self.default_sender_bank_account_one.pk,
                 "recipient_account": self.default_reciever_one_bank_account.pk
@@ -178,9 +182,21 @@ class TestBakingAccountVieSet(TestCase):
                 "id": 3,
                 "amount_currency": "GBP",
                 "amount": "5.01",
+                "credit_currency": None,
+                "credit": None,
                 "date": "2021-07-08T12:00:00Z",
                 "sender_account": self.default_sender_bank_account_two.pk,
                 "recipient_account": self.default_reciever_one_bank_account.pk
+            },
+            {
+                "id": 4,
+                "amount_currency": "GBP",
+                "amount": "4.99",
+                "credit_currency": None,
+                "credit": None,
+                "date": "2021-07-08T12:00:00Z",
+                "sender_account": self.default_reciever_one_bank_account.pk,
+                "recipient_account": self.default_sender_bank_account_two.pk
             }
         ]
 
@@ -196,6 +212,8 @@ class TestBakingAccountVieSet(TestCase):
                 "id": 2,
                 "amount_currency": "GBP",
                 "amount": "13.12",
+                "credit_currency": None,
+                "credit": None,
                 "date": "2021-07-08T12:00:00Z",
                 "sender_account": self.default_sender_bank_account_one.pk,
                 "recipient_account": self.default_reciever_two_bank_account.pk
@@ -238,3 +256,90 @@ class TestBakingAccountVieSet(TestCase):
         
         self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
         self.assertEqual(response_json, expected_error_json)
+
+    def make_history(self):
+        """ Creates five transactions for the first sender wallet, one per day """
+
+        for day in range(1, 6):
+            with freeze_time("2021-07-0{} 12:00:00".format(day)):
+                request_data = {
+                    "from_banking_account": self.default_sender_bank_account_one.pk,
+                    "to_banking_account": self.default_reciever_one_bank_account.pk,
+                    "deposit_amount": day
+                }
+                response = self.client.post('/transactions/make/', request_data)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_get_account_history_pagination(self):
+        """ Walks transaction history page by page following cursors """
+
+        self.make_history()
+
+        uri = "/accounts/{}/get-history/?limit=2".format(self.default_sender_bank_account_one.pk)
+        amounts = []
+        pages = 0
+        while uri:
+            response = self.client.get(uri)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response_json = response.json()
+            amounts.extend(item["amount"] for item in response_json["results"])
+            uri = response_json["next"]
+            pages += 1
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(amounts, ["1.00", "2.00", "3.00", "4.00", "5.00"])
+
+    def test_get_account_history_filters(self):
+        """ History can be filtered by date range and returned newest first """
+
+        self.make_history()
+
+        uri = "/accounts/{}/get-history/".format(self.default_sender_bank_account_one.pk)
+        response = self.client.get(uri, {
+            "since": "2021-07-02T00:00:00Z",
+            "until": "2021-07-05T00:00:00Z",
+            "direction": "desc"
+        })
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["amount"] for item in response.json()], ["4.00", "3.00", "2.00"])
+
+        response = self.client.get(uri, {"direction": "desc", "limit": 4})
+        response_json = response.json()
+        self.assertEqual([item["amount"] for item in response_json["results"]], ["5.00", "4.00", "3.00", "2.00"])
+
+        response = self.client.get(response_json["next"])
+        response_json = response.json()
+        self.assertEqual([item["amount"] for item in response_json["results"]], ["1.00"])
+        self.assertIsNone(response_json["next"])
+
+    def test_get_account_history_streaming(self):
+        """ Streamed history matches the regular response """
+
+        self.make_history()
+
+        uri = "/accounts/{}/get-history/".format(self.default_sender_bank_account_one.pk)
+        expected_response_json = self.client.get(uri).json()
+
+        response = self.client.get(uri, {"stream": "json"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(json.loads(b"".join(response.streaming_content)), expected_response_json)
+
+        response = self.client.get(uri, {"stream": "ndjson"})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], expected_response_json)
+
+    def test_get_account_history_invalid_query(self):
+        """ Malformed history query parameters are rejected """
+
+        uri = "/accounts/{}/get-history/".format(self.default_sender_bank_account_one.pk)
+
+        response = self.client.get(uri, {"cursor": "garbage"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {"cursor": ["Invalid cursor."]})
+
+        response = self.client.get(uri, {"limit": 0, "direction": "sideways"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.json()), {"limit", "direction"})
@@ -0,0 +1,67 @@
+from django.test import TestCase
+
+from benchmarks import endpoints
+from benchmarks.compare import compare
+
+
+def _result(requests_per_s=100.0, p95_ms=10.0, queries_per_request=2.0):
+    return {
+        "mode": "in-process",
+        "dataset": {"customers": 1},
+        "requests": 10,
+        "concurrency": 1,
+        "routes": {
+            "accounts-get-balance": {
+                "requests_per_s": requests_per_s, "p95_ms": p95_ms, "queries_per_request": queries_per_request
+            },
+            "new-route": {"skipped": "no request factory"},
+        },
+    }
+
+
+class TestEndpointsBenchmark(TestCase):
+    """ Tests for the endpoints benchmark and the comparison of its results """
+
+    def test_every_route_has_a_request_factory(self):
+        """ New routes have to be added to the benchmark """
+
+        self.assertEqual(set(endpoints.route_names()) - set(endpoints.ROUTES), set())
+
+    def test_in_process_run(self):
+        """ A small in-process run measures every route without errors """
+
+        results = endpoints.run(customers=2, accounts=4, transactions=10, requests=2)
+
+        self.assertEqual(results["dataset"]["accounts"], 4)
+        self.assertEqual(set(results["routes"]), set(endpoints.route_names()))
+        for name, route in results["routes"].items():
+            if name in endpoints.ASYNC_ONLY_ROUTES:
+                self.assertIn("skipped", route)
+                continue
+            self.assertEqual(route["errors"], 0, name)
+        self.assertEqual(results["routes"]["accounts-get-balance"]["queries_per_request"], 1)
+
+    def test_compare_within_threshold(self):
+        """ Changes within the threshold aren't regressions """
+
+        changes, regressions = compare(_result(), _result(requests_per_s=95.0, p95_ms=10.5), threshold=0.1)
+
+        self.assertEqual(regressions, [])
+        self.assertEqual(changes["accounts-get-balance"]["requests_per_s"], -0.05)
+
+    def test_compare_regressions(self):
+        """ Slower routes and additional queries are regressions """
+
+        _, regressions = compare(_result(), _result(requests_per_s=80.0, p95_ms=12.0, queries_per_request=3.0))
+
+        self.assertEqual(len(regressions), 3)
+
+    def test_compare_different_setups(self):
+        """ Results of different setups aren't comparable """
+
+        current = _result()
+        current["mode"] = "server"
+
+        _, regressions = compare(_result(), current)
+
+        self.assertEqual(len(regressions), 1)
@@ -0,0 +1,29 @@
+from unittest import mock
+
+from django.db import connection, connections
+from django.db.utils import OperationalError
+from django.test import TestCase
+
+from account.connections import warm_up_connections
+
+
+class TestConnectionWarmup(TestCase):
+    """ Tests for opening database connections when a worker starts """
+
+    databases = "__all__"
+
+    def test_warm_up_opens_connections(self):
+        """ Every configured database gets an open, usable connection """
+
+        timings = warm_up_connections()
+
+        self.assertEqual(set(timings), set(connections))
+        self.assertIsNotNone(connection.connection)
+        self.assertTrue(connection.is_usable())
+
+    def test_warm_up_skips_unreachable_databases(self):
+        """ A database which can't be reached is logged, the worker still boots """
+
+        with mock.patch.object(connection, "ensure_connection", side_effect=OperationalError("unreachable")),\
+                self.assertLogs("account.connections", level="ERROR"):
+            self.assertNotIn("default", warm_up_connections())
@@ -0,0 +1,47 @@
+from django.db import connection
+from django.test import TestCase
+
+from djmoney.money import Money
+
+from account.currencies import CODES, NUMBERS, currency_number
+from account.models import BankAccount, Customer, Transaction
+
+
+class TestCurrencyColumns(TestCase):
+    """ Tests for currencies stored as ISO 4217 numeric codes """
+
+    def setUp(self):
+        self.customer = Customer(name="Test Customer")
+        self.customer.save()
+
+        self.bank_account = BankAccount(owner=self.customer, balance=Money("12.34", "GBP"))
+        self.bank_account.save()
+
+    def test_stored_as_numeric_code(self):
+        """ Currencies are written as their numeric codes and read back as 3 letter codes """
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT balance_currency FROM account_bankaccount WHERE id = %s", [self.bank_account.pk])
+            self.assertEqual(cursor.fetchone()[0], 826)
+
+        account = BankAccount.objects.get(pk=self.bank_account.pk)
+        self.assertEqual(account.balance, Money("12.34", "GBP"))
+        self.assertEqual(account.balance_currency, "GBP")
+        self.assertEqual(list(BankAccount.objects.values_list("balance_currency", flat=True)), ["GBP"])
+
+    def test_lookups(self):
+        """ Currencies filter by 3 letter code, Money lookups included """
+
+        self.assertEqual(BankAccount.objects.filter(balance_currency="GBP").count(), 1)
+        self.assertEqual(BankAccount.objects.filter(balance__gte=Money("12.00", "GBP")).count(), 1)
+        with self.assertRaises(ValueError):
+            BankAccount.objects.filter(balance_currency="XYZ").count()
+
+    def test_choices(self):
+        """ Choices are limited to the configured currencies """
+
+        field = Transaction._meta.get_field("amount_currency")
+        self.assertEqual(field.choices, [("GBP", "British Pound"), ("EUR", "Euro"), ("USD", "US Dollar")])
+        self.assertEqual(NUMBERS, {"GBP": 826, "EUR": 978, "USD": 840})
+        self.assertEqual(CODES, {826: "GBP", 978: "EUR", 840: "USD"})
+        self.assertEqual(currency_number("GBP"), 826)
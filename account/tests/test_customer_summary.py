@@ -0,0 +1,115 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import status
+
+from account.models import Customer, Transaction, BankAccount
+
+
+class TestCustomerSummary(TestCase):
+    """ Tests for portfolio summaries of CustomersViewSet API """
+
+    def setUp(self):
+        self.customer = Customer(name="Test Customer")
+        self.customer.save()
+
+        self.first_bank_account = BankAccount(owner=self.customer, balance=100.00)
+        self.first_bank_account.save()
+
+        self.second_bank_account = BankAccount(owner=self.customer, balance=50.50)
+        self.second_bank_account.save()
+
+        self.other_customer = Customer(name="Other Customer")
+        self.other_customer.save()
+
+        self.other_bank_account = BankAccount(owner=self.other_customer, balance=200.00)
+        self.other_bank_account.save()
+
+        self.now = timezone.now()
+        self.transfer(self.first_bank_account, self.other_bank_account, 10, days_ago=30)
+        self.transfer(self.other_bank_account, self.second_bank_account, 5.25, days_ago=1)
+        # Moving money between own accounts is neither an inflow nor an outflow
+        self.transfer(self.first_bank_account, self.second_bank_account, 7, days_ago=1)
+
+    def transfer(self, sender, recipient, amount, days_ago):
+        transaction = Transaction(sender_account=sender, recipient_account=recipient, amount=amount)
+        transaction.save()
+        Transaction.objects.filter(pk=transaction.pk).update(date=self.now - timedelta(days=days_ago))
+
+    def test_get_summary_happy_path(self):
+        """ Tests balances, accounts and flows of a customer are summed up by a single query """
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/customers/{}/summary/'.format(self.customer.pk))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {
+            "id": self.customer.pk,
+            "accounts": 2,
+            "balance_currency": "GBP",
+            "balance": "150.50",
+            "inflow": "5.25",
+            "outflow": "10.00",
+        })
+
+    def test_get_summary_time_window(self):
+        """ Tests flows are limited to the since/until window """
+
+        uri = '/customers/{}/summary/'.format(self.customer.pk)
+
+        response = self.client.get(uri, {"since": (self.now - timedelta(days=7)).isoformat()})
+        self.assertEqual((response.json()["inflow"], response.json()["outflow"]), ("5.25", "0.00"))
+        self.assertEqual(response.json()["balance"], "150.50")
+
+        response = self.client.get(uri, {"until": (self.now - timedelta(days=7)).isoformat()})
+        self.assertEqual((response.json()["inflow"], response.json()["outflow"]), ("0.00", "10.00"))
+
+        response = self.client.get(uri, {"since": "rubbish"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_summary_customer_without_accounts(self):
+        """ Tests a customer without banking accounts sums up to zero """
+
+        customer = Customer(name="Empty Customer")
+        customer.save()
+
+        response = self.client.get('/customers/{}/summary/'.format(customer.pk))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["accounts"], 0)
+        self.assertEqual(response.json()["balance"], "0.00")
+        self.assertEqual(response.json()["inflow"], "0.00")
+
+    def test_get_summary_customer_does_not_exist(self):
+        """ Tests summary of a non-existing customer """
+
+        response = self.client.get('/customers/42/summary/')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.json(), {"detail": "Customer with id 42 does not exist"})
+
+    def test_get_summaries_happy_path(self):
+        """ Tests summaries of many customers are made by a single query and unknown ids are reported """
+
+        request_data = {"customer_ids": [self.other_customer.pk, 42, self.customer.pk]}
+
+        with self.assertNumQueries(1):
+            response = self.client.post('/customers/summaries/', request_data, content_type="application/json")
+        response_json = response.json()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([summary["id"] for summary in response_json["results"]], [self.customer.pk, self.other_customer.pk])
+        self.assertEqual(response_json["results"][0], self.client.get('/customers/{}/summary/'.format(self.customer.pk)).json())
+        self.assertEqual(response_json["results"][1]["inflow"], "10.00")
+        self.assertEqual(response_json["results"][1]["outflow"], "5.25")
+        self.assertEqual(response_json["missing"], [42])
+
+    def test_get_summaries_invalid_request(self):
+        """ Tests bulk summaries need a non-empty list of at most SUMMARY_MAX_CUSTOMERS customer ids """
+
+        too_many = list(range(1, settings.SUMMARY_MAX_CUSTOMERS + 2))
+        for customer_ids in ([], ["foo"], None, too_many):
+            response = self.client.post('/customers/summaries/', {"customer_ids": customer_ids}, content_type="application/json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
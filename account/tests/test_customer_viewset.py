@@ -1,7 +1,9 @@
-from django.test import TestCase
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
 from rest_framework import status
 
-from account.models import Customer, BankAccount
+from account.models import Customer, BankAccount, LedgerEntry
 
 
 class TestAccountViewSet(TestCase):
@@ -301,3 +303,85 @@ class TestAccountViewSet(TestCase):
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response_json, expected_error_json)
+
+    @override_settings(LEDGER_ENTRIES=1)
+    def test_onboard_customers_happy_path(self):
+        """ Many customers are created with their banking accounts by a few queries """
+
+        request_data = [
+            {"name": "Customer %s" % i, "deposit_amount": "%s.50" % i}
+            for i in range(50)
+        ]
+
+        with self.assertNumQueries(6):
+            response = self.client.post('/customers/onboard/', request_data, content_type='application/json')
+        response_json = response.json()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response_json["mode"], "atomic")
+        self.assertEqual(response_json["created"], 50)
+        self.assertEqual(response_json["failed"], 0)
+
+        result = response_json["results"][3]
+        customer = Customer.objects.get(pk=result["customer"]["id"])
+        self.assertEqual(customer.name, "Customer 3")
+        self.assertEqual(result["account"]["owner"], customer.pk)
+        self.assertEqual(result["account"]["balance"], "3.50")
+        self.assertEqual(BankAccount.objects.get(owner=customer).balance.amount, Decimal("3.50"))
+        self.assertEqual(LedgerEntry.objects.filter(account_id=result["account"]["id"]).count(), 1)
+
+    def test_onboard_customers_atomic_failure(self):
+        """ Atomic onboarding with an existing, repeated or invalid customer creates nothing """
+
+        request_data = [
+            {"name": "New Customer", "deposit_amount": 10},
+            {"name": self.default_customer.name, "deposit_amount": 10},
+            {"name": "New Customer", "deposit_amount": 10},
+            {"name": "Another Customer", "deposit_amount": -1},
+        ]
+
+        response = self.client.post('/customers/onboard/', request_data, content_type='application/json')
+        response_json = response.json()
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response_json["created"], 0)
+        self.assertEqual(response_json["failed"], 1)
+        self.assertEqual([item["status"] for item in response_json["results"]], ["skipped", "skipped", "skipped", "failed"])
+        self.assertIn("deposit_amount", response_json["results"][3]["errors"])
+
+        del request_data[3]
+        response = self.client.post('/customers/onboard/', request_data, content_type='application/json')
+        response_json = response.json()
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([item["status"] for item in response_json["results"]], ["skipped", "failed", "failed"])
+        self.assertEqual(response_json["results"][1]["errors"], {
+            "non_field_errors": ["Customer '%s' already exists" % self.default_customer.name]
+        })
+        self.assertEqual(response_json["results"][2]["errors"], {"non_field_errors": ["Customer 'New Customer' already exists"]})
+        self.assertEqual(Customer.objects.count(), 1)
+
+    def test_onboard_customers_best_effort(self):
+        """ Best-effort onboarding creates every valid customer and reports the others """
+
+        request_data = [
+            {"name": "New Customer", "deposit_amount": 10},
+            {"name": self.default_customer.name, "deposit_amount": 10},
+            {"name": "New Customer", "deposit_amount": 10},
+        ]
+
+        response = self.client.post('/customers/onboard/?mode=best-effort', request_data, content_type='application/json')
+        response_json = response.json()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response_json["created"], 1)
+        self.assertEqual(response_json["failed"], 2)
+        self.assertEqual([item["status"] for item in response_json["results"]], ["ok", "failed", "failed"])
+        self.assertEqual(Customer.objects.filter(name="New Customer").count(), 1)
+
+    def test_onboard_customers_invalid_body(self):
+        """ Onboarding needs a non-empty list of customers """
+
+        for request_data in ([], {"name": "New Customer", "deposit_amount": 10}):
+            response = self.client.post('/customers/onboard/', request_data, content_type='application/json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,100 @@
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+from account.encoders import RowEncoder
+from account.models import Customer, Transaction, BankAccount
+from account.serializers import (
+    BankingAccountResponseSerializer,
+    CustomerResponseSerializer,
+    TransactionHistoryResponseSerializer,
+)
+
+FAST_PATH_ON = override_settings(FAST_SERIALIZATION_VIEWS={"accounts-get-history"})
+FAST_PATH_OFF = override_settings(FAST_SERIALIZATION_VIEWS=set())
+
+
+class TestRowEncoder(TestCase):
+    """ Tests for fast-path encoding, its output must match the serializers byte for byte """
+
+    def setUp(self):
+        sender = Customer(name="Tëst Sender   \"quoted\" 100%")
+        sender.save()
+
+        self.sender_bank_account = BankAccount(owner=sender, balance=100.00)
+        self.sender_bank_account.save()
+
+        reciever = Customer(name="Test Reciever")
+        reciever.save()
+
+        self.reciever_bank_account = BankAccount(owner=reciever, balance=0.1)
+        self.reciever_bank_account.save()
+
+        for amount in (10, 0.01, 12345.67, 99.5):
+            Transaction(sender_account=self.sender_bank_account, recipient_account=self.reciever_bank_account, amount=amount).save()
+        Transaction(sender_account=self.reciever_bank_account, recipient_account=self.sender_bank_account, amount=5).save()
+
+    def assertEncodesLikeSerializer(self, serializer_class, queryset):
+        encoder = RowEncoder(serializer_class)
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+
+        self.assertEqual(encoder.encode_many(encoder.rows(queryset)), expected)
+        for instance, row in zip(queryset, encoder.rows(queryset)):
+            self.assertEqual(encoder.encode(row), JSONRenderer().render(serializer_class(instance).data))
+
+    def test_encodes_like_serializers(self):
+        """ Transactions, banking accounts and customers are encoded exactly like their serializers do """
+
+        self.assertEncodesLikeSerializer(TransactionHistoryResponseSerializer, Transaction.objects.order_by("id"))
+        self.assertEncodesLikeSerializer(BankingAccountResponseSerializer, BankAccount.objects.order_by("id"))
+        self.assertEncodesLikeSerializer(CustomerResponseSerializer, Customer.objects.order_by("id"))
+        self.assertEqual(RowEncoder(CustomerResponseSerializer).encode_many([]), b"[]")
+
+    def get_history(self, uri):
+        response = self.client.get(uri)
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        return response.status_code, response["Content-Type"], content
+
+    def get_async_history(self, uri):
+        async def get():
+            response = await self.async_client.get(uri)
+            if response.streaming:
+                return response.status_code, response["Content-Type"], b"".join(
+                    [chunk async for chunk in response.streaming_content]
+                )
+            return response.status_code, response["Content-Type"], response.content
+
+        with override_settings(ROOT_URLCONF="mock_api.async_urls"):
+            return async_to_sync(get)()
+
+    def test_history_fast_path(self):
+        """ History lists, pages and streams are the same with and without the fast path, sync and async """
+
+        uri = "/accounts/{}/get-history/".format(self.sender_bank_account.pk)
+        queries = ["", "?limit=2", "?limit=2&direction=desc", "?stream=json", "?stream=ndjson", "?cursor=foo"]
+
+        for query in queries:
+            with FAST_PATH_OFF:
+                expected = self.get_history(uri + query)
+            with FAST_PATH_ON:
+                self.assertEqual(self.get_history(uri + query), expected, query)
+                self.assertEqual(self.get_async_history(uri + query), expected, query)
+
+        with FAST_PATH_ON:
+            page = self.client.get(uri, {"limit": 3}).json()
+            next_page = self.client.get(page["next"]).json()
+        self.assertEqual(len(page["results"]) + len(next_page["results"]), 5)
+        self.assertIsNone(next_page["next"])
+
+    @FAST_PATH_ON
+    def test_browsable_api_uses_serializer(self):
+        """ Renderers other than JSON still get serializer data """
+
+        response = self.client.get(
+            "/accounts/{}/get-history/".format(self.sender_bank_account.pk), HTTP_ACCEPT="text/html"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.accepted_renderer.format, "api")
+        self.assertEqual(len(response.data), 5)
@@ -0,0 +1,269 @@
+import os
+import random
+import tempfile
+from decimal import ROUND_HALF_EVEN, Decimal, localcontext
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from rest_framework import status
+
+from djmoney.money import Money
+
+from account.exchange import RATES, ExchangeRateUnavailable, convert, convert_many, load_rates, read_rates
+from account.ledger import open_ledgers, verify_ledger
+from account.models import BankAccount, Customer, ExchangeRate, LedgerEntry, Transaction
+from account.money import from_minor, to_minor
+from account.snapshots import balance_at
+from account.summary import customer_summaries
+from account.transfers import CurrencyNotConvertible, make_batch_transfer, make_transfer
+
+RATES_CSV = "base,quote,rate\nGBP,EUR,1.1700\nGBP,USD,1.2700\nEUR,USD,1.0850\n"
+EXCHANGE_RATES = [("GBP", "EUR", Decimal("1.1700")), ("GBP", "USD", Decimal("1.2700")), ("EUR", "USD", Decimal("1.0850"))]
+
+
+class TestExchangeRates(TestCase):
+    """ Tests for exchange rates and their conversion """
+
+    def setUp(self):
+        RATES.clear()
+        self.addCleanup(RATES.clear)
+
+    def write_rates(self, content):
+        rates_file = tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False)
+        self.addCleanup(os.remove, rates_file.name)
+        with rates_file:
+            rates_file.write(content)
+        return rates_file.name
+
+    def test_load_command(self):
+        """ Every load is a new version, versions beyond --keep are deleted """
+
+        path = self.write_rates(RATES_CSV)
+        for _ in range(3):
+            call_command("load_exchange_rates", path, "--keep", "2", stdout=StringIO())
+
+        self.assertEqual(sorted(set(ExchangeRate.objects.values_list("version", flat=True))), [2, 3])
+        self.assertEqual(ExchangeRate.objects.filter(version=3).count(), 3)
+        self.assertEqual(ExchangeRate.objects.get(version=3, base="GBP", quote="EUR").rate, Decimal("1.17"))
+
+    def test_invalid_files(self):
+        """ Unknown currencies, invalid rates and repeated pairs are refused """
+
+        for content in (
+            "base,quote,rate\nGBP,XYZ,1.5\n",
+            "base,quote,rate\nGBP,EUR,0\n",
+            "base,quote,rate\nGBP,EUR,abc\n",
+            "base,quote,rate\nGBP,EUR,1.00000000001\n",
+            "base,quote,rate\nGBP,GBP,1\n",
+            "base,quote,rate\nGBP,EUR,1.1\nGBP,EUR,1.2\n",
+            "currency,rate\nEUR,1.1\n",
+        ):
+            with self.assertRaises(ValueError, msg=content):
+                read_rates(self.write_rates(content))
+
+        with self.assertRaises(CommandError):
+            call_command("load_exchange_rates", self.write_rates("base,quote,rate\nGBP,EUR,-1\n"), stdout=StringIO())
+        self.assertFalse(ExchangeRate.objects.exists())
+
+    @override_settings(EXCHANGE_RATES_REFRESH_INTERVAL=3600)
+    def test_cached_rates(self):
+        """ Conversions cost no query, newer versions are picked up once the refresh interval has passed """
+
+        load_rates([("GBP", "EUR", Decimal("1.17"))])
+        convert(Decimal("1.00"), "GBP", "EUR")
+
+        with self.assertNumQueries(0):
+            self.assertEqual(convert(Decimal("10.00"), "GBP", "EUR"), Decimal("11.70"))
+            self.assertEqual(convert_many([Decimal("10.00")] * 3, "EUR", "GBP"), [Decimal("8.55")] * 3)
+
+        # Written by another process, this one keeps its rates until it checks again
+        ExchangeRate.objects.create(version=2, base="GBP", quote="EUR", rate=Decimal("1.20"))
+        self.assertEqual(convert(Decimal("10.00"), "GBP", "EUR"), Decimal("11.70"))
+
+        with override_settings(EXCHANGE_RATES_REFRESH_INTERVAL=0):
+            self.assertEqual(convert(Decimal("10.00"), "GBP", "EUR"), Decimal("12.00"))
+        self.assertEqual(RATES.version, 2)
+
+    def test_missing_rate(self):
+        """ Pairs without a rate, in either direction, can't be converted """
+
+        load_rates([("GBP", "EUR", Decimal("1.17"))])
+
+        self.assertEqual(convert(Decimal("5.00"), "USD", "USD"), Decimal("5.00"))
+        with self.assertRaises(ExchangeRateUnavailable):
+            convert(Decimal("5.00"), "GBP", "USD")
+        with self.assertRaises(ExchangeRateUnavailable):
+            convert_many([Decimal("5.00")], "USD", "EUR")
+
+    def test_minor_units(self):
+        """ Amounts convert to whole pence and back, fractions of a penny are refused """
+
+        self.assertEqual(to_minor(Decimal("0.29")), 29)
+        self.assertEqual(to_minor(Decimal("100")), 10000)
+        self.assertEqual(str(from_minor(29)), "0.29")
+        self.assertEqual(str(from_minor(10000)), "100.00")
+        with self.assertRaises(ValueError):
+            to_minor(Decimal("0.001"))
+
+    def test_rounding(self):
+        """ Conversions round half to even, the same one at a time and in batches """
+
+        load_rates([("GBP", "EUR", Decimal("1.5")), ("GBP", "USD", Decimal("1.2734567891"))])
+
+        # 0.015 and 0.045 are exact ties
+        self.assertEqual(convert(Decimal("0.01"), "GBP", "EUR"), Decimal("0.02"))
+        self.assertEqual(convert(Decimal("0.03"), "GBP", "EUR"), Decimal("0.04"))
+        # The inverse of 1.5 is exactly 2/3, not a rounded decimal
+        self.assertEqual(convert(Decimal("1.50"), "EUR", "GBP"), Decimal("1.00"))
+        self.assertEqual(convert(Decimal("0.01"), "EUR", "GBP"), Decimal("0.01"))
+
+        rnd = random.Random(42)
+        amounts = [Decimal(rnd.randint(0, 10 ** rnd.randint(1, 16))) / 100 for _ in range(2000)]
+        for source, target in (("GBP", "EUR"), ("EUR", "GBP"), ("GBP", "USD"), ("USD", "GBP")):
+            numerator, denominator = RATES.rate(source, target)
+            with localcontext(prec=60):
+                expected = [
+                    (amount * numerator / denominator).quantize(Decimal("0.01"), rounding=ROUND_HALF_EVEN)
+                    for amount in amounts
+                ]
+            self.assertEqual([convert(amount, source, target) for amount in amounts], expected)
+            self.assertEqual(convert_many(amounts, source, target), expected)
+
+
+@override_settings(LEDGER_ENTRIES=1)
+class TestMultiCurrencyTransfers(TestCase):
+    """ Tests for transfers between banking accounts held in different currencies """
+
+    def setUp(self):
+        RATES.clear()
+        self.addCleanup(RATES.clear)
+        load_rates(EXCHANGE_RATES)
+
+        self.customer = Customer(name="Test Customer")
+        self.customer.save()
+        self.other_customer = Customer(name="Other Customer")
+        self.other_customer.save()
+
+        self.gbp = BankAccount.objects.create(owner=self.customer, balance=Money("100.00", "GBP"))
+        self.eur = BankAccount.objects.create(owner=self.other_customer, balance=Money("100.00", "EUR"))
+        self.usd = BankAccount.objects.create(owner=self.other_customer, balance=Money("100.00", "USD"))
+        open_ledgers([self.gbp, self.eur, self.usd])
+
+    def balance(self, account):
+        account.refresh_from_db()
+        return account.balance
+
+    def test_transfer(self):
+        """ The sender is debited in its currency, the recipient credited the conversion in its own """
+
+        transaction = make_transfer(self.gbp.pk, self.eur.pk, Decimal("10.00"))
+
+        self.assertEqual(transaction.amount, Money("10.00", "GBP"))
+        self.assertEqual(transaction.credit, Money("11.70", "EUR"))
+        self.assertEqual(self.balance(self.gbp), Money("90.00", "GBP"))
+        self.assertEqual(self.balance(self.eur), Money("111.70", "EUR"))
+        self.assertEqual(
+            sorted(LedgerEntry.objects.filter(transaction=transaction).values_list("amount", "amount_currency")),
+            [(Decimal("-10.00"), "GBP"), (Decimal("11.70"), "EUR")]
+        )
+        self.assertEqual(list(verify_ledger()), [])
+
+        # Transfers within a currency record no credit
+        other_gbp = BankAccount.objects.create(owner=self.customer, balance=Money("0.00", "GBP"))
+        transaction = make_transfer(self.gbp.pk, other_gbp.pk, Decimal("1.00"))
+        self.assertIsNone(Transaction.objects.get(pk=transaction.pk).credit)
+
+    def test_batch_matches_single_transfers(self):
+        """ Batches convert every transfer the same way as transfers made one at a time """
+
+        rnd = random.Random(3)
+        accounts = [self.gbp, self.eur, self.usd]
+        transfers = [tuple(account.pk for account in rnd.sample(accounts, 2)) + (Decimal(rnd.randint(1, 99)) / 100,)
+                     for _ in range(60)]
+
+        batch = make_batch_transfer(transfers)
+        batch_balances = [self.balance(account) for account in accounts]
+        credits = [(transaction.amount, transaction.credit) for transaction in batch]
+
+        Transaction.objects.all().delete()
+        for account in accounts:
+            BankAccount.objects.filter(pk=account.pk).update(balance=Decimal("100.00"))
+        single = [make_transfer(*transfer) for transfer in transfers]
+
+        self.assertEqual([(transaction.amount, transaction.credit) for transaction in single], credits)
+        self.assertEqual([self.balance(account) for account in accounts], batch_balances)
+
+    def test_missing_rate(self):
+        """ Transfers between currencies without a rate fail, the rest of a best-effort batch is applied """
+
+        other_eur = BankAccount.objects.create(owner=self.customer, balance=Money("100.00", "EUR"))
+        load_rates([("GBP", "EUR", Decimal("1.1700"))])
+
+        with self.assertRaises(CurrencyNotConvertible):
+            make_transfer(self.gbp.pk, self.usd.pk, Decimal("1.00"))
+
+        results = make_batch_transfer([
+            (self.gbp.pk, self.usd.pk, Decimal("1.00")),
+            (self.gbp.pk, other_eur.pk, Decimal("1.00")),
+        ], atomic=False)
+        self.assertIsInstance(results[0], CurrencyNotConvertible)
+        self.assertEqual(results[1].credit, Money("1.17", "EUR"))
+        self.assertEqual(self.balance(self.usd), Money("100.00", "USD"))
+
+        response = self.client.post(
+            "/transactions/make/", {"from_banking_account": self.usd.pk, "to_banking_account": self.gbp.pk, "deposit_amount": 1}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {"non_field_errors": ["No exchange rate from USD to GBP"]})
+
+    def test_balances_and_summaries(self):
+        """ Point-in-time balances and portfolio summaries account for converted credits """
+
+        before = make_transfer(self.gbp.pk, self.usd.pk, Decimal("0.00")).date
+        make_transfer(self.gbp.pk, self.eur.pk, Decimal("10.00"))
+
+        self.assertEqual(balance_at(self.eur.pk, before)[0], Money("100.00", "EUR"))
+
+        summary, = customer_summaries([self.other_customer.pk])
+        # 111.70 EUR and 100.00 USD in GBP
+        expected = Decimal("111.70") * 100 / 117 + Decimal("100.00") * 100 / 127
+        self.assertAlmostEqual(Decimal(summary["balance"]), expected, places=2)
+        self.assertAlmostEqual(Decimal(summary["inflow"]), Decimal("10.00"), places=2)
+
+    def test_summaries_without_rates(self):
+        """ Summaries of customers holding accounts in currencies without a rate are refused, not added up """
+
+        RATES.clear()
+        load_rates([("GBP", "EUR", Decimal("1.1700"))])
+
+        with self.assertRaises(ExchangeRateUnavailable):
+            customer_summaries([self.other_customer.pk])
+        self.assertEqual(customer_summaries([self.customer.pk])[0]["balance"], Decimal("100.00"))
+
+        ExchangeRate.objects.all().delete()
+        RATES.clear()
+        response = self.client.get("/customers/%s/summary/" % self.other_customer.pk)
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.json(), {"detail": "No exchange rate from USD to GBP"})
+        response = self.client.post(
+            "/customers/summaries/", {"customer_ids": [self.customer.pk, self.other_customer.pk]}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_open_accounts_in_currencies(self):
+        """ Customers and banking accounts are opened in the requested currency, GBP by default """
+
+        response = self.client.post("/customers/create-customer-account/", {"name": "Euro Customer", "deposit_amount": 5, "currency": "EUR"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        account = BankAccount.objects.get(owner__name="Euro Customer")
+        self.assertEqual(account.balance, Money("5.00", "EUR"))
+        self.assertEqual(LedgerEntry.objects.get(account=account).balance, Money("5.00", "EUR"))
+
+        response = self.client.post("/customers/add-banking-account/", {"owner_id": self.customer.pk, "deposit_amount": 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["balance_currency"], "GBP")
+
+        response = self.client.post("/customers/add-banking-account/", {"owner_id": self.customer.pk, "deposit_amount": 5, "currency": "JPY"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
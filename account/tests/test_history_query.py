@@ -0,0 +1,48 @@
+from django.db import connection
+from django.test import TestCase
+
+from account.history import account_history
+from account.models import Customer, BankAccount
+
+
+class TestHistoryQueryPlan(TestCase):
+    """ Regression tests for the account history query plan """
+
+    def setUp(self):
+        customer = Customer(name="Test Customer")
+        customer.save()
+
+        self.bank_account = BankAccount(owner=customer, balance=100.00)
+        self.bank_account.save()
+
+    def get_plan(self, queryset):
+        if connection.vendor == "postgresql":
+            # Tiny test tables are always cheaper to scan sequentially, make the planner show index usage
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        return queryset.explain()
+
+    def test_history_uses_composite_indexes(self):
+        """ Both sides of the history are read from their (account, date, id) indexes """
+
+        plan = self.get_plan(account_history(self.bank_account.pk, limit=100))
+
+        self.assertIn("transaction_sender_date_idx", plan)
+        self.assertIn("transaction_recipient_date_idx", plan)
+        self.assertNotIn("BitmapOr", plan)
+        if connection.vendor == "sqlite":
+            # Index order is merged directly, no temporary sort
+            self.assertIn("MERGE (UNION ALL)", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_history_page_is_a_single_query(self):
+        """ A history page costs exactly one query """
+
+        uri = "/accounts/{}/get-history/".format(self.bank_account.pk)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(uri, {"limit": 10})
+        self.assertEqual(response.json(), {"next": None, "results": []})
+
+        with self.assertNumQueries(1):
+            self.client.get(uri)
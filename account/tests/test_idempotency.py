@@ -0,0 +1,142 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import status
+
+from freezegun import freeze_time
+
+from account.models import Customer, Transaction, BankAccount, IdempotencyKey
+
+
+class TestIdempotencyKey(TestCase):
+    """ Tests for Idempotency-Key handling of write endpoints """
+
+    def setUp(self):
+        sender = Customer(name="Test Sender")
+        sender.save()
+
+        self.sender_bank_account = BankAccount(owner=sender, balance=100.00)
+        self.sender_bank_account.save()
+
+        reciever = Customer(name="Test Reciever")
+        reciever.save()
+
+        self.reciever_bank_account = BankAccount(owner=reciever, balance=100.00)
+        self.reciever_bank_account.save()
+
+        self.transfer_data = {
+            "from_banking_account": self.sender_bank_account.pk,
+            "to_banking_account": self.reciever_bank_account.pk,
+            "deposit_amount": 30
+        }
+
+    def transfer(self, key, data=None):
+        return self.client.post('/transactions/make/', data or self.transfer_data, HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_transfer_replay(self):
+        """ Repeated transfer returns the stored response and moves money once """
+
+        response = self.transfer("key-1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Idempotent-Replayed", response)
+
+        replay = self.transfer("key-1")
+        self.assertEqual(replay.status_code, status.HTTP_200_OK)
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertEqual(replay.json(), response.json())
+
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.sender_bank_account.refresh_from_db()
+        self.assertEqual(self.sender_bank_account.balance.amount, 70)
+
+    def test_replay_is_a_single_lookup(self):
+        """ Replays never touch banking accounts """
+
+        self.transfer("key-1")
+        with self.assertNumQueries(1):
+            self.transfer("key-1")
+
+    def test_different_keys_execute(self):
+        """ Every new key executes the request """
+
+        self.transfer("key-1")
+        self.transfer("key-2")
+        self.assertEqual(Transaction.objects.count(), 2)
+
+    def test_key_reused_with_different_request(self):
+        """ Reusing a key for a different request is rejected """
+
+        self.transfer("key-1")
+        response = self.transfer("key-1", dict(self.transfer_data, deposit_amount=10))
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_errors_are_replayed(self):
+        """ Client errors are stored and replayed as well """
+
+        response = self.transfer("key-1", dict(self.transfer_data, deposit_amount=1000))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        replay = self.transfer("key-1", dict(self.transfer_data, deposit_amount=1000))
+        self.assertEqual(replay.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(replay.json(), response.json())
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+
+    def test_invalid_key(self):
+        """ Empty and too long keys are rejected """
+
+        for key in ("", "k" * 256):
+            response = self.transfer(key)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Transaction.objects.count(), 0)
+
+    def test_expired_key_executes_again(self):
+        """ Keys are replayed until they expire """
+
+        self.transfer("key-1")
+        with freeze_time(timezone.now() + timedelta(days=2)):
+            response = self.transfer("key-1")
+
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_create_customer_account_replay(self):
+        """ Repeated customer creation returns the customer created by the first request """
+
+        request_data = {"name": "Test Test", "deposit_amount": 10}
+        response = self.client.post('/customers/create-customer-account/', request_data, HTTP_IDEMPOTENCY_KEY="key-1")
+        replay = self.client.post('/customers/create-customer-account/', request_data, HTTP_IDEMPOTENCY_KEY="key-1")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(replay.status_code, status.HTTP_200_OK)
+        self.assertEqual(replay.json(), response.json())
+        self.assertEqual(Customer.objects.filter(name="Test Test").count(), 1)
+
+    def test_keys_are_scoped_by_action(self):
+        """ The same key used with different actions doesn't collide """
+
+        self.transfer("key-1")
+        response = self.client.post(
+            '/customers/create-customer-account/', {"name": "Test Test", "deposit_amount": 10}, HTTP_IDEMPOTENCY_KEY="key-1"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Idempotent-Replayed", response)
+
+    def test_purge_expired_keys(self):
+        """ Purge deletes expired keys only """
+
+        self.transfer("key-1")
+        with freeze_time(timezone.now() - timedelta(days=2)):
+            self.transfer("key-2")
+
+        out = StringIO()
+        call_command("purge_idempotency_keys", "--chunk-size", "1", stdout=out)
+
+        self.assertIn("Purged 1 expired idempotency keys", out.getvalue())
+        self.assertEqual(list(IdempotencyKey.objects.values_list("key", flat=True)), ["key-1"])
@@ -0,0 +1,112 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from freezegun import freeze_time
+from rest_framework import status
+
+from account.ledger import verify_ledger
+from account.models import Customer, Transaction, BankAccount, LedgerEntry
+
+
+@override_settings(LEDGER_ENTRIES=1)
+class TestLedger(TestCase):
+    """ Tests for ledger entries, backfill and reconciliation """
+
+    def setUp(self):
+        response = self.client.post('/customers/create-customer-account/', {"name": "Test Sender", "deposit_amount": 100})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.sender_bank_account = BankAccount.objects.get(owner__pk=response.json()["id"])
+
+        response = self.client.post('/customers/create-customer-account/', {"name": "Test Reciever", "deposit_amount": 50})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.reciever_bank_account = BankAccount.objects.get(owner__pk=response.json()["id"])
+
+    def transfer(self, amount):
+        request_data = {
+            "from_banking_account": self.sender_bank_account.pk,
+            "to_banking_account": self.reciever_bank_account.pk,
+            "deposit_amount": amount
+        }
+        response = self.client.post('/transactions/make/', request_data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def ledger(self, account):
+        return [
+            (amount, balance) for amount, balance in
+            LedgerEntry.objects.filter(account=account).order_by("date", "id").values_list("amount", "balance")
+        ]
+
+    def test_transfer_writes_double_entries(self):
+        """ Every transfer writes a debit and a credit entry carrying running balances """
+
+        self.transfer(30)
+        self.transfer(20)
+
+        self.assertEqual(self.ledger(self.sender_bank_account), [
+            (Decimal("100.00"), Decimal("100.00")),
+            (Decimal("-30.00"), Decimal("70.00")),
+            (Decimal("-20.00"), Decimal("50.00")),
+        ])
+        self.assertEqual(self.ledger(self.reciever_bank_account), [
+            (Decimal("50.00"), Decimal("50.00")),
+            (Decimal("30.00"), Decimal("80.00")),
+            (Decimal("20.00"), Decimal("100.00")),
+        ])
+        self.assertEqual(list(verify_ledger()), [])
+
+    def test_ledger_entries_off(self):
+        """ Without LEDGER_ENTRIES transfers and new accounts write no ledger entries """
+
+        with self.settings(LEDGER_ENTRIES=0):
+            response = self.client.post('/customers/create-customer-account/', {"name": "Test Other", "deposit_amount": 10})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            before = LedgerEntry.objects.count()
+            self.transfer(30)
+
+        self.assertFalse(LedgerEntry.objects.filter(account__owner__pk=response.json()["id"]).exists())
+        self.assertEqual(LedgerEntry.objects.count(), before)
+
+    def test_backfill_legacy_transactions(self):
+        """ Backfill rebuilds ledgers of accounts which predate the ledger """
+
+        with freeze_time("2021-07-01 12:00:00"):
+            self.transfer(30)
+        with freeze_time("2021-07-03 12:00:00"):
+            self.transfer(20)
+        LedgerEntry.objects.all().delete()
+
+        out = StringIO()
+        call_command("backfill_ledger", chunk_size=1, stdout=out)
+        self.assertIn("2 accounts, 6 entries", out.getvalue())
+
+        self.assertEqual(self.ledger(self.sender_bank_account), [
+            (Decimal("100.00"), Decimal("100.00")),
+            (Decimal("-30.00"), Decimal("70.00")),
+            (Decimal("-20.00"), Decimal("50.00")),
+        ])
+
+        # Accounts with a ledger are left alone
+        out = StringIO()
+        call_command("backfill_ledger", stdout=out)
+        self.assertIn("0 accounts, 0 entries", out.getvalue())
+
+        call_command("verify_ledger", stdout=StringIO())
+
+    def test_verify_detects_mismatch(self):
+        """ Balances changed outside of the ledger are reported """
+
+        self.transfer(30)
+        BankAccount.objects.filter(pk=self.sender_bank_account.pk).update(balance=1000)
+
+        self.assertEqual(list(verify_ledger()), [{
+            "account": self.sender_bank_account.pk,
+            "balance": Decimal("1000.00"),
+            "ledger_total": Decimal("70.00"),
+            "latest_balance": Decimal("70.00")
+        }])
+
+        with self.assertRaises(CommandError):
+            call_command("verify_ledger", stdout=StringIO())
@@ -0,0 +1,122 @@
+import json
+import os
+import tempfile
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework import status
+
+from account import metrics
+from account.metrics import MetricsRegistry, clear_metrics_dir, install_query_recorder, metrics_view
+from account.models import Customer, BankAccount, Transaction
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_DIR="")
+class TestMetrics(TestCase):
+    """ Tests for per-route request metrics and their Prometheus exposition """
+
+    def setUp(self):
+        customer = Customer(name="Test Customer")
+        customer.save()
+
+        self.bank_account = BankAccount(owner=customer, balance=100.00)
+        self.bank_account.save()
+
+        # The test database connection was opened before metrics were enabled
+        install_query_recorder()
+
+        self.registry = MetricsRegistry()
+        patcher = mock.patch.object(metrics, "registry", self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sample(self, name, route, **labels):
+        labels = dict(labels, route=route)
+        return sum(
+            value for (sample, sample_labels), value in self.registry.collect().items()
+            if sample == name and labels.items() <= dict(sample_labels).items()
+        )
+
+    def scrape(self):
+        response = metrics_view(RequestFactory().get("/metrics"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    def test_request_metrics(self):
+        """ Requests are counted per route with their queries, database and serializer time """
+
+        for _ in range(2):
+            response = self.client.get('/accounts/%s/get-balance/' % self.bank_account.pk)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        route = "accounts-get-balance"
+        self.assertEqual(self.sample(metrics.REQUESTS, route, method="GET", status="200"), 2)
+        self.assertEqual(self.sample(metrics.DURATION + "_count", route), 2)
+        self.assertEqual(self.sample(metrics.DB_QUERIES, route), 2)
+        self.assertGreater(self.sample(metrics.DB_DURATION, route), 0)
+        self.assertGreater(self.sample(metrics.SERIALIZER_DURATION, route), 0)
+
+        exposition = self.scrape()
+        self.assertIn('api_requests_total{method="GET",route="accounts-get-balance",status="200"} 2.0', exposition)
+        self.assertIn('api_request_duration_seconds_bucket{method="GET",route="accounts-get-balance",le="+Inf"} 2.0', exposition)
+        self.assertIn("# TYPE api_request_duration_seconds histogram", exposition)
+
+    def test_unmatched_routes(self):
+        """ Unknown URLs share a single route label """
+
+        self.client.get('/unknown/1/')
+        self.client.get('/unknown/2/')
+
+        self.assertEqual(self.sample(metrics.REQUESTS, metrics.UNMATCHED_ROUTE, status="404"), 2)
+
+    @override_settings(ROOT_URLCONF="mock_api.async_urls")
+    def test_async_views(self):
+        """ Queries made by async views are attributed to their requests """
+
+        response = async_to_sync(self.async_client.get)('/accounts/%s/get-balance/' % self.bank_account.pk)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.sample(metrics.REQUESTS, "accounts-get-balance"), 1)
+        self.assertEqual(self.sample(metrics.DB_QUERIES, "accounts-get-balance"), 1)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        """ Nothing is recorded with metrics disabled """
+
+        self.client.get('/accounts/%s/get-balance/' % self.bank_account.pk)
+
+        self.assertEqual(self.registry.collect(), {})
+
+    @override_settings(METRICS_ENABLED=False, FAST_SERIALIZATION_VIEWS=set())
+    def test_disabled_serializers_skip_timing(self):
+        """ Serializers don't enter the timing block per row with metrics disabled """
+
+        other = BankAccount.objects.create(owner=self.bank_account.owner, balance=0)
+        for _ in range(3):
+            Transaction.objects.create(sender_account=self.bank_account, recipient_account=other, amount=1)
+
+        with mock.patch.object(metrics, "serialization", wraps=metrics.serialization) as serialization:
+            response = self.client.get('/accounts/%s/get-history/' % self.bank_account.pk)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.json()), 3)
+
+        serialization.assert_not_called()
+
+    def test_workers_share_a_directory(self):
+        """ Samples of all worker processes found in METRICS_DIR are summed up """
+
+        with tempfile.TemporaryDirectory() as metrics_dir, override_settings(METRICS_DIR=metrics_dir):
+            labels = [["method", "GET"], ["route", "accounts-get-balance"], ["status", "200"]]
+            with open(os.path.join(metrics_dir, "1-other.json"), "w") as f:
+                json.dump([[metrics.REQUESTS, labels, 3]], f)
+
+            self.client.get('/accounts/%s/get-balance/' % self.bank_account.pk)
+            self.registry.flush()
+            self.assertEqual(len(os.listdir(metrics_dir)), 2)
+            self.assertEqual(self.sample(metrics.REQUESTS, "accounts-get-balance"), 4)
+            self.assertIn('route="accounts-get-balance",status="200"} 4.0', self.scrape())
+
+            clear_metrics_dir()
+            self.assertEqual(os.listdir(metrics_dir), [])
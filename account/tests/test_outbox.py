@@ -0,0 +1,256 @@
+import json
+import os
+import socket
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+
+from account.models import BankAccount, Customer, OutboxEvent, OutboxOffset
+from account.outbox import HORIZON, TRANSACTION_CREATED, Gaps, QueueSink, Relay, SocketSink, get_sink, purge_events
+from account.transfers import make_batch_transfer, make_transfer
+
+
+class FailingSink:
+    def publish(self, lines):
+        raise OSError("Sink unavailable")
+
+    def close(self):
+        pass
+
+
+class TestOutbox(TestCase):
+    """ Tests for the transactional outbox, its relay and event streams """
+
+    def setUp(self):
+        HORIZON.reset()
+        self.addCleanup(HORIZON.reset)
+
+        sender = Customer(name="Test Sender")
+        sender.save()
+        self.sender_bank_account = BankAccount(owner=sender, balance=100.00)
+        self.sender_bank_account.save()
+
+        reciever = Customer(name="Test Reciever")
+        reciever.save()
+        self.reciever_bank_account = BankAccount(owner=reciever, balance=100.00)
+        self.reciever_bank_account.save()
+
+        self.other_bank_account = BankAccount(owner=reciever, balance=100.00)
+        self.other_bank_account.save()
+
+    def transfer(self, count=1, recipient=None):
+        recipient = recipient or self.reciever_bank_account
+        return make_batch_transfer([(self.sender_bank_account.pk, recipient.pk, Decimal("1.00"))] * count)
+
+    def drain(self, relay):
+        lines = []
+        while relay.relay_batch():
+            while not relay.sink.queue.empty():
+                lines.append(json.loads(relay.sink.queue.get()))
+        return lines
+
+    def test_transfers_write_events(self):
+        """ Every transaction gets an event holding the JSON of its history entry """
+
+        make_transfer(self.sender_bank_account.pk, self.reciever_bank_account.pk, Decimal("10.50"))
+        self.transfer(2)
+
+        events = list(OutboxEvent.objects.all())
+        self.assertEqual(len(events), 3)
+        self.assertEqual({event.topic for event in events}, {TRANSACTION_CREATED})
+        self.assertEqual({event.sender_account_id for event in events}, {self.sender_bank_account.pk})
+
+        history = self.client.get('/accounts/{}/get-history/'.format(self.sender_bank_account.pk)).json()
+        self.assertEqual([json.loads(event.payload) for event in events], history)
+        self.assertEqual(history[0]["amount"], "10.50")
+
+    def test_failed_transfers_write_no_events(self):
+        """ Refused transfers and transfers with the outbox disabled leave no event """
+
+        make_batch_transfer([
+            (self.sender_bank_account.pk, self.reciever_bank_account.pk, Decimal("1.00")),
+            (self.sender_bank_account.pk, self.reciever_bank_account.pk, Decimal("1000.00")),
+        ])
+        with override_settings(OUTBOX_ENABLED=0):
+            self.transfer()
+
+        self.assertEqual(OutboxEvent.objects.count(), 0)
+
+    def test_gaps(self):
+        """ Events after a gap in ids are held back until the transactions running when they were read are over """
+
+        snapshot = [(5, 10)]
+        gaps = Gaps(lambda: snapshot[0])
+        self.assertEqual(gaps.settled([(1,), (2,), (4,), (5,)], 0), [(1,), (2,)])
+        self.assertEqual(gaps.settled([(3,)], 0), [])
+
+        # Transactions which started before the read are still running
+        gaps.check()
+        self.assertEqual(gaps.settled([(4,), (5,)], 2), [])
+
+        snapshot[0] = (10, 12)
+        gaps.check()
+        self.assertEqual(gaps.settled([(4,), (5,), (7,)], 2), [(4,), (5,)])
+        # Without snapshots, databases with one writer at a time, gaps below the latest id are final
+        self.assertEqual(Gaps(lambda: None).settled([(1,), (3,)], 0), [(1,), (3,)])
+
+    def test_relay_waits_for_late_commits(self):
+        """ An event committed after events with higher ids were published is still published """
+
+        self.transfer(3)
+        pks = list(OutboxEvent.objects.order_by("pk").values_list("pk", flat=True))
+        late = OutboxEvent.objects.get(pk=pks[1])
+        OutboxEvent.objects.filter(pk=pks[1]).delete()
+
+        snapshot = [(5, 10)]
+        relay = Relay(QueueSink(), consumer="test", snapshot=lambda: snapshot[0])
+        self.assertEqual([line["id"] for line in self.drain(relay)], pks[:1])
+
+        # The transaction holding the missing id commits however late, the dates of events don't matter
+        self.assertEqual(self.drain(relay), [])
+        late.created = timezone.now() - timedelta(days=1)
+        late.save()
+        self.assertEqual([line["id"] for line in self.drain(relay)], pks[1:])
+
+    def test_relay(self):
+        """ Events are published in id order once and the consumer position follows them """
+
+        self.transfer(5)
+        self.transfer(2, self.other_bank_account)
+        relay = Relay(QueueSink(), consumer="test", batch_size=3)
+
+        lines = self.drain(relay)
+        self.assertEqual([line["id"] for line in lines], list(OutboxEvent.objects.values_list("pk", flat=True)))
+        self.assertEqual({line["topic"] for line in lines}, {TRANSACTION_CREATED})
+        self.assertEqual(lines[-1]["data"]["recipient_account"], self.other_bank_account.pk)
+        self.assertEqual(OutboxOffset.objects.get(consumer="test").position, lines[-1]["id"])
+
+        self.assertEqual(self.drain(relay), [])
+        self.transfer()
+        self.assertEqual(len(self.drain(relay)), 1)
+
+    def test_relay_delivers_at_least_once(self):
+        """ A batch the sink failed to take is published again, other consumers keep their own position """
+
+        self.transfer(3)
+        with self.assertRaises(OSError):
+            Relay(FailingSink(), consumer="test").relay_batch()
+
+        self.assertEqual(OutboxOffset.objects.filter(consumer="test", position__gt=0).count(), 0)
+        self.assertEqual(len(self.drain(Relay(QueueSink(), consumer="test"))), 3)
+        self.assertEqual(len(self.drain(Relay(QueueSink(), consumer="other"))), 3)
+
+    def test_relay_command_to_file(self):
+        """ relay_outbox --once appends the events to an NDJSON file """
+
+        self.transfer(3)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "events", "events.ndjson")
+
+        call_command("relay_outbox", "--once", "--sink", "file:" + path, "--batch-size", "2", stdout=StringIO())
+        self.transfer()
+        call_command("relay_outbox", "--once", "--sink", "file:" + path, stdout=StringIO())
+
+        with open(path) as events_file:
+            lines = [json.loads(line) for line in events_file]
+        self.assertEqual([line["id"] for line in lines], list(OutboxEvent.objects.values_list("pk", flat=True)))
+
+    def test_socket_sink(self):
+        """ Events are written to a Unix socket """
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "events.sock")
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(server.close)
+        server.bind(path)
+        server.listen(1)
+
+        self.transfer(2)
+        sink = SocketSink(path)
+        Relay(sink).relay_batch()
+        sink.close()
+
+        connection, _ = server.accept()
+        with connection, connection.makefile("rb") as events:
+            self.assertEqual(len([json.loads(line) for line in events]), 2)
+
+    def test_get_sink(self):
+        """ Sinks are picked by their prefix, unknown ones are refused """
+
+        self.assertEqual(get_sink("file:/tmp/events.ndjson").path, "/tmp/events.ndjson")
+        self.assertIsInstance(get_sink("socket:/tmp/events.sock"), SocketSink)
+        for spec in ("kafka:events", "file:", "events.ndjson"):
+            with self.assertRaises(ImproperlyConfigured):
+                get_sink(spec)
+
+    def test_purge(self):
+        """ Only events past the retention window which every consumer got are purged """
+
+        self.transfer(4)
+        pks = list(OutboxEvent.objects.values_list("pk", flat=True))
+        OutboxEvent.objects.filter(pk__in=pks[:3]).update(created=timezone.now() - timedelta(days=30))
+        OutboxOffset.objects.create(consumer="slow", position=pks[1])
+        OutboxOffset.objects.create(consumer="fast", position=pks[-1])
+
+        self.assertEqual(sum(purge_events(chunk_size=1)), 2)
+        OutboxOffset.objects.filter(consumer="slow").update(position=pks[-1])
+        call_command("purge_outbox", stdout=StringIO())
+        self.assertEqual(list(OutboxEvent.objects.values_list("pk", flat=True)), pks[3:])
+
+    def stream(self, uri, **headers):
+        async def read():
+            response = await self.async_client.get(uri, headers={"Accept": "text/event-stream", **headers})
+            return response, b"".join([chunk async for chunk in response.streaming_content])
+
+        response, content = async_to_sync(read)()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return content.decode()
+
+    @override_settings(ROOT_URLCONF="mock_api.async_urls")
+    def test_event_stream(self):
+        """ Streams send the events of the account after the given id as Server-Sent Events """
+
+        self.transfer(2)
+        self.transfer(1, self.other_bank_account)
+        pks = list(OutboxEvent.objects.values_list("pk", flat=True))
+        uri = '/accounts/{}/events/?seconds=0'.format(self.reciever_bank_account.pk)
+
+        content = self.stream(uri + '&after=0')
+        self.assertTrue(content.startswith(": heartbeat\n\n"))
+        frames = [frame for frame in content.split("\n\n") if frame.startswith("id: ")]
+        self.assertEqual([frame.split("\n")[0] for frame in frames], ["id: %s" % pk for pk in pks[:2]])
+        self.assertIn("event: transaction.created\ndata: {", frames[0])
+        self.assertEqual(json.loads(frames[1].split("data: ")[1])["id"], json.loads(OutboxEvent.objects.get(pk=pks[1]).payload)["id"])
+
+        # Reconnecting clients get the events after their last one only
+        self.assertEqual(self.stream(uri, **{"Last-Event-ID": str(pks[0])}).count("id: "), 1)
+        # Without a position, streams start at the current events
+        self.assertEqual(self.stream(uri).count("id: "), 0)
+
+    @override_settings(ROOT_URLCONF="mock_api.async_urls")
+    def test_event_stream_errors(self):
+        """ Unknown accounts and invalid positions or durations are refused """
+
+        uri = '/accounts/{}/events/'.format(self.sender_bank_account.pk)
+        get = async_to_sync(self.async_client.get)
+        self.assertEqual(get('/accounts/42/events/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(get(uri + '?after=-1').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(get(uri + '?seconds=100000').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(get(uri, headers={"Last-Event-ID": "abc"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sync_event_stream_not_served(self):
+        """ Sync workers don't serve streams, which would hold them for their whole duration """
+
+        response = self.client.get('/accounts/{}/events/'.format(self.sender_bank_account.pk), HTTP_ACCEPT="text/event-stream")
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
@@ -0,0 +1,72 @@
+from django.db import transaction as db_transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TransactionTestCase, override_settings
+
+from account.models import BankAccount
+from account.replicas import STICKY_COOKIE, ReplicaMiddleware, ReplicaRouter, current_replica, use_replica
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1"])
+class TestReplicaRouting(TransactionTestCase):
+    """ Tests for routing reads of read-only endpoints to replicas, outside of a test transaction """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.seen = []
+
+    def get_response(self, status=200):
+        def view(request):
+            self.seen.append(current_replica())
+            return HttpResponse(status=status)
+        return view
+
+    def test_router(self):
+        """ Reads follow the replica chosen for the request unless made within a transaction, writes never do """
+
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(BankAccount))
+
+        with use_replica("replica_1"):
+            self.assertEqual(router.db_for_read(BankAccount), "replica_1")
+            self.assertEqual(router.db_for_write(BankAccount), "default")
+            with db_transaction.atomic():
+                self.assertIsNone(router.db_for_read(BankAccount))
+        self.assertFalse(router.allow_migrate("replica_1", "account"))
+
+    def test_read_only_endpoints_read_from_replicas(self):
+        """ Only the endpoints listed in REPLICA_READ_VIEWS read from a replica """
+
+        middleware = ReplicaMiddleware(self.get_response())
+        middleware(self.factory.get("/accounts/1/get-history/"))
+        middleware(self.factory.post("/customers/summaries/"))
+        middleware(self.factory.get("/accounts/1/get-balance/"))
+        middleware(self.factory.get("/no-such-page/"))
+
+        self.assertEqual(self.seen, ["replica_1", "replica_1", None, None])
+        self.assertIsNone(current_replica())
+
+    def test_writes_pin_client_to_primary(self):
+        """ Successful writes set the sticky cookie, clients sending it read from the primary """
+
+        response = ReplicaMiddleware(self.get_response())(self.factory.post("/transactions/make/"))
+        self.assertEqual(response.cookies[STICKY_COOKIE]["max-age"], 5)
+
+        response = ReplicaMiddleware(self.get_response(status=400))(self.factory.post("/transactions/make/"))
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+        response = ReplicaMiddleware(self.get_response())(self.factory.post("/customers/summaries/"))
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+        self.factory.cookies[STICKY_COOKIE] = "1"
+        ReplicaMiddleware(self.get_response())(self.factory.get("/accounts/1/get-history/"))
+        self.assertEqual(self.seen[-1], None)
+
+    def test_streamed_bodies_read_from_replicas(self):
+        """ Chunks of streamed responses, produced after the middleware returned, are routed as well """
+
+        def view(request):
+            return StreamingHttpResponse(str(current_replica()) for _ in range(2))
+
+        response = ReplicaMiddleware(view)(self.factory.get("/accounts/1/get-history/"))
+
+        self.assertEqual(b"".join(response.streaming_content), b"replica_1replica_1")
@@ -0,0 +1,118 @@
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework import status
+
+from account import request_log
+from account.models import Customer, BankAccount, ApiRequestLog
+from account.request_log import RequestLogWriter
+
+
+@override_settings(API_LOG_SINK="database", API_LOG_QUEUE_SIZE=100, API_LOG_BATCH_SIZE=10)
+class TestRequestLog(TestCase):
+    """ Tests for batched API request logging """
+
+    def setUp(self):
+        customer = Customer(name="Test Customer")
+        customer.save()
+
+        self.sender_bank_account = BankAccount(owner=customer, balance=100.00)
+        self.sender_bank_account.save()
+
+        self.reciever_bank_account = BankAccount(owner=customer, balance=100.00)
+        self.reciever_bank_account.save()
+
+        # No background thread, records are written by explicit flushes
+        self.writer = RequestLogWriter(background=False)
+        patcher = mock.patch.object(request_log, "writer", self.writer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def transfer(self, amount):
+        request_data = {
+            "from_banking_account": self.sender_bank_account.pk,
+            "to_banking_account": self.reciever_bank_account.pk,
+            "deposit_amount": amount
+        }
+        return self.client.post('/transactions/make/', request_data, content_type="application/json")
+
+    def test_requests_are_logged_on_flush(self):
+        """ Requests are queued, not written, until the writer flushes """
+
+        self.transfer(10)
+        self.client.get('/accounts/{}/get-balance/'.format(self.sender_bank_account.pk))
+        self.assertEqual(ApiRequestLog.objects.count(), 0)
+
+        self.writer.flush()
+
+        transfer_log, balance_log = ApiRequestLog.objects.order_by("id")
+        self.assertEqual(transfer_log.api, '/transactions/make/')
+        self.assertEqual(transfer_log.method, "POST")
+        self.assertEqual(transfer_log.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(transfer_log.body)["deposit_amount"], 10)
+        self.assertEqual(json.loads(transfer_log.response)["amount"], "10.00")
+        self.assertEqual(balance_log.method, "GET")
+
+    def test_request_adds_no_queries(self):
+        """ Logging doesn't add statements to the request """
+
+        uri = '/accounts/{}/get-balance/'.format(self.sender_bank_account.pk)
+        with self.assertNumQueries(1):
+            self.client.get(uri)
+        self.assertEqual(self.writer.stats(), {"queued": 1})
+
+    def test_flush_is_batched(self):
+        """ Queued records are written with one INSERT per batch """
+
+        for _ in range(25):
+            self.client.get('/accounts/{}/get-balance/'.format(self.sender_bank_account.pk))
+
+        with self.assertNumQueries(3):
+            self.writer.flush()
+        self.assertEqual(ApiRequestLog.objects.count(), 25)
+        self.assertEqual(self.writer.stats(), {"queued": 25, "written": 25})
+
+    def test_back_pressure(self):
+        """ Under pressure successful requests are sampled, errors are kept until the queue is full """
+
+        uri = '/accounts/{}/get-balance/'.format(self.sender_bank_account.pk)
+        with override_settings(API_LOG_QUEUE_SIZE=4, API_LOG_PRESSURE_SAMPLE_RATE=0):
+            for _ in range(5):
+                self.client.get(uri)
+            for _ in range(3):
+                self.client.get('/accounts/42/get-balance/')
+
+        self.assertEqual(self.writer.stats(), {"queued": 4, "sampled_out": 2, "dropped": 2})
+        self.writer.flush()
+        self.assertEqual(
+            list(ApiRequestLog.objects.order_by("id").values_list("status_code", flat=True)),
+            [200, 200, 200, 404]
+        )
+
+    def test_disabled(self):
+        """ Nothing is queued when logging is disabled """
+
+        with override_settings(API_LOG_SINK=""):
+            self.transfer(10)
+        self.assertEqual(self.writer.stats(), {})
+
+    def test_ndjson_sink_with_background_thread(self):
+        """ The background thread writes NDJSON lines, close flushes everything left """
+
+        with tempfile.TemporaryDirectory() as log_dir:
+            log_file = os.path.join(log_dir, "api.ndjson")
+            writer = RequestLogWriter()
+            with override_settings(API_LOG_SINK="ndjson", API_LOG_FILE=log_file, API_LOG_FLUSH_INTERVAL=60), \
+                    mock.patch.object(request_log, "writer", writer):
+                for amount in (1, 2, 3):
+                    self.transfer(amount)
+                writer.close()
+
+            with open(log_file) as f:
+                records = [json.loads(line) for line in f]
+
+        self.assertEqual([json.loads(record["body"])["deposit_amount"] for record in records], [1, 2, 3])
+        self.assertFalse(writer._thread.is_alive())
@@ -0,0 +1,101 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count, Sum
+from django.test import TestCase, override_settings
+from rest_framework import status
+
+from account.ledger import verify_ledger
+from account.models import BankAccount, Customer, LedgerEntry, Transaction
+from account.seeding import seed_bank
+
+
+@override_settings(LEDGER_ENTRIES=1)
+class TestSeedBank(TestCase):
+    """ Tests for the bulk synthetic data generator """
+
+    def seed(self, **options):
+        options = dict({"accounts_per_customer": 2, "transactions": 300, "partitions": 3, "chunk_size": 50}, **options)
+        return list(seed_bank(10, **options))
+
+    def test_counts_and_consistent_balances(self):
+        """ Seeded balances never go negative, reconcile with the ledger and add up to the deposits """
+
+        phases = self.seed(deposit="10.00")
+
+        self.assertEqual([phase for phase, _, _ in phases], ["plan", "accounts", "transactions"])
+        self.assertEqual(Customer.objects.count(), 10)
+        self.assertEqual(BankAccount.objects.count(), 20)
+        self.assertEqual(Transaction.objects.count(), 300)
+        self.assertEqual(LedgerEntry.objects.count(), 20 + 2 * 300)
+        self.assertEqual(list(verify_ledger()), [])
+        self.assertFalse(LedgerEntry.objects.filter(balance__lt=0).exists())
+
+        deposits = LedgerEntry.objects.filter(transaction__isnull=True).aggregate(total=Sum("balance"))["total"]
+        self.assertGreaterEqual(deposits, Decimal("200.00"))
+        self.assertEqual(BankAccount.objects.aggregate(total=Sum("balance"))["total"], deposits)
+
+    def test_dates_follow_ids(self):
+        """ Transfer dates are spread over the requested days in id order """
+
+        self.seed(days=30)
+
+        dates = list(Transaction.objects.order_by("id").values_list("date", flat=True))
+        self.assertEqual(dates, sorted(dates))
+        self.assertGreater((dates[-1] - dates[0]).days, 25)
+
+    def test_skewed_accounts(self):
+        """ A few hot accounts take part in most transfers """
+
+        self.seed(skew=1.5)
+
+        counts = sorted(
+            Transaction.objects.values("sender_account").annotate(count=Count("id")).values_list("count", flat=True),
+            reverse=True
+        )
+        self.assertGreater(sum(counts[:3]), 150)
+
+    def test_same_seed_same_data(self):
+        """ Runs with the same seed generate the same transfers, past the ids of earlier runs """
+
+        transfers = Transaction.objects.order_by("id").values_list("sender_account", "recipient_account", "amount")
+
+        self.seed()
+        first = list(transfers.all())
+        self.seed()
+        second = list(transfers.all())[len(first):]
+
+        self.assertEqual([(sender + 20, recipient + 20, amount) for sender, recipient, amount in first], second)
+
+    def test_api_works_with_seeded_data(self):
+        """ New rows get ids past the seeded ones """
+
+        self.seed()
+
+        response = self.client.post('/customers/create-customer-account/', {"name": "Test Customer", "deposit_amount": 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        account = BankAccount.objects.get(owner__pk=response.json()["id"])
+        response = self.client.post('/transactions/make/', {
+            "from_banking_account": account.pk,
+            "to_banking_account": BankAccount.objects.order_by("pk").first().pk,
+            "deposit_amount": 5
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(verify_ledger()), [])
+
+    def test_command(self):
+        """ The command reports rows per second and peak memory """
+
+        out = StringIO()
+        call_command("seed_bank", "--customers", "5", "--transactions", "20", "--no-ledger", stdout=out)
+
+        self.assertEqual(Transaction.objects.count(), 20)
+        self.assertFalse(LedgerEntry.objects.exists())
+        self.assertIn("rows/s", out.getvalue())
+        self.assertIn("peak memory", out.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command("seed_bank", "--customers", "1", "--accounts-per-customer", "1", stdout=StringIO())
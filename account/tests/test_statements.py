@@ -0,0 +1,141 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import status
+
+from djmoney.money import Money
+
+from account.exchange import RATES, load_rates
+from account.models import BankAccount, Customer, Transaction
+from account.statements import COLUMNS, statement_path
+from account.transfers import make_transfer
+
+
+class TestStatements(TestCase):
+    """ Tests for account and customer statements and their export """
+
+    def setUp(self):
+        RATES.clear()
+        self.addCleanup(RATES.clear)
+
+        self.customer = Customer.objects.create(name="Test Customer")
+        self.account = BankAccount.objects.create(owner=self.customer, balance=Money(100, "GBP"))
+        self.euro_account = BankAccount.objects.create(owner=self.customer, balance=Money(100, "EUR"))
+        other = Customer.objects.create(name="Test Other")
+        self.other_account = BankAccount.objects.create(owner=other, balance=Money(100, "GBP"))
+        load_rates([("GBP", "EUR", Decimal("1.1700"))])
+
+        self.start = timezone.now() - timedelta(days=3)
+        BankAccount.objects.update(created=self.start - timedelta(days=1))
+        for days, sender, recipient, amount in (
+            (0, self.account, self.other_account, "10.00"),
+            (1, self.other_account, self.account, "2.50"),
+            (1, self.account, self.euro_account, "20.00"),
+            (2, self.account, self.other_account, "5.00"),
+        ):
+            transaction = make_transfer(sender.pk, recipient.pk, Decimal(amount))
+            Transaction.objects.filter(pk=transaction.pk).update(date=self.start + timedelta(days=days, hours=1))
+
+    def since(self, days):
+        return (self.start + timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def csv_rows(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(tuple(rows[0]), COLUMNS)
+        return [dict(zip(COLUMNS, row)) for row in rows[1:]]
+
+    def test_account_statement(self):
+        """ Opening balance, signed amounts with a running balance and the closing balance of a range """
+
+        response = self.client.get('/accounts/{}/statement/?since={}&until={}'.format(
+            self.account.pk, self.since(1), self.since(2)
+        ))
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        rows = self.csv_rows(response)
+
+        self.assertEqual([row["type"] for row in rows], ["opening", "credit", "debit", "closing"])
+        self.assertEqual([row["amount"] for row in rows], ["", "2.50", "-20.00", ""])
+        self.assertEqual([row["balance"] for row in rows], ["90.00", "92.50", "72.50", "72.50"])
+        self.assertEqual(rows[1]["counterparty"], str(self.other_account.pk))
+        self.assertEqual({row["currency"] for row in rows}, {"GBP"})
+
+    def test_statement_ends_at_current_balance(self):
+        """ Without until the closing balance is the current one, conversions are credited in the account currency """
+
+        response = self.client.get('/accounts/{}/statement/?since={}&stream=ndjson'.format(self.euro_account.pk, self.since(0)))
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+        self.assertEqual([(row["type"], row["amount"]) for row in rows], [("opening", None), ("credit", "23.40"), ("closing", None)])
+        self.assertEqual(rows[-1]["balance"], str(BankAccount.objects.get(pk=self.euro_account.pk).balance.amount))
+        self.assertEqual(rows[0]["currency"], "EUR")
+
+    def test_customer_statement(self):
+        """ Customer statements hold the statements of all their accounts """
+
+        response = self.client.get('/customers/{}/statement/?since={}'.format(self.customer.pk, self.since(0)))
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="statement-customer-{}.csv"'.format(self.customer.pk))
+        rows = self.csv_rows(response)
+
+        self.assertEqual([row["account"] for row in rows], [str(self.account.pk)] * 6 + [str(self.euro_account.pk)] * 3)
+        self.assertEqual(rows[5]["balance"], "67.50")
+
+    def test_gzip(self):
+        """ Statements are gzipped for clients accepting it """
+
+        uri = '/accounts/{}/statement/?since={}&until={}&gzip=true'.format(self.account.pk, self.since(0), self.since(3))
+        plain = b"".join(self.client.get(uri).streaming_content)
+        response = self.client.get(uri, HTTP_ACCEPT_ENCODING="gzip, deflate")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), plain)
+
+    def test_errors(self):
+        """ Unknown accounts and customers and invalid ranges are refused """
+
+        self.assertEqual(self.client.get('/accounts/42/statement/?since=2021-01-01T00:00:00Z').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get('/customers/42/statement/?since=2021-01-01T00:00:00Z').status_code, status.HTTP_404_NOT_FOUND)
+        uri = '/accounts/{}/statement/'.format(self.account.pk)
+        for query in ("", "?since=2021-02-01T00:00:00Z&until=2021-01-01T00:00:00Z", "?since=2021-01-01T00:00:00Z&stream=xml"):
+            self.assertEqual(self.client.get(uri + query).status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(uri + "?since=" + self.since(4))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {"since": ["Must be in the past"]})
+
+    def test_export_command(self):
+        """ export_statements writes a statement file per account, the same as the API's """
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        since, until = self.since(0), self.since(3)
+        call_command(
+            "export_statements", "--since", since, "--until", until, "--directory", directory.name, "--gzip",
+            "--workers", "0", stdout=StringIO()
+        )
+
+        self.assertEqual(len(os.listdir(directory.name)), 3)
+        with gzip.open(statement_path(directory.name, self.account.pk, compress=True)) as statement_file:
+            exported = statement_file.read()
+        response = self.client.get('/accounts/{}/statement/?since={}&until={}'.format(self.account.pk, since, until))
+        self.assertEqual(exported, b"".join(response.streaming_content))
+
+    def test_export_command_errors(self):
+        """ Unknown accounts and invalid ranges are refused """
+
+        with self.assertRaises(CommandError):
+            call_command("export_statements", "--accounts", "42", "--workers", "0", stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command("export_statements", "--since", "2021-02-01T00:00:00Z", "--until", "2021-01-01T00:00:00Z", stdout=StringIO())
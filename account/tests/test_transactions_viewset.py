@@ -280,3 +280,177 @@ class TestTransactionsViewSet(TestCase):
 
         reciever_bank_acc = BankAccount.objects.get(owner__pk=self.default_reciever.pk)
         self.assertEqual(reciever_bank_acc.balance.amount, Decimal('100.00'))
+
+    def test_same_account_transaction(self):
+        """ Transaction to the very same account is rejected """
+
+        request_data = {
+            "from_banking_account": self.default_sender_bank_account.pk,
+            "to_banking_account": self.default_sender_bank_account.pk,
+            "deposit_amount": 50.01
+        }
+        response = self.client.post('/transactions/make/', request_data)
+        response_json = response.json()
+
+        expected_response_json = {
+            "non_field_errors": [
+                "Sender and recipient accounts must be different"
+            ]
+        }
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response_json, expected_response_json)
+
+        sender_bank_acc = BankAccount.objects.get(owner__pk=self.default_sender.pk)
+        self.assertEqual(sender_bank_acc.balance.amount, Decimal('100.00'))
+
+    def test_batch_transactions_happy_path(self):
+        """ Batch of transactions is applied at once """
+
+        request_data = [
+            {
+                "from_banking_account": self.default_sender_bank_account.pk,
+                "to_banking_account": self.default_reciever_bank_account.pk,
+                "deposit_amount": 60.00
+            },
+            {
+                "from_banking_account": self.default_reciever_bank_account.pk,
+                "to_banking_account": self.default_sender_bank_account.pk,
+                "deposit_amount": 10.50
+            },
+            {
+                "from_banking_account": self.default_sender_bank_account.pk,
+                "to_banking_account": self.default_reciever_bank_account.pk,
+                "deposit_amount": 50.50
+            }
+        ]
+
+        response = self.client.post('/transactions/batch/', request_data, content_type='application/json')
+        response_json = response.json()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response_json["mode"], "atomic")
+        self.assertEqual(response_json["applied"], 3)
+        self.assertEqual(response_json["failed"], 0)
+        self.assertEqual([item["status"] for item in response_json["results"]], ["ok", "ok", "ok"])
+        self.assertEqual(response_json["results"][1]["transaction"]["amount"], "10.50")
+        self.assertEqual(Transaction.objects.count(), 3)
+
+        sender_bank_acc = BankAccount.objects.get(owner__pk=self.default_sender.pk)
+        self.assertEqual(sender_bank_acc.balance.amount, Decimal('0.00'))
+
+        reciever_bank_acc = BankAccount.objects.get(owner__pk=self.default_reciever.pk)
+        self.assertEqual(reciever_bank_acc.balance.amount, Decimal('200.00'))
+
+    def test_batch_transactions_atomic_failure(self):
+        """ Atomic batch with a failing item applies nothing """
+
+        request_data = [
+            {
+                "from_banking_account": self.default_sender_bank_account.pk,
+                "to_banking_account": self.default_reciever_bank_account.pk,
+                "deposit_amount": 60.00
+            },
+            {
+                "from_banking_account": self.default_sender_bank_account.pk,
+                "to_banking_account": self.default_reciever_bank_account.pk,
+                "deposit_amount": 60.00
+            },
+            {
+                "from_banking_account": self.default_sender_bank_account.pk,
+                "to_banking_account": 42,
+                "deposit_amount": 1.00
+            }
+        ]
+
+        response = self.client.post('/transactions/batch/', request_data, content_type='application/json')
+        response_json = response.json()
+        expected_response_json = {
+            "mode": "atomic",
+            "applied": 0,
+            "failed": 2,
+            "results": [
+                {"status": "skipped"},
+                {"status": "failed", "errors": {"non_field_errors": ["Insufficient funds"]}},
+                {"status": "failed", "errors": {"non_field_errors": ["Recipient with id 42 does not exist"]}}
+            ]
+        }
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response_json, expected_response_json)
+        self.assertEqual(Transaction.objects.count(), 0)
+
+        sender_bank_acc = BankAccount.objects.get(owner__pk=self.default_sender.pk)
+        self.assertEqual(sender_bank_acc.balance.amount, Decimal('100.00'))
+
+        reciever_bank_acc = BankAccount.objects.get(owner__pk=self.default_reciever.pk)
+        self.assertEqual(reciever_bank_acc.balance.amount, Decimal('100.00'))
+
+    def test_batch_transactions_best_effort(self):
+        """ Best-effort batch applies every valid item and reports the rest """
+
+        request_data = [
+            {
+                "from_banking_account": self.default_sender_bank_account.pk,
+                "to_banking_account": self.default_reciever_bank_account.pk,
+                "deposit_amount": 60.00
+            },
+            {
+                "from_banking_account": self.default_sender_bank_account.pk,
+                "to_banking_account": self.default_reciever_bank_account.pk,
+                "deposit_amount": -1
+            },
+            {
+                "from_banking_account": self.default_sender_bank_account.pk,
+                "to_banking_account": self.default_reciever_bank_account.pk,
+                "deposit_amount": 60.00
+            }
+        ]
+
+        response = self.client.post('/transactions/batch/?mode=best-effort', request_data, content_type='application/json')
+        response_json = response.json()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response_json["applied"], 1)
+        self.assertEqual(response_json["failed"], 2)
+        self.assertEqual([item["status"] for item in response_json["results"]], ["ok", "failed", "failed"])
+        self.assertEqual(response_json["results"][1]["errors"], {
+            "deposit_amount": ["Ensure this value is greater than or equal to 0."]
+        })
+        self.assertEqual(response_json["results"][2]["errors"], {"non_field_errors": ["Insufficient funds"]})
+        self.assertEqual(Transaction.objects.count(), 1)
+
+        sender_bank_acc = BankAccount.objects.get(owner__pk=self.default_sender.pk)
+        self.assertEqual(sender_bank_acc.balance.amount, Decimal('40.00'))
+
+        reciever_bank_acc = BankAccount.objects.get(owner__pk=self.default_reciever.pk)
+        self.assertEqual(reciever_bank_acc.balance.amount, Decimal('160.00'))
+
+    def test_batch_transactions_ndjson(self):
+        """ Batch can be streamed as newline delimited JSON """
+
+        request_body = "\n".join([
+            '{"from_banking_account": %s, "to_banking_account": %s, "deposit_amount": 1.25}' % (
+                self.default_sender_bank_account.pk, self.default_reciever_bank_account.pk
+            )
+        ] * 4) + "\n"
+
+        response = self.client.post('/transactions/batch/', request_body, content_type='application/x-ndjson')
+        response_json = response.json()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response_json["applied"], 4)
+
+        sender_bank_acc = BankAccount.objects.get(owner__pk=self.default_sender.pk)
+        self.assertEqual(sender_bank_acc.balance.amount, Decimal('95.00'))
+
+    def test_batch_transactions_invalid_body(self):
+        """ Batch must be a non-empty list and the mode must be known """
+
+        response = self.client.post('/transactions/batch/', [], content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {"transfers": ["This list may not be empty."]})
+
+        response = self.client.post('/transactions/batch/?mode=yolo', [{}], content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {"mode": ['"yolo" is not a valid choice.']})
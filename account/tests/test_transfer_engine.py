@@ -0,0 +1,124 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+
+from account.models import Customer, Transaction, BankAccount
+from account.transfers import make_transfer, make_batch_transfer, SameAccountError, SenderDoesNotExist,\
+    RecipientDoesNotExist, InsufficientFunds
+
+
+class TestTransferEngine(TestCase):
+    """ Tests for the transfer engine """
+
+    def setUp(self):
+        customer = Customer(name="Test Customer")
+        customer.save()
+
+        self.sender_bank_account = BankAccount(owner=customer, balance=100.00)
+        self.sender_bank_account.save()
+
+        self.reciever_bank_account = BankAccount(owner=customer, balance=100.00)
+        self.reciever_bank_account.save()
+
+    def assertBalances(self, sender_balance, reciever_balance):
+        self.sender_bank_account.refresh_from_db()
+        self.reciever_bank_account.refresh_from_db()
+        self.assertEqual(self.sender_bank_account.balance.amount, Decimal(sender_balance))
+        self.assertEqual(self.reciever_bank_account.balance.amount, Decimal(reciever_balance))
+
+    def test_transfer_happy_path(self):
+        """ Transfer moves money and records a transaction """
+
+        transaction = make_transfer(self.sender_bank_account.pk, self.reciever_bank_account.pk, Decimal("30.50"))
+
+        self.assertEqual(transaction.sender_account_id, self.sender_bank_account.pk)
+        self.assertEqual(transaction.recipient_account_id, self.reciever_bank_account.pk)
+        self.assertEqual(transaction.amount.amount, Decimal("30.50"))
+        self.assertBalances("69.50", "130.50")
+
+    def test_transfer_query_count(self):
+        """ Transfer costs a fixed number of statements """
+
+        # Row lock with balances, UPDATE, Transaction and outbox INSERTs, ledger entries are off by default.
+        # Without row locks (SQLite) a no-op UPDATE takes the database write lock before balances are read.
+        expected_queries = 4 if connection.features.has_select_for_update else 5
+        # atomic() adds savepoint statements inside the test case transaction
+        with self.assertNumQueries(expected_queries + 2):
+            make_transfer(self.sender_bank_account.pk, self.reciever_bank_account.pk, Decimal("1.00"))
+
+    def test_transfer_whole_balance(self):
+        """ It's possible to transfer exactly the current balance """
+
+        make_transfer(self.sender_bank_account.pk, self.reciever_bank_account.pk, Decimal("100.00"))
+        self.assertBalances("0.00", "200.00")
+
+    def test_insufficient_funds(self):
+        """ Insufficient funds leave both balances untouched """
+
+        with self.assertRaises(InsufficientFunds):
+            make_transfer(self.sender_bank_account.pk, self.reciever_bank_account.pk, Decimal("100.01"))
+
+        self.assertBalances("100.00", "100.00")
+        self.assertEqual(Transaction.objects.count(), 0)
+
+    def test_unexistent_accounts(self):
+        """ Missing sender or recipient is reported and nothing is changed """
+
+        with self.assertRaises(SenderDoesNotExist):
+            make_transfer(42, self.reciever_bank_account.pk, Decimal("1.00"))
+
+        with self.assertRaises(RecipientDoesNotExist):
+            make_transfer(self.sender_bank_account.pk, 42, Decimal("1.00"))
+
+        self.assertBalances("100.00", "100.00")
+        self.assertEqual(Transaction.objects.count(), 0)
+
+    def test_same_account(self):
+        """ Transfers to the very same account are rejected """
+
+        with self.assertRaises(SameAccountError):
+            make_transfer(self.sender_bank_account.pk, self.sender_bank_account.pk, Decimal("1.00"))
+
+        self.assertBalances("100.00", "100.00")
+
+    def test_batch_transfer_query_count(self):
+        """ Batch costs the same number of queries regardless of the number of transfers """
+
+        transfers = [(self.sender_bank_account.pk, self.reciever_bank_account.pk, Decimal("1.00"))] * 50
+        # Lock/fetch, netted UPDATE, Transaction and outbox bulk INSERTs plus the savepoint statements
+        expected_queries = 6 if connection.features.has_select_for_update else 7
+        if not connection.features.can_return_rows_from_bulk_insert:
+            expected_queries += len(transfers) - 1
+        with self.assertNumQueries(expected_queries):
+            results = make_batch_transfer(transfers)
+
+        self.assertTrue(all(isinstance(result, Transaction) for result in results))
+        self.assertBalances("50.00", "150.00")
+
+    def test_batch_transfer_uses_running_balances(self):
+        """ Funds received earlier in a batch can be spent later in the same batch """
+
+        results = make_batch_transfer([
+            (self.sender_bank_account.pk, self.reciever_bank_account.pk, Decimal("150.00")),
+            (self.reciever_bank_account.pk, self.sender_bank_account.pk, Decimal("100.00")),
+            (self.sender_bank_account.pk, self.reciever_bank_account.pk, Decimal("150.00")),
+        ], atomic=False)
+
+        self.assertIsInstance(results[0], InsufficientFunds)
+        self.assertIsInstance(results[1], Transaction)
+        self.assertIsInstance(results[2], Transaction)
+        self.assertBalances("50.00", "150.00")
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class TestTransferEngineConcurrency(TransactionTestCase):
+    """ Concurrency benchmark for the transfer engine, needs a database with row level locks """
+
+    def test_concurrent_transfers_conserve_balance(self):
+        """ Hammering the same hot accounts from many threads never creates or loses money """
+
+        from benchmarks import transfers
+
+        results = transfers.run(threads=8, transfers=50, accounts=3, min_tps=50.0)
+        self.assertEqual(results["succeeded"] + results["insufficient_funds"], results["attempted"])
@@ -0,0 +1,389 @@
+import random
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction as db_transaction
+from django.db.models import Case, DecimalField, F, Q, When
+
+from account.cache import invalidate_accounts
+from account.exchange import ExchangeRateUnavailable, convert_many
+from account.ledger import write_ledger_entries
+from account.models import BalanceShard, BankAccount, Transaction
+from account.outbox import write_transaction_events
+from account.shards import shard_count
+
+
+class TransferError(Exception):
+    """ Base class for errors raised by the transfer engine """
+
+
+class SameAccountError(TransferError):
+    """ Sender and recipient are the same banking account """
+
+    def __init__(self, account_id):
+        super().__init__("Sender and recipient accounts must be different")
+        self.account_id = account_id
+
+
+class SenderDoesNotExist(TransferError):
+    """ Sender banking account does not exist """
+
+    def __init__(self, account_id):
+        super().__init__("Sender with id %s does not exist" % account_id)
+        self.account_id = account_id
+
+
+class RecipientDoesNotExist(TransferError):
+    """ Recipient banking account does not exist """
+
+    def __init__(self, account_id):
+        super().__init__("Recipient with id %s does not exist" % account_id)
+        self.account_id = account_id
+
+
+class InsufficientFunds(TransferError):
+    """ Sender balance does not cover the transfer amount """
+
+    def __init__(self, account_id):
+        super().__init__("Insufficient funds")
+        self.account_id = account_id
+
+
+class CurrencyNotConvertible(TransferError):
+    """ No exchange rate is loaded between the currencies of the sender and recipient accounts """
+
+    def __init__(self, source, target):
+        super().__init__("No exchange rate from %s to %s" % (source, target))
+        self.source = source
+        self.target = target
+
+
+# Keeps IN lists and CASE expressions below the bound parameter limit of every supported backend
+CHUNK_SIZE = 150
+
+BALANCE_FIELD = DecimalField(max_digits=19, decimal_places=2)
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _lock_balances(account_ids):
+    """ Locks banking account rows in ascending id order and returns their current (balance, currency) """
+
+    account_ids = sorted(account_ids)
+    queryset = BankAccount.objects.order_by("pk")
+    if connection.features.has_select_for_update:
+        queryset = queryset.select_for_update()
+    elif account_ids:
+        # No row locks (SQLite): a no-op write takes the database write lock before balances are read
+        BankAccount.objects.filter(pk=account_ids[0]).update(balance=F("balance"))
+
+    balances = {}
+    for chunk in _chunks(account_ids):
+        balances.update(
+            (pk, (balance, currency)) for pk, balance, currency in
+            queryset.filter(pk__in=chunk).values_list("pk", "balance", "balance_currency")
+        )
+    return balances
+
+
+def _shards_condition(shards):
+    condition = Q(pk__in=[])
+    for account_id, numbers in shards.items():
+        condition |= Q(account_id=account_id) if numbers is None else Q(account_id=account_id, shard__in=numbers)
+    return condition
+
+
+def _existing_shards(shards):
+    """
+    Returns the shards, given as {account_id: shard numbers, None for all of them}, of the accounts which
+    have at least one of them. Read without locks: shard rows are never deleted, see sync_balance_shards.
+    """
+
+    if not shards:
+        return {}
+    existing = set(
+        BalanceShard.objects.filter(_shards_condition(shards)).order_by()
+        .values_list("account_id", flat=True).distinct()
+    )
+    return {account_id: numbers for account_id, numbers in shards.items() if account_id in existing}
+
+
+def _lock_shards(shards):
+    """
+    Locks balance shards, given as {account_id: shard numbers, None for all of them}, in ascending
+    (account, shard) order and returns {(account_id, shard): (shard id, balance, currency)}
+    """
+
+    queryset = BalanceShard.objects.order_by("account_id", "shard")
+    if connection.features.has_select_for_update:
+        queryset = queryset.select_for_update()
+
+    queryset = queryset.filter(_shards_condition(shards))
+    return {
+        (account_id, shard): (pk, balance, currency) for pk, account_id, shard, balance, currency in
+        queryset.values_list("pk", "account_id", "shard", "balance", "balance_currency")
+    }
+
+
+def _lock_rows(debited, credited):
+    """
+    Locks the rows holding the balances of transfers from ``debited`` to ``credited`` accounts.
+
+    Returns the balances as {account_id: {shard: balance}}, shard being None for the banking account
+    row itself, the ids of the locked shards as {(account_id, shard): id} and the currencies of the
+    accounts as {account_id: currency}. Debited accounts lock
+    their row and all their shards, so their funds are known. Sharded accounts which are only credited
+    lock one of their shards chosen at random instead of their row, so concurrent transfers to a hot
+    account don't wait for each other. Shards which don't exist yet, sync_balance_shards creates them,
+    fall back to the banking account row. Banking account rows are locked before shard rows on every
+    path, both in ascending order.
+    """
+
+    debited = set(debited)
+    shards = {account_id: None for account_id in debited if shard_count(account_id)}
+    for account_id in set(credited) - debited:
+        if shard_count(account_id):
+            shards[account_id] = [random.randrange(shard_count(account_id))]
+    shards = _existing_shards(shards)
+
+    rows, currencies = {}, {}
+    for account_id, (balance, currency) in _lock_balances(debited | (set(credited) - set(shards))).items():
+        rows[account_id] = {None: balance}
+        currencies[account_id] = currency
+
+    shard_ids = {}
+    if shards:
+        for (account_id, shard), (pk, balance, currency) in _lock_shards(shards).items():
+            rows.setdefault(account_id, {})[shard] = balance
+            shard_ids[account_id, shard] = pk
+            currencies[account_id] = currency
+    return rows, shard_ids, currencies
+
+
+def _check_transfer(rows, sender_id, recipient_id, amount):
+    """ Returns the error preventing a transfer given the locked balances, None if it can be made """
+
+    if sender_id == recipient_id:
+        return SameAccountError(sender_id)
+    if sender_id not in rows:
+        return SenderDoesNotExist(sender_id)
+    if recipient_id not in rows:
+        return RecipientDoesNotExist(recipient_id)
+    if sum(rows[sender_id].values()) < amount:
+        return InsufficientFunds(sender_id)
+    return None
+
+
+def _credits(transfers, currencies):
+    """
+    Returns the amounts (sender_id, recipient_id, amount) transfers credit in the currency of the
+    recipient, or the CurrencyNotConvertible error of transfers between currencies without a rate.
+
+    Transfers are converted per currency pair with a single rate lookup each, see ``account.exchange``,
+    transfers within a currency and transfers involving missing accounts are left as they are.
+    """
+
+    credits = [amount for _, _, amount in transfers]
+    pairs = defaultdict(list)
+    for index, (sender_id, recipient_id, _) in enumerate(transfers):
+        source, target = currencies.get(sender_id), currencies.get(recipient_id)
+        if source is not None and target is not None and source != target:
+            pairs[source, target].append(index)
+
+    for (source, target), indexes in pairs.items():
+        try:
+            converted = convert_many([credits[index] for index in indexes], source, target)
+        except ExchangeRateUnavailable:
+            converted = [CurrencyNotConvertible(source, target)] * len(indexes)
+        for index, credit in zip(indexes, converted):
+            credits[index] = credit
+    return credits
+
+
+def _transaction(sender_id, recipient_id, amount, credit, currencies):
+    """ Builds the Transaction of a transfer, the credit is recorded when it's made in another currency """
+
+    source, target = currencies[sender_id], currencies[recipient_id]
+    if source == target:
+        credit = target = None
+    return Transaction(
+        sender_account_id=sender_id,
+        recipient_account_id=recipient_id,
+        amount=amount,
+        amount_currency=source,
+        credit=credit,
+        credit_currency=target
+    )
+
+
+def _move(rows, sender_id, recipient_id, amount, credit=None):
+    """
+    Changes the locked balances by a transfer and returns its (account_id, shard, amount, balance)
+    movements, ``balance`` being the running balance of the row moved.
+
+    The debit is drawn from the rows of the sender in order, its banking account row first, the credit
+    lands on the banking account row of the recipient or on its locked shard. ``credit`` is the amount
+    credited in the currency of the recipient, ``amount`` when it's the same as the sender's.
+    """
+
+    if credit is None:
+        credit = amount
+
+    movements = []
+    sender_rows = rows[sender_id]
+    remaining = amount
+    for shard, balance in sender_rows.items():
+        taken = min(balance, remaining)
+        if taken:
+            sender_rows[shard] -= taken
+            remaining -= taken
+            movements.append((sender_id, shard, -taken, sender_rows[shard]))
+        if not remaining:
+            break
+    if not movements:
+        # Zero amount transfers get their debit entry as well
+        shard = next(iter(sender_rows))
+        movements.append((sender_id, shard, -amount, sender_rows[shard]))
+
+    recipient_rows = rows[recipient_id]
+    shard = None if None in recipient_rows else next(iter(recipient_rows))
+    recipient_rows[shard] += credit
+    movements.append((recipient_id, shard, credit, recipient_rows[shard]))
+    return movements
+
+
+def _apply_deltas(deltas, model=BankAccount):
+    """
+    Applies netted balance changes of banking accounts, or of balance shards, with one conditional
+    CASE UPDATE per chunk of rows.
+
+    Debited rows are only updated while they still cover the debit, so the UPDATE can never overdraw
+    a balance even if it changed behind the engine's back.
+    """
+
+    changed = sorted(pk for pk, delta in deltas.items() if delta)
+    for chunk in _chunks(changed):
+        condition = Q(pk__in=[pk for pk in chunk if deltas[pk] > 0])
+        for pk in chunk:
+            if deltas[pk] < 0:
+                condition |= Q(pk=pk, balance__gte=-deltas[pk])
+
+        updated = model.objects.filter(condition).update(balance=Case(
+            *[When(pk=pk, then=F("balance") + deltas[pk]) for pk in chunk],
+            output_field=BALANCE_FIELD
+        ))
+        if updated != len(chunk):
+            raise TransferError("Unable to make a transaction")
+
+
+def _apply_movements(movements, shard_ids):
+    """ Nets movements per banking account row and per shard and applies them """
+
+    deltas = defaultdict(Decimal)
+    shard_deltas = defaultdict(Decimal)
+    for account_id, shard, amount, _ in movements:
+        if shard is None:
+            deltas[account_id] += amount
+        else:
+            shard_deltas[shard_ids[account_id, shard]] += amount
+
+    _apply_deltas(deltas)
+    _apply_deltas(shard_deltas, BalanceShard)
+    invalidate_accounts({account_id for account_id, _, _, _ in movements})
+
+
+def make_transfer(sender_id, recipient_id, amount):
+    """
+    Moves ``amount`` from the sender to the recipient banking account and records a Transaction.
+
+    The rows holding both balances are locked, see ``_lock_rows``, funds are checked against the
+    locked balances, balances are changed by conditional UPDATEs, and the Transaction with its ledger
+    entries and its outbox event is written in the same database transaction. ``amount`` is in the currency
+    of the sender, the recipient is credited its conversion when its account is held in another currency.
+    """
+
+    if sender_id == recipient_id:
+        raise SameAccountError(sender_id)
+
+    with db_transaction.atomic():
+        rows, shard_ids, currencies = _lock_rows([sender_id], [recipient_id])
+        error = _check_transfer(rows, sender_id, recipient_id, amount)
+        if error is not None:
+            raise error
+        credit, = _credits([(sender_id, recipient_id, amount)], currencies)
+        if isinstance(credit, TransferError):
+            raise credit
+
+        movements = _move(rows, sender_id, recipient_id, amount, credit)
+        _apply_movements(movements, shard_ids)
+        transaction = _transaction(sender_id, recipient_id, amount, credit, currencies)
+        transaction.save()
+        write_ledger_entries([(transaction, movements)], currencies)
+        write_transaction_events([transaction])
+
+    return transaction
+
+
+def make_batch_transfer(transfers, atomic=True):
+    """
+    Applies many transfers at once, given as (sender_id, recipient_id, amount) tuples.
+
+    The rows holding the balances are fetched and locked with chunked ``id__in`` queries, transfers are
+    checked in order against running balances, balance changes are netted per row and applied with bulk
+    UPDATEs, and Transaction rows, their ledger entries and outbox events are written with
+    ``bulk_create``. Transfers between currencies are converted up front per currency pair, see
+    ``_credits``. Returns a list aligned with ``transfers`` holding the created Transaction or the
+    TransferError for every item. When ``atomic`` is set, a single failure means nothing is applied and
+    successful items are returned as None.
+    """
+
+    transfers = list(transfers)
+    results = [None] * len(transfers)
+
+    with db_transaction.atomic():
+        rows, shard_ids, currencies = _lock_rows(
+            [sender_id for sender_id, _, _ in transfers], [recipient_id for _, recipient_id, _ in transfers]
+        )
+        credits = _credits(transfers, currencies)
+        accepted = []
+        movements = []
+
+        for index, (sender_id, recipient_id, amount) in enumerate(transfers):
+            error = _check_transfer(rows, sender_id, recipient_id, amount)
+            if error is None and isinstance(credits[index], TransferError):
+                error = credits[index]
+            if error is not None:
+                results[index] = error
+                continue
+
+            accepted.append(index)
+            movements.append(_move(rows, sender_id, recipient_id, amount, credits[index]))
+
+        if atomic and len(accepted) != len(transfers):
+            return results
+
+        _apply_movements([movement for moves in movements for movement in moves], shard_ids)
+        created = _create_transactions([
+            _transaction(transfers[index][0], transfers[index][1], transfers[index][2], credits[index], currencies)
+            for index in accepted
+        ])
+        for index, transaction in zip(accepted, created):
+            results[index] = transaction
+        write_ledger_entries(list(zip(created, movements)), currencies)
+        write_transaction_events(created)
+
+    return results
+
+
+def _create_transactions(transactions):
+    """ Inserts transactions in bulk where the backend returns primary keys from bulk inserts """
+
+    if connection.features.can_return_rows_from_bulk_insert:
+        return Transaction.objects.bulk_create(transactions, batch_size=CHUNK_SIZE)
+
+    for transaction in transactions:
+        transaction.save()
+    return transactions
@@ -1,30 +1,60 @@
-from django.db.models import Q
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.http import HttpResponse
 
 from rest_framework import status
 from rest_framework.viewsets import ViewSet
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.exceptions import APIException
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer, BrowsableAPIRenderer
+from rest_framework.utils.urls import replace_query_param
 
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 
-from account.models import BankAccount, Transaction, Customer
+from account.archive import archived_history_response
+from account.cache import cached_account, cached_customer_accounts
+from account.encoders import fast_serialization
+from account.events import EventStreamRenderer
+from account.exchange import ExchangeRateUnavailable
+from account.history import account_history, encode_cursor, encode_position
+from account.idempotency import IDEMPOTENCY_HEADER, idempotent
+from account.metrics import serialization
+from account.models import BankAccount, Customer
+from account.parsers import NDJSONParser
 from account.serializers import CreateCustomerSerializer, CustomerResponseSerializer, BankingAccountSerializer,\
-    TransactionHistoryResponseSerializer, NewTransactionSerializer, BankingAccountResponseSerializer
+    TransactionHistoryResponseSerializer, NewTransactionSerializer, BankingAccountResponseSerializer,\
+    BatchTransactionSerializer, HistoryQuerySerializer, SummaryQuerySerializer, BulkSummarySerializer,\
+    CustomerSummaryResponseSerializer, BulkSummaryResponseSerializer, BulkOnboardingSerializer,\
+    BalanceAtQuerySerializer, BalanceAtResponseSerializer, EventsQuerySerializer, StatementQuerySerializer,\
+    TRANSACTION_HISTORY_ENCODER
+from account.shards import total_balance, with_total_balance
+from account.snapshots import balance_at
+from account.statements import account_statement, customer_statement, statement_response
+from account.streaming import streaming_response
+from account.summary import customer_summaries
+
+IDEMPOTENCY_KEY_PARAMETER = OpenApiParameter(
+    IDEMPOTENCY_HEADER, str, OpenApiParameter.HEADER,
+    description="Repeating a request with the same key returns the stored response instead of executing it again"
+)
 
 
 class BankingAccountsViewSet(ViewSet):
 
     """ API for getting account details """
 
+    @staticmethod
+    def _load_account(pk):
+        return dict(BankingAccountResponseSerializer(total_balance(with_total_balance(BankAccount.objects).get(id=pk))).data)
+
     @extend_schema(responses={status.HTTP_200_OK:BankingAccountResponseSerializer})
     @action(methods=["GET"], detail=True, url_path="get-balance")
     def get_balance(self, request, pk):
         try:
-            account = BankAccount.objects.get(id=pk)
-            serializer = BankingAccountResponseSerializer(account)
-            return Response(serializer.data)
+            return Response(cached_account(pk, self._load_account))
         except ObjectDoesNotExist:
             return Response({"detail": "Banking account with id %s does not exist" % pk}, status=status.HTTP_404_NOT_FOUND)
         except APIException as e:
@@ -32,18 +62,137 @@ class BankingAccountsViewSet(ViewSet):
         except Exception as e:
             raise APIException(e)
 
-    @extend_schema(responses={status.HTTP_200_OK:TransactionHistoryResponseSerializer})
+    @extend_schema(
+        parameters=[HistoryQuerySerializer],
+        responses={status.HTTP_200_OK:TransactionHistoryResponseSerializer(many=True)}
+    )
     @action(methods=["GET"], detail=True, url_path="get-history")
     def get_history(self, request, pk):
         try:
-            transactions = Transaction.objects.filter(Q(sender_account__pk=pk) | Q(recipient_account__pk=pk))
-            history = TransactionHistoryResponseSerializer(transactions, many=True)
-            return Response(history.data)
+            query = HistoryQuerySerializer(data=request.query_params)
+            if not query.is_valid():
+                return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            params = query.validated_data
+            if params["archived"]:
+                return archived_history_response(request, pk, params)
+
+            paginate = "stream" not in params and ("limit" in params or "cursor" in params)
+            limit = params.get("limit", settings.HISTORY_PAGE_SIZE)
+            transactions = account_history(
+                pk,
+                since=params.get("since"),
+                until=params.get("until"),
+                direction=params["direction"],
+                after=params.get("cursor"),
+                # One extra row tells whether there is a next page
+                limit=limit + 1 if paginate else None
+            )
+
+            if fast_serialization(request):
+                return self._encoded_history(request, transactions, params, paginate, limit)
+
+            if "stream" in params:
+                return streaming_response(transactions, TransactionHistoryResponseSerializer(), params["stream"])
+
+            if not paginate:
+                history = TransactionHistoryResponseSerializer(transactions, many=True)
+                return Response(history.data)
+
+            page = list(transactions[:limit + 1])
+            next_url = None
+            if len(page) > limit:
+                page = page[:limit]
+                next_url = replace_query_param(request.build_absolute_uri(), "cursor", encode_cursor(page[-1]))
+
+            history = TransactionHistoryResponseSerializer(page, many=True)
+            return Response({"next": next_url, "results": history.data})
+        except APIException as e:
+            raise e
+        except Exception as e:
+            raise APIException(e)
+
+    @extend_schema(parameters=[BalanceAtQuerySerializer], responses={status.HTTP_200_OK:BalanceAtResponseSerializer})
+    @action(methods=["GET"], detail=True, url_path="balance-at")
+    def get_balance_at(self, request, pk):
+        try:
+            query = BalanceAtQuerySerializer(data=request.query_params)
+            if not query.is_valid():
+                return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            ts = query.validated_data["ts"]
+            balance, snapshot = balance_at(pk, ts)
+            return Response(BalanceAtResponseSerializer({
+                "id": pk, "balance_currency": str(balance.currency), "balance": balance.amount, "ts": ts, "snapshot": snapshot
+            }).data)
+        except ObjectDoesNotExist:
+            return Response({"detail": "Banking account with id %s does not exist" % pk}, status=status.HTTP_404_NOT_FOUND)
+        except APIException as e:
+            raise e
+        except Exception as e:
+            raise APIException(e)
+
+    @extend_schema(
+        parameters=[StatementQuerySerializer],
+        responses={(status.HTTP_200_OK, "text/csv"): OpenApiTypes.STR, (status.HTTP_200_OK, "application/x-ndjson"): OpenApiTypes.STR}
+    )
+    @action(methods=["GET"], detail=True, url_path="statement")
+    def get_statement(self, request, pk):
+        try:
+            query = StatementQuerySerializer(data=request.query_params)
+            if not query.is_valid():
+                return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            params = query.validated_data
+            rows = account_statement(pk, params["since"], params.get("until"))
+            return statement_response(request, rows, "statement-account-%s" % pk, params["stream"], params["gzip"])
+        except ObjectDoesNotExist:
+            return Response({"detail": "Banking account with id %s does not exist" % pk}, status=status.HTTP_404_NOT_FOUND)
         except APIException as e:
             raise e
         except Exception as e:
             raise APIException(e)
 
+    @extend_schema(
+        parameters=[EventsQuerySerializer, OpenApiParameter("Last-Event-ID", int, OpenApiParameter.HEADER)],
+        responses={(status.HTTP_200_OK, "text/event-stream"): OpenApiTypes.STR}
+    )
+    @action(
+        methods=["GET"], detail=True, url_path="events",
+        renderer_classes=[JSONRenderer, BrowsableAPIRenderer, EventStreamRenderer]
+    )
+    def get_events(self, request, pk):
+        # A stream would hold a sync worker for its whole duration, the async view serves them on the event loop
+        return Response(
+            {"detail": "Event streams are served with ASYNC_READ_ENDPOINTS enabled"},
+            status=status.HTTP_501_NOT_IMPLEMENTED
+        )
+
+    @staticmethod
+    def _encoded_history(request, transactions, params, paginate, limit):
+        """ get_history with rows encoded by TRANSACTION_HISTORY_ENCODER, the responses are the same """
+
+        encoder = TRANSACTION_HISTORY_ENCODER
+        if "stream" in params:
+            return streaming_response(transactions, encoder, params["stream"])
+
+        if not paginate:
+            rows = list(encoder.rows(transactions))
+            with serialization():
+                return HttpResponse(encoder.encode_many(rows), content_type="application/json")
+
+        page = list(encoder.rows(transactions)[:limit + 1])
+        next_url = None
+        if len(page) > limit:
+            page = page[:limit]
+            last = page[-1]
+            cursor = encode_position(last[encoder.column("date")], last[encoder.column("id")])
+            next_url = replace_query_param(request.build_absolute_uri(), "cursor", cursor)
+
+        with serialization():
+            content = encoder.encode_page(page, next_url)
+        return HttpResponse(content, content_type="application/json")
+
 
 class CustomersViewSet(ViewSet):
 
@@ -51,9 +200,11 @@ class CustomersViewSet(ViewSet):
     
     @extend_schema(
         request=CreateCustomerSerializer,
-        responses={status.HTTP_200_OK:CustomerResponseSerializer}
+        responses={status.HTTP_200_OK:CustomerResponseSerializer},
+        parameters=[IDEMPOTENCY_KEY_PARAMETER]
     )
     @action(methods=["POST"], detail=False, url_path="create-customer-account")
+    @idempotent("customers-create-customer-account")
     def create_customer_account(self, request):
         try:
             serializer = CreateCustomerSerializer(data=request.data)
@@ -68,6 +219,31 @@ class CustomersViewSet(ViewSet):
         except Exception as e:
             raise APIException(e)
 
+    @extend_schema(
+        request=CreateCustomerSerializer(many=True),
+        responses={status.HTTP_200_OK:BulkOnboardingSerializer},
+        parameters=[OpenApiParameter("mode", str, enum=[BulkOnboardingSerializer.ATOMIC, BulkOnboardingSerializer.BEST_EFFORT])]
+    )
+    @action(methods=["POST"], detail=False, url_path="onboard", parser_classes=[JSONParser, NDJSONParser])
+    def onboard_customers(self, request):
+        try:
+            serializer = BulkOnboardingSerializer(data={
+                "mode": request.query_params.get("mode", BulkOnboardingSerializer.ATOMIC),
+                "customers": request.data
+            })
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            serializer.save()
+            response_data = serializer.data
+            if response_data["mode"] == BulkOnboardingSerializer.ATOMIC and response_data["failed"]:
+                return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+            return Response(response_data)
+        except APIException as e:
+            raise e
+        except Exception as e:
+            raise APIException(e)
+
     @extend_schema(
         request=BankingAccountSerializer,
         responses={status.HTTP_200_OK:BankingAccountResponseSerializer}
@@ -87,17 +263,25 @@ class CustomersViewSet(ViewSet):
         except Exception as e:
             raise APIException(e)
 
-    @extend_schema(responses={status.HTTP_200_OK:BankingAccountResponseSerializer})
-    @action(methods=["GET"], detail=True, url_path="accounts-balances")
-    def get_balances(self, request, pk=None):
+    @staticmethod
+    def _load_customer_accounts(pk):
         # NOTE: BankAccount.objects.filter(owner__pk=pk) would make querying of a customer 
         #       to be unnecessary step, though trying to be verbose on a purpose to return
         #       a corresponding API error.
+        owner = Customer.objects.get(pk=pk)
+        accounts = [total_balance(account) for account in with_total_balance(BankAccount.objects.filter(owner=owner))]
+        return [dict(account) for account in BankingAccountResponseSerializer(accounts, many=True).data]
+
+    @staticmethod
+    def _load_accounts(account_ids):
+        accounts = [total_balance(account) for account in with_total_balance(BankAccount.objects.filter(pk__in=account_ids))]
+        return [dict(account) for account in BankingAccountResponseSerializer(accounts, many=True).data]
+
+    @extend_schema(responses={status.HTTP_200_OK:BankingAccountResponseSerializer(many=True)})
+    @action(methods=["GET"], detail=True, url_path="accounts-balances")
+    def get_balances(self, request, pk=None):
         try:
-            owner = Customer.objects.get(pk=pk)
-            accounts = BankAccount.objects.filter(owner=owner)
-            balances = BankingAccountResponseSerializer(accounts, many=True)
-            return Response(balances.data)
+            return Response(cached_customer_accounts(pk, self._load_customer_accounts, self._load_accounts))
         except ObjectDoesNotExist:
             return Response({"detail": "Account with id %s does not exist" % pk}, status=status.HTTP_404_NOT_FOUND)
         except APIException as e:
@@ -105,6 +289,73 @@ class CustomersViewSet(ViewSet):
         except Exception as e:
             raise APIException(e)
 
+    @extend_schema(
+        parameters=[SummaryQuerySerializer],
+        responses={status.HTTP_200_OK:CustomerSummaryResponseSerializer}
+    )
+    @action(methods=["GET"], detail=True, url_path="summary")
+    def get_summary(self, request, pk=None):
+        try:
+            query = SummaryQuerySerializer(data=request.query_params)
+            if not query.is_valid():
+                return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            summaries = customer_summaries([pk], **query.validated_data)
+            if not summaries:
+                return Response({"detail": "Customer with id %s does not exist" % pk}, status=status.HTTP_404_NOT_FOUND)
+            return Response(CustomerSummaryResponseSerializer(summaries[0]).data)
+        except ExchangeRateUnavailable as e:
+            return Response({"detail": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except APIException as e:
+            raise e
+        except Exception as e:
+            raise APIException(e)
+
+    @extend_schema(
+        parameters=[StatementQuerySerializer],
+        responses={(status.HTTP_200_OK, "text/csv"): OpenApiTypes.STR, (status.HTTP_200_OK, "application/x-ndjson"): OpenApiTypes.STR}
+    )
+    @action(methods=["GET"], detail=True, url_path="statement")
+    def get_statement(self, request, pk=None):
+        try:
+            query = StatementQuerySerializer(data=request.query_params)
+            if not query.is_valid():
+                return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            params = query.validated_data
+            rows = customer_statement(pk, params["since"], params.get("until"))
+            return statement_response(request, rows, "statement-customer-%s" % pk, params["stream"], params["gzip"])
+        except ObjectDoesNotExist:
+            return Response({"detail": "Customer with id %s does not exist" % pk}, status=status.HTTP_404_NOT_FOUND)
+        except APIException as e:
+            raise e
+        except Exception as e:
+            raise APIException(e)
+
+    @extend_schema(
+        request=BulkSummarySerializer,
+        responses={status.HTTP_200_OK:BulkSummaryResponseSerializer}
+    )
+    @action(methods=["POST"], detail=False, url_path="summaries")
+    def get_summaries(self, request):
+        try:
+            serializer = BulkSummarySerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            params = dict(serializer.validated_data)
+            customer_ids = params.pop("customer_ids")
+            summaries = customer_summaries(customer_ids, **params)
+            found = {summary["id"] for summary in summaries}
+            missing = sorted(set(customer_ids) - found)
+            return Response(BulkSummaryResponseSerializer({"results": summaries, "missing": missing}).data)
+        except ExchangeRateUnavailable as e:
+            return Response({"detail": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except APIException as e:
+            raise e
+        except Exception as e:
+            raise APIException(e)
+
 
 class TransactionsViewSet(ViewSet):
 
@@ -112,9 +363,11 @@ class TransactionsViewSet(ViewSet):
     
     @extend_schema(
         request=NewTransactionSerializer,
-        responses={status.HTTP_200_OK:TransactionHistoryResponseSerializer}
+        responses={status.HTTP_200_OK:TransactionHistoryResponseSerializer},
+        parameters=[IDEMPOTENCY_KEY_PARAMETER]
     )
     @action(methods=["POST"], detail=False, url_path="make")
+    @idempotent("transactions-make")
     def make_transaction(self, request):
         try:
             serializer = NewTransactionSerializer(data=request.data)
@@ -128,3 +381,28 @@ class TransactionsViewSet(ViewSet):
             raise e
         except Exception as e:
             raise APIException(e)
+
+    @extend_schema(
+        request=NewTransactionSerializer(many=True),
+        responses={status.HTTP_200_OK:BatchTransactionSerializer},
+        parameters=[OpenApiParameter("mode", str, enum=[BatchTransactionSerializer.ATOMIC, BatchTransactionSerializer.BEST_EFFORT])]
+    )
+    @action(methods=["POST"], detail=False, url_path="batch", parser_classes=[JSONParser, NDJSONParser])
+    def batch_transactions(self, request):
+        try:
+            serializer = BatchTransactionSerializer(data={
+                "mode": request.query_params.get("mode", BatchTransactionSerializer.ATOMIC),
+                "transfers": request.data
+            })
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            serializer.save()
+            response_data = serializer.data
+            if response_data["mode"] == BatchTransactionSerializer.ATOMIC and response_data["failed"]:
+                return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+            return Response(response_data)
+        except APIException as e:
+            raise e
+        except Exception as e:
+            raise APIException(e)
@@ -0,0 +1,113 @@
+"""
+Performance benchmarks for the mock banking API.
+
+Every benchmark module exposes ``run(**options)`` returning a dict of results and can be executed
+directly, e.g. ``python -m benchmarks.transfers``, or through ``python manage.py benchmark transfers``.
+Benchmarks never touch the configured database, they run against a throwaway test database created
+for the duration of the run.
+"""
+
+import inspect
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+def setup_django():
+    """ Configures Django when a benchmark module is executed as a script """
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mock_api.settings")
+
+    import django
+    django.setup()
+
+
+@contextmanager
+def bench_database(verbosity=0):
+    """ Creates a throwaway database for a benchmark run and destroys it afterwards """
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    tmp_dir = None
+    if connection.vendor == "sqlite":
+        # In-memory SQLite databases can't be shared between worker threads, use a file instead
+        tmp_dir = tempfile.TemporaryDirectory()
+        connection.settings_dict.setdefault("TEST", {})["NAME"] = os.path.join(tmp_dir.name, "bench.sqlite3")
+
+    # Allows the in-process test client to reach the API
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        from account.request_log import writer
+
+        # Buffered API request logs go to the throwaway database as well
+        writer.close()
+        connection.creation.destroy_test_db(old_name, verbosity)
+        teardown_test_environment()
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+
+def percentile(samples, pct):
+    """ Returns the pct-th percentile of samples (nearest-rank) """
+
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(int(round(pct / 100.0 * len(ordered))) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class Timer:
+    """ Context manager measuring wall-clock time in seconds """
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.started
+
+
+def parse_options(run, args):
+    """ Parses ``key=value`` arguments, converting values to the types of the defaults of ``run`` """
+
+    defaults = {
+        name: param.default for name, param in inspect.signature(run).parameters.items()
+        if param.default is not param.empty
+    }
+    options = {}
+    for arg in args:
+        key, _, value = arg.partition("=")
+        default = defaults.get(key)
+        if default is None:
+            options[key] = value
+        elif isinstance(default, bool):
+            options[key] = value.lower() in ("1", "true", "yes")
+        else:
+            options[key] = type(default)(value)
+    return options
+
+
+def execute(run, options):
+    """ Runs a benchmark against a throwaway database and returns its results """
+
+    with bench_database():
+        return run(**options)
+
+
+def main(run, argv=None):
+    """ Entry point used by benchmark modules: parses ``key=value`` options, runs and prints JSON """
+
+    setup_django()
+
+    results = execute(run, parse_options(run, sys.argv[1:] if argv is None else argv))
+    print(json.dumps(results, indent=2, default=str))
+    return results
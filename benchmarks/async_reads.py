@@ -0,0 +1,157 @@
+"""
+Sync vs. async read endpoints under load with a deliberately slow database.
+
+Seeds a throwaway database, then serves it twice with ``conf/gunicorn.conf.py``: once with sync
+workers and once with ``ASYNC_READ_ENDPOINTS=1`` (uvicorn workers, async views), both on top of the
+``benchmarks.slowdb`` backend adding ``latency_ms`` to every statement. ``concurrency`` client threads
+hit every read route and throughput plus p50/p95/p99 latency are reported per server mode and route.
+"""
+
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from benchmarks import Timer, main, percentile
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+MODES = {
+    "sync": "0",
+    "async": "1",
+}
+
+
+def _seed(customers, accounts_per_customer, transactions, balance, seed):
+    from account.models import BankAccount, Customer, Transaction
+
+    Customer.objects.bulk_create([Customer(name="bench-async-reads-%s" % i) for i in range(customers)])
+    customer_ids = list(Customer.objects.filter(name__startswith="bench-async-reads-").values_list("pk", flat=True))
+    BankAccount.objects.bulk_create([
+        BankAccount(owner_id=customer_id, balance=balance)
+        for customer_id in customer_ids for _ in range(accounts_per_customer)
+    ])
+    account_ids = list(BankAccount.objects.filter(owner_id__in=customer_ids).values_list("pk", flat=True))
+
+    rnd = random.Random(seed)
+    Transaction.objects.bulk_create([
+        Transaction(sender_account_id=sender_id, recipient_account_id=recipient_id, amount=1)
+        for sender_id, recipient_id in (rnd.sample(account_ids, 2) for _ in range(transactions))
+    ], batch_size=1000)
+    return customer_ids, account_ids
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get(url):
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            response.read()
+            ok = response.status == 200
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def _start_server(mode, port, workers, latency_ms):
+    from django.db import connection
+
+    env = dict(
+        os.environ,
+        ASYNC_READ_ENDPOINTS=MODES[mode],
+        SQL_ENGINE="benchmarks.slowdb",
+        SLOW_DB_ENGINE=connection.settings_dict["ENGINE"],
+        SLOW_DB_LATENCY_MS=str(latency_ms),
+        SQL_DATABASE=str(connection.settings_dict["NAME"]),
+        DJANGO_ALLOWED_HOSTS="127.0.0.1",
+        GUNICORN_WORKERS=str(workers),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "conf/gunicorn.conf.py", "--bind", "127.0.0.1:%s" % port],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen("http://127.0.0.1:%s/api/schema/" % port, timeout=5).read()
+            return server
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("%s server did not start" % mode)
+
+
+def _load(urls, concurrency):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def fetch(url):
+        elapsed, ok = _get(url)
+        with lock:
+            (latencies if ok else errors).append(elapsed)
+
+    with Timer() as timer, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(fetch, urls))
+
+    return {
+        "requests_per_s": round(len(urls) / timer.elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "errors": len(errors),
+    }
+
+
+def run(requests=500, concurrency=50, workers=2, latency_ms=50, customers=50, accounts_per_customer=2,
+        transactions=5000, balance=100, seed=42):
+    customer_ids, account_ids = _seed(customers, accounts_per_customer, transactions, balance, seed)
+
+    rnd = random.Random(seed)
+    routes = {
+        "get_balance": ["/accounts/%s/get-balance/" % rnd.choice(account_ids) for _ in range(requests)],
+        "get_history": ["/accounts/%s/get-history/?limit=20" % rnd.choice(account_ids) for _ in range(requests)],
+        "accounts_balances": ["/customers/%s/accounts-balances/" % rnd.choice(customer_ids) for _ in range(requests)],
+    }
+
+    results = {
+        "benchmark": "async_reads",
+        "requests": requests,
+        "concurrency": concurrency,
+        "workers": workers,
+        "latency_ms": latency_ms,
+    }
+    for mode in MODES:
+        port = _free_port()
+        server = _start_server(mode, port, workers, latency_ms)
+        try:
+            for route, uris in routes.items():
+                results["%s_%s" % (route, mode)] = _load(
+                    ["http://127.0.0.1:%s%s" % (port, uri) for uri in uris], concurrency
+                )
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    for route in routes:
+        results["%s_speedup" % route] = round(
+            results["%s_async" % route]["requests_per_s"] / results["%s_sync" % route]["requests_per_s"], 1
+        )
+    return results
+
+
+if __name__ == "__main__":
+    main(run)
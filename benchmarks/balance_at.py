@@ -0,0 +1,103 @@
+"""
+Point-in-time balance benchmark.
+
+Opens an account for every age in ``ages`` (days) with ``per_day`` transactions a day over its
+lifetime and daily balance snapshots, then measures ``account.snapshots.balance_at`` at random moments
+of its life next to a full replay summing up every transaction since opening, and the queries of
+``/accounts/<id>/balance-at/``. ``balance_at`` should stay flat whatever the age of the account, the
+replay grows linearly.
+"""
+
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from benchmarks import Timer, main, percentile
+
+NOW = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _open_account(customer, counterparty, age, per_day):
+    from django.db import transaction as db_transaction
+
+    from account.models import BankAccount, Transaction
+    from account.snapshots import take_snapshots
+
+    account = BankAccount.objects.create(owner=customer, balance=0)
+    opened = NOW - timedelta(days=age)
+    step = timedelta(days=1) / per_day
+    transactions = Transaction.objects.bulk_create([
+        Transaction(sender_account_id=counterparty.pk, recipient_account_id=account.pk, amount=1)
+        for _ in range(age * per_day)
+    ], batch_size=1000)
+    # Dates are set on creation, spread the history over the lifetime of the account afterwards
+    with db_transaction.atomic():
+        for i, transaction in enumerate(transactions):
+            Transaction.objects.filter(pk=transaction.pk).update(date=opened + step * i)
+    BankAccount.objects.filter(pk=account.pk).update(balance=len(transactions), created=opened)
+
+    for day in range(age + 1):
+        list(take_snapshots(opened + timedelta(days=day)))
+    return account, opened
+
+
+def _replay(account_id, when):
+    from django.db.models import Sum
+
+    from account.models import Transaction
+
+    received = Transaction.objects.filter(recipient_account_id=account_id, date__lte=when).aggregate(total=Sum("amount"))
+    sent = Transaction.objects.filter(sender_account_id=account_id, date__lte=when).aggregate(total=Sum("amount"))
+    return (received["total"] or 0) - (sent["total"] or 0)
+
+
+def _measure(client, account, opened, age, repeat, rnd):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from account.snapshots import balance_at
+
+    moments = [opened + timedelta(seconds=rnd.uniform(0, age * 86400)) for _ in range(repeat)]
+    snapshot_latencies, replay_latencies, queries = [], [], []
+    for when in moments:
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get("/accounts/%s/balance-at/" % account.pk, {"ts": when.isoformat()})
+        assert response.status_code == 200, response.status_code
+        queries.append(len(captured))
+
+        with Timer() as timer:
+            balance_at(account.pk, when)
+        snapshot_latencies.append(timer.elapsed)
+
+        with Timer() as timer:
+            replayed = _replay(account.pk, when)
+        replay_latencies.append(timer.elapsed)
+        assert float(response.data["balance"]) == float(replayed), (response.data, replayed)
+
+    return {
+        "balance_at_p50_ms": round(percentile(snapshot_latencies, 50) * 1000, 3),
+        "balance_at_p99_ms": round(percentile(snapshot_latencies, 99) * 1000, 3),
+        "queries_per_request": round(sum(queries) / len(queries), 2),
+        "replay_p50_ms": round(percentile(replay_latencies, 50) * 1000, 3),
+        "replay_p99_ms": round(percentile(replay_latencies, 99) * 1000, 3),
+    }
+
+
+def run(ages="30,365,1825", per_day=10, repeat=50, seed_value=42):
+    from django.test import Client
+
+    from account.models import BankAccount, Customer
+
+    rnd = random.Random(seed_value)
+    client = Client()
+    customer = Customer.objects.create(name="bench-balance-at")
+    counterparty = BankAccount.objects.create(owner=customer, balance=0)
+
+    results = {"benchmark": "balance_at", "per_day": per_day, "ages": {}}
+    for age in sorted(int(age) for age in ages.split(",")):
+        account, opened = _open_account(customer, counterparty, age, per_day)
+        results["ages"][age] = dict(transactions=age * per_day, **_measure(client, account, opened, age, repeat, rnd))
+    return results
+
+
+if __name__ == "__main__":
+    main(run)
@@ -0,0 +1,86 @@
+"""
+Balance cache benchmark.
+
+Reads ``/accounts/<id>/get-balance/`` and ``/customers/<id>/accounts-balances/`` through the
+in-process test client with the balance cache disabled (``DummyCache``) and enabled
+(``LocMemCache``) and reports requests per second and queries per request of both setups.
+"""
+
+import random
+
+from benchmarks import Timer, main
+
+BACKENDS = {
+    "dummy": "django.core.cache.backends.dummy.DummyCache",
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+}
+
+
+def _seed(customers, accounts_per_customer, balance):
+    from account.models import BankAccount, Customer
+
+    Customer.objects.bulk_create([Customer(name="bench-balance-cache-%s" % i) for i in range(customers)])
+    customer_ids = list(Customer.objects.filter(name__startswith="bench-balance-cache-").values_list("pk", flat=True))
+    BankAccount.objects.bulk_create([
+        BankAccount(owner_id=customer_id, balance=balance)
+        for customer_id in customer_ids for _ in range(accounts_per_customer)
+    ])
+    account_ids = list(BankAccount.objects.filter(owner_id__in=customer_ids).values_list("pk", flat=True))
+    return customer_ids, account_ids
+
+
+def _measure(client, uris):
+    from django.db import connection
+
+    queries = []
+
+    def count_query(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_query), Timer() as timer:
+        for uri in uris:
+            response = client.get(uri)
+            assert response.status_code == 200, response.content
+    return {
+        "requests_per_s": round(len(uris) / timer.elapsed, 1),
+        "queries_per_request": round(len(queries) / len(uris), 2),
+    }
+
+
+def run(requests=5000, customers=100, accounts_per_customer=3, balance=100, max_entries=10000, seed=42):
+    from django.conf import settings
+    from django.core.cache import caches
+    from django.test import Client, override_settings
+
+    from account.cache import BALANCE_CACHE
+
+    client = Client()
+    customer_ids, account_ids = _seed(customers, accounts_per_customer, balance)
+
+    rnd = random.Random(seed)
+    routes = {
+        "get_balance": ["/accounts/%s/get-balance/" % rnd.choice(account_ids) for _ in range(requests)],
+        "accounts_balances": ["/customers/%s/accounts-balances/" % rnd.choice(customer_ids) for _ in range(requests)],
+    }
+
+    results = {"benchmark": "balance_cache", "requests": requests}
+    for name, backend in BACKENDS.items():
+        cache_settings = dict(settings.CACHES)
+        cache_settings[BALANCE_CACHE] = dict(
+            settings.CACHES[BALANCE_CACHE], BACKEND=backend, LOCATION="bench-balances", OPTIONS={"MAX_ENTRIES": max_entries}
+        )
+        with override_settings(CACHES=cache_settings):
+            caches[BALANCE_CACHE].clear()
+            for route, uris in routes.items():
+                results["%s_%s" % (route, name)] = _measure(client, uris)
+
+    for route in routes:
+        results["%s_speedup" % route] = round(
+            results["%s_locmem" % route]["requests_per_s"] / results["%s_dummy" % route]["requests_per_s"], 1
+        )
+    return results
+
+
+if __name__ == "__main__":
+    main(run)
@@ -0,0 +1,77 @@
+"""
+Batch vs. single transfer benchmark.
+
+Posts the same set of random transfers once through ``/transactions/make/`` (one request per
+transfer) and once through ``/transactions/batch/`` (``batch_size`` transfers per request), through
+the in-process test client, and reports throughput of both paths.
+"""
+
+import json
+import random
+from decimal import Decimal
+
+from benchmarks import Timer, main
+
+
+def _seed(accounts, balance):
+    from account.models import BankAccount, Customer
+
+    customer = Customer.objects.create(name="bench-batch-transfers-%s" % Customer.objects.count())
+    BankAccount.objects.bulk_create([BankAccount(owner=customer, balance=balance) for _ in range(accounts)])
+    return list(BankAccount.objects.filter(owner=customer).values_list("pk", flat=True))
+
+
+def _transfers(account_ids, count, seed):
+    rnd = random.Random(seed)
+    transfers = []
+    for _ in range(count):
+        sender_id, recipient_id = rnd.sample(account_ids, 2)
+        transfers.append({
+            "from_banking_account": sender_id,
+            "to_banking_account": recipient_id,
+            "deposit_amount": str(Decimal(rnd.randint(1, 1000)) / 100)
+        })
+    return transfers
+
+
+def run(transfers=10000, accounts=100, balance=100000, batch_size=10000, seed=42):
+    from django.test import Client
+
+    from account.models import Transaction
+
+    client = Client()
+
+    account_ids = _seed(accounts, balance)
+    payload = _transfers(account_ids, transfers, seed)
+    with Timer() as single_timer:
+        for item in payload:
+            response = client.post("/transactions/make/", item, content_type="application/json")
+            assert response.status_code == 200, response.content
+    single_count = Transaction.objects.filter(sender_account__in=account_ids).count()
+
+    account_ids = _seed(accounts, balance)
+    payload = _transfers(account_ids, transfers, seed)
+    with Timer() as batch_timer:
+        for start in range(0, len(payload), batch_size):
+            response = client.post(
+                "/transactions/batch/", json.dumps(payload[start:start + batch_size]), content_type="application/json"
+            )
+            assert response.status_code == 200, response.content
+    batch_count = Transaction.objects.filter(sender_account__in=account_ids).count()
+
+    assert single_count == batch_count == transfers, (single_count, batch_count)
+
+    return {
+        "benchmark": "batch_transfers",
+        "transfers": transfers,
+        "batch_size": batch_size,
+        "single_elapsed_s": round(single_timer.elapsed, 4),
+        "single_transfers_per_s": round(transfers / single_timer.elapsed, 1),
+        "batch_elapsed_s": round(batch_timer.elapsed, 4),
+        "batch_transfers_per_s": round(transfers / batch_timer.elapsed, 1),
+        "speedup": round(single_timer.elapsed / batch_timer.elapsed, 1),
+    }
+
+
+if __name__ == "__main__":
+    main(run)
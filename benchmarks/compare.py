@@ -0,0 +1,61 @@
+"""
+Comparison of two ``benchmarks.endpoints`` results.
+
+A route regresses when its throughput drops or its p95 latency grows by more than ``threshold``
+(a fraction, 0.1 is 10%) or when it makes more queries per request than before.
+Usage: ``python -m benchmarks.compare baseline.json current.json [threshold]``.
+"""
+
+import json
+import sys
+
+DEFAULT_THRESHOLD = 0.1
+
+
+def _change(before, after):
+    return (after - before) / before if before else 0.0
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """ Returns per-route changes between two results and the list of regressions found """
+
+    changes = {}
+    regressions = []
+    for key in ("mode", "dataset", "requests", "concurrency"):
+        if baseline.get(key) != current.get(key):
+            regressions.append("results aren't comparable, %s differs: %s -> %s" % (key, baseline.get(key), current.get(key)))
+
+    for name, after in current["routes"].items():
+        before = baseline["routes"].get(name)
+        if not before or "skipped" in before or "skipped" in after:
+            continue
+
+        change = {
+            "requests_per_s": round(_change(before["requests_per_s"], after["requests_per_s"]), 3),
+            "p95_ms": round(_change(before["p95_ms"], after["p95_ms"]), 3),
+        }
+        if change["requests_per_s"] < -threshold:
+            regressions.append("%s: requests/s %s -> %s" % (name, before["requests_per_s"], after["requests_per_s"]))
+        if change["p95_ms"] > threshold:
+            regressions.append("%s: p95 %sms -> %sms" % (name, before["p95_ms"], after["p95_ms"]))
+
+        queries_before, queries_after = before.get("queries_per_request"), after.get("queries_per_request")
+        if queries_before is not None and queries_after is not None:
+            change["queries_per_request"] = round(queries_after - queries_before, 2)
+            if queries_after > queries_before:
+                regressions.append("%s: queries/request %s -> %s" % (name, queries_before, queries_after))
+        changes[name] = change
+
+    return changes, regressions
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    threshold = float(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_THRESHOLD
+    changes, regressions = compare(load(sys.argv[1]), load(sys.argv[2]), threshold)
+    print(json.dumps({"changes": changes, "regressions": regressions}, indent=2))
+    sys.exit(1 if regressions else 0)
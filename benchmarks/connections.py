@@ -0,0 +1,84 @@
+"""
+Persistent connection benchmark.
+
+Serves ``/accounts/<id>/get-balance/`` through Django's WSGI handler, which opens and closes database
+connections around every request the way a gunicorn worker does, once with ``CONN_MAX_AGE = 0`` and
+once with persistent connections (``conn_max_age`` seconds, health checks on), and reports connections
+opened and time per request of both setups.
+
+Connecting to SQLite is opening a file; the saving is a TCP and authentication round trip per request
+on PostgreSQL, so run it with the ``SQL_*`` variables pointing at the database server.
+"""
+
+from benchmarks import Timer, main, percentile
+
+
+def _serve(path, requests, conn_max_age):
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connection
+    from django.db.backends.signals import connection_created
+    from django.test import RequestFactory
+
+    connection.close()
+    connection.settings_dict["CONN_MAX_AGE"] = conn_max_age
+    connection.settings_dict["CONN_HEALTH_CHECKS"] = True
+
+    handler = WSGIHandler()
+    factory = RequestFactory()
+    connects = []
+    latencies = []
+
+    def count_connect(sender, connection, **kwargs):
+        connects.append(connection.alias)
+
+    connection_created.connect(count_connect)
+    try:
+        with Timer() as total:
+            for _ in range(requests):
+                with Timer() as timer:
+                    response = handler(factory.get(path).environ, lambda status, headers: None)
+                    content = b"".join(response)
+                    # Closing the response fires request_finished, which closes expired connections
+                    response.close()
+                latencies.append(timer.elapsed)
+                assert response.status_code == 200, content
+    finally:
+        connection_created.disconnect(count_connect)
+        connection.close()
+
+    return {
+        "connections_opened": len(connects),
+        "ms_per_request": round(total.elapsed / requests * 1000, 4),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def run(requests=2000, conn_max_age=60):
+    from django.db import connection
+
+    from account.models import BankAccount, Customer
+
+    customer = Customer.objects.create(name="bench-connections")
+    account = BankAccount.objects.create(owner=customer, balance=100)
+    path = "/accounts/%s/get-balance/" % account.pk
+
+    settings_dict = dict(connection.settings_dict)
+    try:
+        per_request = _serve(path, requests, 0)
+        persistent = _serve(path, requests, conn_max_age)
+    finally:
+        connection.settings_dict.update(settings_dict)
+
+    return {
+        "benchmark": "connections",
+        "vendor": connection.vendor,
+        "requests": requests,
+        "per_request": per_request,
+        "persistent": persistent,
+        "saved_ms_per_request": round(per_request["ms_per_request"] - persistent["ms_per_request"], 4),
+    }
+
+
+if __name__ == "__main__":
+    main(run)
@@ -0,0 +1,95 @@
+"""
+Currency column benchmark.
+
+Measures what the currency columns of money fields cost: Django startup with model import and
+migration loading, timed in fresh interpreters, the size of every money table and its indexes on a
+dataset of ``customers`` customers and ``transactions`` transfers generated by ``seed_bank``, and
+reading ``rows`` transactions as model instances. Run it on two commits to compare them.
+
+Table sizes come from ``dbstat`` on SQLite and ``pg_table_size`` and ``pg_indexes_size`` on PostgreSQL.
+"""
+
+import subprocess
+import sys
+
+from benchmarks import Timer, main, percentile
+
+MONEY_TABLES = ("bankaccount", "transaction", "ledgerentry", "balanceshard", "balancesnapshot")
+
+STARTUP = """
+import os, time
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mock_api.settings")
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+MigrationLoader(connection).project_state().apps
+print(setup - started, time.perf_counter() - setup)
+"""
+
+
+def _startup(repeat):
+    setups, migrations = [], []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", STARTUP], capture_output=True, text=True, check=True).stdout
+        setup, migration = (float(value) for value in output.split())
+        setups.append(setup)
+        migrations.append(migration)
+    return {
+        "django_setup_ms": round(percentile(setups, 50) * 1000, 1),
+        "migration_state_ms": round(percentile(migrations, 50) * 1000, 1),
+    }
+
+
+def _table_sizes():
+    from django.db import connection
+
+    from account.models import Transaction
+
+    prefix = Transaction._meta.app_label + "_"
+    sizes = {}
+    with connection.cursor() as cursor:
+        for table in MONEY_TABLES:
+            name = prefix + table
+            if connection.vendor == "postgresql":
+                cursor.execute("SELECT pg_table_size(%s), pg_indexes_size(%s)", [name, name])
+                sizes[table] = dict(zip(("table_kb", "indexes_kb"), (size // 1024 for size in cursor.fetchone())))
+            else:
+                cursor.execute("SELECT coalesce(sum(pgsize), 0) FROM dbstat WHERE name = %s", [name])
+                table_size = cursor.fetchone()[0]
+                cursor.execute(
+                    "SELECT coalesce(sum(pgsize), 0) FROM dbstat WHERE name IN"
+                    " (SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)", [name]
+                )
+                sizes[table] = {"table_kb": table_size // 1024, "indexes_kb": cursor.fetchone()[0] // 1024}
+    return sizes
+
+
+def run(customers=2000, transactions=20000, rows=10000, repeat=5):
+    from account.models import Transaction
+    from account.seeding import seed_bank
+
+    startup = _startup(repeat)
+    for _ in seed_bank(customers, transactions=transactions):
+        pass
+
+    reads = []
+    for _ in range(repeat):
+        with Timer() as timer:
+            list(Transaction.objects.all()[:rows])
+        reads.append(timer.elapsed)
+
+    return {
+        "benchmark": "currency_columns",
+        "customers": customers,
+        "transactions": transactions,
+        **startup,
+        "read_us_per_transaction": round(percentile(reads, 50) / rows * 1e6, 2),
+        "tables": _table_sizes(),
+    }
+
+
+if __name__ == "__main__":
+    main(run)
@@ -0,0 +1,261 @@
+"""
+Benchmark of every API route.
+
+Seeds a dataset of ``customers`` customers, ``accounts`` banking accounts and ``transactions``
+transactions through the API itself, then sends ``requests`` requests to every route registered in
+``mock_api.urls`` and reports requests per second, p50/p95/p99 latency and, in-process, queries per
+request. Without ``url`` requests go through the in-process test client one at a time, with
+``url=http://host:port`` they go to a running server from ``concurrency`` threads, seeding included.
+
+Routes without a request factory in ``ROUTES`` are reported as skipped, add one for new routes, and so
+are event streams unless ``ASYNC_READ_ENDPOINTS`` is on.
+Results are meant to be stored and compared between commits, see ``benchmarks.compare``.
+"""
+
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from benchmarks import Timer, main, percentile
+
+# Admin pages aren't part of the API
+SKIPPED_NAMESPACES = ("admin",)
+
+SEED_BATCH_SIZE = 1000
+
+# Event streams are only served by the async views, the sync ones answer 501
+ASYNC_ONLY_ROUTES = ("accounts-get-events",)
+
+
+class InProcessClient:
+    """ Sends requests through the Django test client and counts the queries they make """
+
+    def __init__(self):
+        from django.test import Client
+
+        self.client = Client()
+        self.queries = 0
+
+    def _count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def request(self, method, path, data=None):
+        from django.db import connection
+
+        body = "" if data is None else json.dumps(data)
+        with connection.execute_wrapper(self._count_query):
+            response = self.client.generic(method, path, body, content_type="application/json")
+            content = b"".join(response.streaming_content) if response.streaming else response.content
+        return response.status_code, content
+
+
+class HttpClient:
+    """ Sends requests to a running server """
+
+    queries = None
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+
+    def request(self, method, path, data=None):
+        body = None if data is None else json.dumps(data).encode()
+        request = urllib.request.Request(
+            self.url + path, data=body, method=method, headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+class Dataset:
+    """ Ids of the seeded customers and accounts """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.customers = []
+        self.accounts = []
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    def unique_name(self):
+        with self.lock:
+            self.counter += 1
+            return "%s-new-%s" % (self.prefix, self.counter)
+
+
+def _check(status, content):
+    assert status == 200, (status, content[:500])
+    return json.loads(content)
+
+
+def seed(client, customers, accounts, transactions, deposit, rnd):
+    """ Creates the dataset through the API, so it works in-process and against a server alike """
+
+    dataset = Dataset("bench-%s" % rnd.getrandbits(32))
+    for i in range(customers):
+        customer = _check(*client.request("POST", "/customers/create-customer-account/", {
+            "name": "%s-%s" % (dataset.prefix, i), "deposit_amount": deposit
+        }))
+        dataset.customers.append(customer["id"])
+        dataset.accounts.extend(
+            account["id"] for account in
+            _check(*client.request("GET", "/customers/%s/accounts-balances/" % customer["id"]))
+        )
+
+    for i in range(max(accounts - len(dataset.accounts), 0)):
+        account = _check(*client.request("POST", "/customers/add-banking-account/", {
+            "owner_id": dataset.customers[i % len(dataset.customers)], "deposit_amount": deposit
+        }))
+        dataset.accounts.append(account["id"])
+
+    for start in range(0, transactions, SEED_BATCH_SIZE):
+        _check(*client.request("POST", "/transactions/batch/", [
+            _transfer(dataset, rnd) for _ in range(min(SEED_BATCH_SIZE, transactions - start))
+        ]))
+    return dataset
+
+
+def _transfer(dataset, rnd):
+    sender_id, recipient_id = rnd.sample(dataset.accounts, 2)
+    return {
+        "from_banking_account": sender_id,
+        "to_banking_account": recipient_id,
+        "deposit_amount": str(Decimal(rnd.randint(1, 100)) / 100)
+    }
+
+
+# Request factories by route name, each returns (method, path, data) of one request
+ROUTES = {
+    "accounts-get-balance": lambda d, rnd: ("GET", "/accounts/%s/get-balance/" % rnd.choice(d.accounts), None),
+    "accounts-get-history": lambda d, rnd: ("GET", "/accounts/%s/get-history/?limit=50" % rnd.choice(d.accounts), None),
+    "accounts-get-balance-at": lambda d, rnd: ("GET", "/accounts/%s/balance-at/?ts=%s" % (
+        rnd.choice(d.accounts), time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - rnd.randint(0, 3600)))
+    ), None),
+    # Streams end after the first poll, only opening one is measured
+    "accounts-get-events": lambda d, rnd: ("GET", "/accounts/%s/events/?seconds=0" % rnd.choice(d.accounts), None),
+    "accounts-get-statement": lambda d, rnd: ("GET", "/accounts/%s/statement/?since=%s" % (
+        rnd.choice(d.accounts), time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - 3600))
+    ), None),
+    "customers-get-statement": lambda d, rnd: ("GET", "/customers/%s/statement/?since=%s&stream=ndjson" % (
+        rnd.choice(d.customers), time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - 3600))
+    ), None),
+    "customers-get-balances": lambda d, rnd: ("GET", "/customers/%s/accounts-balances/" % rnd.choice(d.customers), None),
+    "customers-get-summary": lambda d, rnd: ("GET", "/customers/%s/summary/" % rnd.choice(d.customers), None),
+    "customers-get-summaries": lambda d, rnd: ("POST", "/customers/summaries/", {
+        "customer_ids": rnd.sample(d.customers, min(len(d.customers), 100))
+    }),
+    "customers-create-customer-account": lambda d, rnd: ("POST", "/customers/create-customer-account/", {
+        "name": d.unique_name(), "deposit_amount": "100.00"
+    }),
+    "customers-onboard-customers": lambda d, rnd: ("POST", "/customers/onboard/", [
+        {"name": d.unique_name(), "deposit_amount": "100.00"} for _ in range(100)
+    ]),
+    "customers-add-banking-account": lambda d, rnd: ("POST", "/customers/add-banking-account/", {
+        "owner_id": rnd.choice(d.customers), "deposit_amount": "100.00"
+    }),
+    "transactions-make-transaction": lambda d, rnd: ("POST", "/transactions/make/", _transfer(d, rnd)),
+    "transactions-batch-transactions": lambda d, rnd: ("POST", "/transactions/batch/", [
+        _transfer(d, rnd) for _ in range(100)
+    ]),
+    "schema": lambda d, rnd: ("GET", "/api/schema/", None),
+    "swagger-ui": lambda d, rnd: ("GET", "/api/schema/swagger-ui/", None),
+    "metrics": lambda d, rnd: ("GET", "/metrics", None),
+}
+
+
+def route_names(patterns=None):
+    """ Returns names of all routes of the URLconf, admin excluded """
+
+    from django.urls import URLResolver, get_resolver
+
+    names = []
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace not in SKIPPED_NAMESPACES:
+                names.extend(route_names(pattern.url_patterns))
+        elif pattern.name and pattern.name not in names:
+            names.append(pattern.name)
+    return names
+
+
+def _measure(client, requests, concurrency):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def send(request):
+        with Timer() as timer:
+            status, _ = client.request(*request)
+        with lock:
+            (latencies if status < 400 else errors).append(timer.elapsed)
+
+    queries_before = client.queries
+    with Timer() as total:
+        if concurrency > 1:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(send, requests))
+        else:
+            for request in requests:
+                send(request)
+
+    method, path, _ = requests[0]
+    return {
+        "method": method,
+        "path": path,
+        "requests": len(requests),
+        "errors": len(errors),
+        "requests_per_s": round(len(requests) / total.elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "queries_per_request": None if client.queries is None else round((client.queries - queries_before) / len(requests), 2),
+    }
+
+
+def run(customers=100, accounts=300, transactions=10000, requests=200, url=None, concurrency=8, deposit=1000000,
+        seed_value=42):
+    from django.conf import settings
+
+    rnd = random.Random(seed_value)
+    client = InProcessClient() if url is None else HttpClient(url)
+    if url is None:
+        # The test client runs requests in this thread, one at a time
+        concurrency = 1
+
+    with Timer() as seed_timer:
+        dataset = seed(client, customers, accounts, transactions, deposit, rnd)
+
+    routes = {}
+    for name in route_names():
+        factory = ROUTES.get(name)
+        if factory is None:
+            routes[name] = {"skipped": "no request factory"}
+            continue
+        if name in ASYNC_ONLY_ROUTES and not settings.ASYNC_READ_ENDPOINTS:
+            routes[name] = {"skipped": "served with ASYNC_READ_ENDPOINTS only"}
+            continue
+        routes[name] = _measure(client, [factory(dataset, rnd) for _ in range(requests)], concurrency)
+
+    return {
+        "benchmark": "endpoints",
+        "mode": "in-process" if url is None else "server",
+        "url": url,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "dataset": {"customers": customers, "accounts": len(dataset.accounts), "transactions": transactions},
+        "seed_s": round(seed_timer.elapsed, 2),
+        "requests": requests,
+        "concurrency": concurrency,
+        "routes": routes,
+    }
+
+
+if __name__ == "__main__":
+    main(run)
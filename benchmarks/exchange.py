@@ -0,0 +1,93 @@
+"""
+Currency conversion benchmark.
+
+Loads the rates of ``EXCHANGE_RATES_FILE`` and measures conversion throughput of ``conversions``
+random amounts: reading the rate with a query per conversion, ``account.exchange.convert`` with the
+cached rates, and ``convert_many`` converting a whole currency pair at once. Then applies the same
+``transfers`` random transfers with ``make_batch_transfer`` between ``accounts`` accounts held in GBP
+only and between accounts held in every currency of ``CURRENCIES``, so the cost conversion adds to a
+transfer shows up.
+"""
+
+import random
+from decimal import Decimal
+
+from benchmarks import Timer, main
+
+
+def _amounts(count, seed):
+    rnd = random.Random(seed)
+    return [Decimal(rnd.randint(1, 100000)) / 100 for _ in range(count)]
+
+
+def _query_per_conversion(amounts, source, target):
+    from account.exchange import _convert_units
+    from account.models import ExchangeRate
+    from account.money import from_minor, to_minor
+
+    converted = []
+    for amount in amounts:
+        rate = ExchangeRate.objects.filter(base=source, quote=target).order_by("-version").values_list("rate", flat=True)[0]
+        converted.append(from_minor(_convert_units(to_minor(amount), *rate.as_integer_ratio())))
+    return converted
+
+
+def _conversions(conversions, queried, seed):
+    from account.exchange import convert, convert_many
+
+    amounts = _amounts(conversions, seed)
+    with Timer() as query_timer:
+        by_query = _query_per_conversion(amounts[:queried], "GBP", "EUR")
+    with Timer() as cached_timer:
+        cached = [convert(amount, "GBP", "EUR") for amount in amounts]
+    with Timer() as batched_timer:
+        batched = convert_many(amounts, "GBP", "EUR")
+    assert cached == batched and by_query == cached[:queried]
+
+    return {
+        "query_per_conversion": round(queried / query_timer.elapsed, 1),
+        "cached": round(conversions / cached_timer.elapsed, 1),
+        "batched": round(conversions / batched_timer.elapsed, 1),
+    }
+
+
+def _batch_transfers(currencies, accounts, transfers, balance, seed):
+    from djmoney.money import Money
+
+    from account.models import BankAccount, Customer
+    from account.transfers import make_batch_transfer
+
+    customer = Customer.objects.create(name="bench-exchange-%s" % Customer.objects.count())
+    BankAccount.objects.bulk_create([
+        BankAccount(owner=customer, balance=Money(balance, currencies[index % len(currencies)])) for index in range(accounts)
+    ])
+    account_ids = list(BankAccount.objects.filter(owner=customer).values_list("pk", flat=True))
+
+    rnd = random.Random(seed)
+    payload = [tuple(rnd.sample(account_ids, 2)) + (amount,) for amount in _amounts(transfers, seed)]
+    with Timer() as timer:
+        outcomes = make_batch_transfer(payload, atomic=False)
+    assert not any(isinstance(outcome, Exception) for outcome in outcomes), outcomes
+    converted = sum(1 for outcome in outcomes if outcome.credit is not None)
+    return {"transfers_per_s": round(transfers / timer.elapsed, 1), "converted": converted}
+
+
+def run(conversions=100000, queried=2000, transfers=10000, accounts=1000, balance=1000000, seed=42):
+    from django.conf import settings
+
+    from account.exchange import load_rates, read_rates
+
+    load_rates(read_rates(settings.EXCHANGE_RATES_FILE))
+    single_currency = _batch_transfers(["GBP"], accounts, transfers, balance, seed)
+    multi_currency = _batch_transfers(list(settings.CURRENCIES), accounts, transfers, balance, seed)
+    return {
+        "benchmark": "exchange",
+        "conversions": conversions,
+        "conversions_per_s": _conversions(conversions, min(queried, conversions), seed),
+        "batch_transfers": {"single_currency": single_currency, "multi_currency": multi_currency},
+        "conversion_overhead": round(1 - multi_currency["transfers_per_s"] / single_currency["transfers_per_s"], 3),
+    }
+
+
+if __name__ == "__main__":
+    main(run)
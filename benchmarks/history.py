@@ -0,0 +1,78 @@
+"""
+Transaction history benchmark.
+
+Grows the history of a single account and measures peak Python memory and latency percentiles
+of ``/accounts/<id>/get-history/`` for the unpaginated list, a keyset page and the NDJSON stream.
+The page and the stream should stay flat as the history grows, the full list grows linearly.
+"""
+
+import tracemalloc
+
+from benchmarks import Timer, main, percentile
+
+MODES = {
+    "list": {},
+    "page": {"limit": 100},
+    "stream": {"stream": "ndjson"},
+}
+
+
+def _grow_history(account_id, counterparty_id, rows):
+    from account.models import Transaction
+
+    Transaction.objects.bulk_create([
+        Transaction(sender_account_id=account_id, recipient_account_id=counterparty_id, amount=1)
+        for _ in range(rows)
+    ], batch_size=1000)
+
+
+def _measure(client, uri, params, repeat):
+    latencies = []
+    for _ in range(repeat):
+        with Timer() as timer:
+            response = client.get(uri, params)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            else:
+                response.content
+        assert response.status_code == 200, response.status_code
+        latencies.append(timer.elapsed)
+
+    tracemalloc.start()
+    response = client.get(uri, params)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def run(sizes="1000,10000,50000", repeat=5):
+    from django.test import Client
+
+    from account.models import BankAccount, Customer
+
+    client = Client()
+    customer = Customer.objects.create(name="bench-history")
+    account = BankAccount.objects.create(owner=customer, balance=0)
+    counterparty = BankAccount.objects.create(owner=customer, balance=0)
+    uri = "/accounts/%s/get-history/" % account.pk
+
+    results = {"benchmark": "history", "sizes": {}}
+    rows = 0
+    for size in sorted(int(size) for size in sizes.split(",")):
+        _grow_history(account.pk, counterparty.pk, size - rows)
+        rows = size
+        results["sizes"][size] = {mode: _measure(client, uri, params, repeat) for mode, params in MODES.items()}
+    return results
+
+
+if __name__ == "__main__":
+    main(run)
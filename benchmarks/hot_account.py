@@ -0,0 +1,98 @@
+"""
+Hot-account contention benchmark.
+
+Every thread sends ``transfers`` small transfers from its own account to a single hot account, once
+with the hot account unsharded and once with ``shards`` balance shards, and reports throughput and
+latency of both runs. Money must be conserved and ledgers, with ``LEDGER_ENTRIES`` on, must reconcile in both runs.
+
+Under SQLite every write takes the database lock, so both runs serialize the same way; the shards
+only pay off on a backend with row locks such as PostgreSQL.
+"""
+
+import threading
+from decimal import Decimal
+
+from benchmarks import Timer, main, percentile
+
+
+def _run(threads, transfers, shards):
+    from django.conf import settings
+    from django.db import connection, close_old_connections
+    from django.test import override_settings
+
+    from account.ledger import open_ledgers, verify_ledger
+    from account.models import BankAccount, Customer
+    from account.shards import sync_balance_shards, total_balance, with_total_balance
+    from account.transfers import make_transfer
+
+    customer = Customer.objects.create(name="bench-hot-account-%s" % shards)
+    hot = BankAccount.objects.create(owner=customer, balance=0)
+    senders = [BankAccount.objects.create(owner=customer, balance=transfers) for _ in range(threads)]
+    open_ledgers([hot] + senders)
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(sender_id):
+        local_latencies = []
+        try:
+            for _ in range(transfers):
+                with Timer() as timer:
+                    make_transfer(sender_id, hot.pk, Decimal("1.00"))
+                local_latencies.append(timer.elapsed)
+        except Exception as e:
+            with lock:
+                errors.append(repr(e))
+        finally:
+            connection.close()
+            with lock:
+                latencies.extend(local_latencies)
+
+    with override_settings(BALANCE_SHARDS={hot.pk: shards} if shards else {}):
+        list(sync_balance_shards())
+        close_old_connections()
+        workers = [threading.Thread(target=worker, args=(sender.pk,)) for sender in senders]
+        with Timer() as timer:
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+
+        assert not errors, "Transfers failed: %s" % errors[:5]
+
+        received = total_balance(with_total_balance(BankAccount.objects).get(pk=hot.pk)).balance.amount
+        assert received == threads * transfers, "Hot account received %s of %s" % (received, threads * transfers)
+        if settings.LEDGER_ENTRIES:
+            mismatches = list(verify_ledger())
+            assert not mismatches, "Ledger does not reconcile: %s" % mismatches[:5]
+
+    attempted = threads * transfers
+    return {
+        "elapsed_s": round(timer.elapsed, 4),
+        "transfers_per_s": round(attempted / timer.elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def run(threads=8, transfers=100, shards=16):
+    from django.db import connection
+
+    unsharded = _run(threads, transfers, 0)
+    sharded = _run(threads, transfers, shards)
+
+    return {
+        "benchmark": "hot_account",
+        "vendor": connection.vendor,
+        "threads": threads,
+        "transfers": threads * transfers,
+        "shards": shards,
+        "unsharded": unsharded,
+        "sharded": sharded,
+        "speedup": round(unsharded["elapsed_s"] / sharded["elapsed_s"], 2),
+    }
+
+
+if __name__ == "__main__":
+    main(run)
@@ -0,0 +1,83 @@
+"""
+Idempotency-Key replay storm benchmark.
+
+Posts ``transfers`` distinct keyed transfers through ``/transactions/make/``, then replays each of
+them ``replays`` times, the way clients retry during an incident, through the in-process test client.
+Reports throughput and queries per request of first executions and of replays and checks that
+replays moved no money.
+"""
+
+import random
+
+from benchmarks import Timer, main
+
+
+def _seed(accounts, balance):
+    from account.models import BankAccount, Customer
+
+    customer = Customer.objects.create(name="bench-idempotency-%s" % Customer.objects.count())
+    BankAccount.objects.bulk_create([BankAccount(owner=customer, balance=balance) for _ in range(accounts)])
+    return list(BankAccount.objects.filter(owner=customer).values_list("pk", flat=True))
+
+
+def _post_all(client, requests):
+    from django.db import connection
+
+    queries = []
+
+    def count_query(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_query), Timer() as timer:
+        for key, data in requests:
+            response = client.post("/transactions/make/", data, content_type="application/json", HTTP_IDEMPOTENCY_KEY=key)
+            assert response.status_code == 200, response.content
+
+    return {
+        "requests_per_s": round(len(requests) / timer.elapsed, 1),
+        "queries_per_request": round(len(queries) / len(requests), 2),
+    }
+
+
+def run(transfers=500, replays=10, accounts=50, balance=100000, seed=42):
+    from django.db.models import Sum
+    from django.test import Client
+
+    from account.models import BankAccount, Transaction
+
+    client = Client()
+    account_ids = _seed(accounts, balance)
+
+    rnd = random.Random(seed)
+    requests = []
+    for i in range(transfers):
+        sender_id, recipient_id = rnd.sample(account_ids, 2)
+        requests.append(("bench-%s" % i, {
+            "from_banking_account": sender_id,
+            "to_banking_account": recipient_id,
+            "deposit_amount": "1.00"
+        }))
+
+    first = _post_all(client, requests)
+    storm = requests * replays
+    rnd.shuffle(storm)
+    replayed = _post_all(client, storm)
+
+    executed = Transaction.objects.filter(sender_account__in=account_ids).count()
+    assert executed == transfers, (executed, transfers)
+    total = BankAccount.objects.filter(pk__in=account_ids).aggregate(total=Sum("balance"))["total"]
+    assert round(total) == accounts * balance, total
+
+    return {
+        "benchmark": "idempotency",
+        "transfers": transfers,
+        "replays": len(storm),
+        "first": first,
+        "replay": replayed,
+        "speedup": round(replayed["requests_per_s"] / first["requests_per_s"], 1),
+    }
+
+
+if __name__ == "__main__":
+    main(run)
@@ -0,0 +1,103 @@
+"""
+Integer minor-unit money benchmark.
+
+Measures what storing balances and amounts as integers of minor units (pence) would save over the
+decimal ``MoneyField`` columns, see ``account.money``, at two levels:
+
+* hydration: reading ``accounts`` banking account balances as model instances (``Money``), as
+  decimals and as integers of minor units computed by the database, the closest a SQL read gets
+  to a ``BigIntegerField`` column
+* arithmetic: checking and moving ``transfers`` random transfers over locked balances in memory, the
+  transfer engine's own work between locking rows and writing them, on decimals as stored today,
+  on integers converted from and back to the decimal columns, and on integers as an integer column
+  would hold them
+"""
+
+import random
+from decimal import Decimal
+
+from benchmarks import Timer, main
+
+
+def _seed(accounts, balance):
+    from account.models import BankAccount, Customer
+
+    customer = Customer.objects.create(name="bench-minor-units")
+    BankAccount.objects.bulk_create([BankAccount(owner=customer, balance=balance) for _ in range(accounts)])
+    return list(BankAccount.objects.filter(owner=customer).values_list("pk", flat=True))
+
+
+def _transfers(account_ids, count, seed):
+    rnd = random.Random(seed)
+    return [tuple(rnd.sample(account_ids, 2)) + (Decimal(rnd.randint(1, 1000)) / 100,) for _ in range(count)]
+
+
+def _best(function, repeat):
+    elapsed = []
+    for _ in range(repeat):
+        with Timer() as timer:
+            function()
+        elapsed.append(timer.elapsed)
+    return min(elapsed)
+
+
+def _hydration(account_ids, repeat):
+    from django.db.models import BigIntegerField, F
+    from django.db.models.functions import Cast
+
+    from account.models import BankAccount
+    from account.money import DECIMAL_PLACES
+
+    accounts = BankAccount.objects.filter(pk__in=account_ids)
+    units = Cast(F("balance") * 10 ** DECIMAL_PLACES, BigIntegerField())
+    modes = {
+        "money": lambda: [account.balance for account in accounts.all()],
+        "decimal": lambda: list(accounts.values_list("pk", "balance")),
+        "minor_units": lambda: list(accounts.values_list("pk", units)),
+    }
+    return {mode: round(_best(function, repeat) / len(account_ids) * 1e6, 3) for mode, function in modes.items()}
+
+
+def _arithmetic(account_ids, transfers, balance, repeat):
+    from account.money import from_minor, to_minor
+    from account.transfers import _check_transfer, _move
+
+    def apply(balances, amounts, written):
+        rows = {account_id: {None: balances[account_id]} for account_id in account_ids}
+        for (sender_id, recipient_id, _), amount in zip(transfers, amounts()):
+            if _check_transfer(rows, sender_id, recipient_id, amount) is None:
+                written(_move(rows, sender_id, recipient_id, amount))
+
+    def converted(movements):
+        return [(account_id, shard, from_minor(amount), from_minor(total)) for account_id, shard, amount, total in movements]
+
+    decimals = [amount for _, _, amount in transfers]
+    units = [to_minor(amount) for amount in decimals]
+    start = Decimal(balance).quantize(Decimal("0.01"))
+    modes = {
+        "decimal": (dict.fromkeys(account_ids, start), lambda: decimals, list),
+        "minor_units_converted": (
+            dict.fromkeys(account_ids, to_minor(start)), lambda: map(to_minor, decimals), converted
+        ),
+        "minor_units_stored": (dict.fromkeys(account_ids, to_minor(start)), lambda: units, list),
+    }
+    return {
+        mode: round(_best(lambda: apply(balances, amounts, written), repeat) / len(transfers) * 1e6, 3)
+        for mode, (balances, amounts, written) in modes.items()
+    }
+
+
+def run(accounts=10000, transfers=10000, balance=100000, repeat=5, seed=42):
+    account_ids = _seed(accounts, balance)
+    payload = _transfers(account_ids, transfers, seed)
+    return {
+        "benchmark": "minor_units",
+        "accounts": accounts,
+        "transfers": transfers,
+        "hydration_us_per_row": _hydration(account_ids, repeat),
+        "arithmetic_us_per_transfer": _arithmetic(account_ids, payload, balance, repeat),
+    }
+
+
+if __name__ == "__main__":
+    main(run)
@@ -0,0 +1,57 @@
+"""
+Bulk vs. single customer onboarding benchmark.
+
+Creates ``customers`` customers once through ``/customers/create-customer-account/`` (one request
+per customer) and once through ``/customers/onboard/`` (``batch_size`` customers per request), through
+the in-process test client, and reports throughput of both paths.
+"""
+
+import json
+
+from benchmarks import Timer, main
+
+
+def _customers(prefix, count):
+    return [{"name": "bench-onboarding-%s-%s" % (prefix, i), "deposit_amount": "100.00"} for i in range(count)]
+
+
+def run(customers=5000, batch_size=1000):
+    from django.test import Client
+
+    from account.models import BankAccount, Customer
+
+    client = Client()
+
+    payload = _customers("single", customers)
+    with Timer() as single_timer:
+        for item in payload:
+            response = client.post("/customers/create-customer-account/", item, content_type="application/json")
+            assert response.status_code == 200, response.content
+    single_count = BankAccount.objects.filter(owner__name__startswith="bench-onboarding-single-").count()
+
+    payload = _customers("bulk", customers)
+    with Timer() as bulk_timer:
+        for start in range(0, len(payload), batch_size):
+            response = client.post(
+                "/customers/onboard/", json.dumps(payload[start:start + batch_size]), content_type="application/json"
+            )
+            assert response.status_code == 200, response.content
+    bulk_count = BankAccount.objects.filter(owner__name__startswith="bench-onboarding-bulk-").count()
+
+    assert single_count == bulk_count == customers, (single_count, bulk_count)
+    assert Customer.objects.count() == 2 * customers
+
+    return {
+        "benchmark": "onboarding",
+        "customers": customers,
+        "batch_size": batch_size,
+        "single_elapsed_s": round(single_timer.elapsed, 4),
+        "single_customers_per_s": round(customers / single_timer.elapsed, 1),
+        "bulk_elapsed_s": round(bulk_timer.elapsed, 4),
+        "bulk_customers_per_s": round(customers / bulk_timer.elapsed, 1),
+        "speedup": round(single_timer.elapsed / bulk_timer.elapsed, 1),
+    }
+
+
+if __name__ == "__main__":
+    main(run)
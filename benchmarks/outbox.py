@@ -0,0 +1,98 @@
+"""
+Transactional outbox benchmark.
+
+Applies ``transfers`` random transfers between ``accounts`` accounts with ``make_batch_transfer`` in
+batches of ``batch`` transfers with the outbox disabled and enabled, so the cost of writing events
+shows up, relays the events to an NDJSON file in a temporary directory with ``Relay`` and reports
+events relayed per second. Then compares ``polls`` polls of an account the way clients did before
+event streams, a history page through the in-process test client, with the poll of an event stream.
+"""
+
+import os
+import random
+import tempfile
+from decimal import Decimal
+
+from benchmarks import Timer, main
+
+
+def _seed(accounts, balance):
+    from account.models import BankAccount, Customer
+
+    customer = Customer.objects.create(name="bench-outbox-%s" % Customer.objects.count())
+    BankAccount.objects.bulk_create([BankAccount(owner=customer, balance=balance) for _ in range(accounts)])
+    return list(BankAccount.objects.filter(owner=customer).values_list("pk", flat=True))
+
+
+def _transfers(account_ids, transfers, batch, rnd):
+    from django.test import override_settings
+
+    from account.transfers import make_batch_transfer
+
+    payload = [tuple(rnd.sample(account_ids, 2)) + (Decimal(rnd.randint(1, 100)) / 100,) for _ in range(transfers)]
+    results = {}
+    for enabled in (0, 1):
+        with override_settings(OUTBOX_ENABLED=enabled), Timer() as timer:
+            for start in range(0, transfers, batch):
+                outcomes = make_batch_transfer(payload[start:start + batch], atomic=False)
+                assert not any(isinstance(outcome, Exception) for outcome in outcomes), outcomes
+        results["enabled" if enabled else "disabled"] = round(transfers / timer.elapsed, 1)
+    results["overhead"] = round(1 - results["enabled"] / results["disabled"], 3)
+    return results
+
+
+def _relay(batch_size):
+    from account.outbox import FileSink, Relay
+
+    with tempfile.TemporaryDirectory() as directory:
+        sink = FileSink(os.path.join(directory, "events.ndjson"))
+        relay = Relay(sink, consumer="bench-outbox-%s" % random.getrandbits(32), batch_size=batch_size)
+        relayed = 0
+        with Timer() as timer:
+            while True:
+                published = relay.relay_batch()
+                relayed += published
+                if published < relay.batch_size:
+                    break
+        sink.close()
+    return {"events": relayed, "events_per_s": round(relayed / timer.elapsed, 1)}
+
+
+def _polls(account_ids, polls, rnd):
+    from django.test import Client
+
+    from account.events import _poll
+    from account.outbox import HORIZON
+
+    client = Client()
+    with Timer() as history_timer:
+        for _ in range(polls):
+            response = client.get("/accounts/%s/get-history/?limit=50&direction=desc" % rnd.choice(account_ids))
+            assert response.status_code == 200, response.content
+
+    HORIZON.reset()
+    position = HORIZON.position()
+    with Timer() as stream_timer:
+        for _ in range(polls):
+            _poll(rnd.choice(account_ids), position)
+
+    return {
+        "history_page_per_s": round(polls / history_timer.elapsed, 1),
+        "event_stream_poll_per_s": round(polls / stream_timer.elapsed, 1),
+    }
+
+
+def run(transfers=20000, batch=100, accounts=1000, balance=1000000, relay_batch=500, polls=2000, seed=42):
+    rnd = random.Random(seed)
+    account_ids = _seed(accounts, balance)
+    return {
+        "benchmark": "outbox",
+        "transfers": transfers,
+        "batch_transfers_per_s": _transfers(account_ids, transfers, batch, rnd),
+        "relay": _relay(relay_batch),
+        "polls": _polls(account_ids, polls, rnd),
+    }
+
+
+if __name__ == "__main__":
+    main(run)
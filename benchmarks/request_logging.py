@@ -0,0 +1,75 @@
+"""
+API request logging overhead benchmark.
+
+Posts ``transfers`` random transfers through ``/transactions/make/`` with the in-process test client
+and reports p50/p95/p99 latency with API request logging enabled, as configured by ``sink``, and
+disabled. The writer is closed, flushing every record, before its counters are reported.
+"""
+
+import os
+import random
+import tempfile
+from decimal import Decimal
+
+from benchmarks import Timer, main, percentile
+
+
+def _seed(accounts, balance):
+    from account.models import BankAccount, Customer
+
+    customer = Customer.objects.create(name="bench-request-logging-%s" % Customer.objects.count())
+    BankAccount.objects.bulk_create([BankAccount(owner=customer, balance=balance) for _ in range(accounts)])
+    return list(BankAccount.objects.filter(owner=customer).values_list("pk", flat=True))
+
+
+def _transfer_latencies(client, account_ids, transfers, rnd):
+    latencies = []
+    with Timer() as total:
+        for _ in range(transfers):
+            sender_id, recipient_id = rnd.sample(account_ids, 2)
+            data = {
+                "from_banking_account": sender_id,
+                "to_banking_account": recipient_id,
+                "deposit_amount": str(Decimal(rnd.randint(1, 1000)) / 100)
+            }
+            with Timer() as timer:
+                response = client.post("/transactions/make/", data, content_type="application/json")
+            assert response.status_code == 200, response.content
+            latencies.append(timer.elapsed)
+
+    return {
+        "transfers_per_s": round(transfers / total.elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def run(transfers=2000, accounts=100, balance=100000, sink="database", seed=42):
+    from django.test import Client, override_settings
+
+    from account import request_log
+
+    client = Client()
+    rnd = random.Random(seed)
+
+    with override_settings(API_LOG_SINK=None):
+        disabled = _transfer_latencies(client, _seed(accounts, balance), transfers, rnd)
+
+    with tempfile.TemporaryDirectory() as log_dir, \
+            override_settings(API_LOG_SINK=sink, API_LOG_FILE=os.path.join(log_dir, "api.ndjson")):
+        enabled = _transfer_latencies(client, _seed(accounts, balance), transfers, rnd)
+        request_log.writer.close()
+
+    return {
+        "benchmark": "request_logging",
+        "transfers": transfers,
+        "sink": sink,
+        "logging_disabled": disabled,
+        "logging_enabled": enabled,
+        "log_stats": request_log.writer.stats(),
+    }
+
+
+if __name__ == "__main__":
+    main(run)
@@ -0,0 +1,71 @@
+"""
+Serializer vs. fast-path encoding of transaction history rows.
+
+Seeds ``rows`` transactions and renders them ``repeat`` times both ways: model instances through
+``TransactionHistoryResponseSerializer`` and ``JSONRenderer``, and ``values_list`` rows through
+``account.encoders.RowEncoder``. Rows per second are reported for the encoding alone and including
+the query, the outputs are checked to be byte-identical.
+"""
+
+from benchmarks import Timer, main
+
+
+def _serializer_path(queryset):
+    from rest_framework.renderers import JSONRenderer
+
+    from account.serializers import TransactionHistoryResponseSerializer
+
+    with Timer() as query:
+        rows = list(queryset)
+    with Timer() as encoding:
+        content = JSONRenderer().render(TransactionHistoryResponseSerializer(rows, many=True).data)
+    return content, query.elapsed, encoding.elapsed
+
+
+def _fast_path(queryset):
+    from account.serializers import TRANSACTION_HISTORY_ENCODER
+
+    with Timer() as query:
+        rows = list(TRANSACTION_HISTORY_ENCODER.rows(queryset))
+    with Timer() as encoding:
+        content = TRANSACTION_HISTORY_ENCODER.encode_many(rows)
+    return content, query.elapsed, encoding.elapsed
+
+
+def run(rows=50000, repeat=5):
+    from account.models import BankAccount, Customer, Transaction
+
+    customer = Customer.objects.create(name="bench-serialization")
+    account = BankAccount.objects.create(owner=customer, balance=0)
+    counterparty = BankAccount.objects.create(owner=customer, balance=0)
+    Transaction.objects.bulk_create([
+        Transaction(sender_account_id=account.pk, recipient_account_id=counterparty.pk, amount=i % 10000 / 100)
+        for i in range(rows)
+    ], batch_size=1000)
+    queryset = Transaction.objects.order_by("date", "id")
+
+    results = {"benchmark": "serialization", "rows": rows}
+    outputs = {}
+    for name, path in (("serializer", _serializer_path), ("fast_path", _fast_path)):
+        query_time = encoding_time = 0.0
+        for _ in range(repeat):
+            outputs[name], query, encoding = path(queryset)
+            query_time += query
+            encoding_time += encoding
+        results[name] = {
+            "encoding_rows_per_s": round(rows * repeat / encoding_time),
+            "total_rows_per_s": round(rows * repeat / (query_time + encoding_time)),
+        }
+
+    results["identical"] = outputs["serializer"] == outputs["fast_path"]
+    results["encoding_speedup"] = round(
+        results["fast_path"]["encoding_rows_per_s"] / results["serializer"]["encoding_rows_per_s"], 1
+    )
+    results["total_speedup"] = round(
+        results["fast_path"]["total_rows_per_s"] / results["serializer"]["total_rows_per_s"], 1
+    )
+    return results
+
+
+if __name__ == "__main__":
+    main(run)
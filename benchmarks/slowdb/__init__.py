@@ -0,0 +1,7 @@
+"""
+Deliberately slow database backend for benchmarks.
+
+Wraps the backend named by ``SLOW_DB_ENGINE`` (SQLite by default) and sleeps ``SLOW_DB_LATENCY_MS``
+before every statement, emulating a remote or overloaded database. Select it with
+``SQL_ENGINE=benchmarks.slowdb``.
+"""
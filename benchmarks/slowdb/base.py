@@ -0,0 +1,19 @@
+import importlib
+import os
+import time
+
+_backend = importlib.import_module(os.environ.get("SLOW_DB_ENGINE", "django.db.backends.sqlite3") + ".base")
+
+LATENCY = float(os.environ.get("SLOW_DB_LATENCY_MS", 20)) / 1000
+
+
+def _delay(execute, sql, params, many, context):
+    time.sleep(LATENCY)
+    return execute(sql, params, many, context)
+
+
+class DatabaseWrapper(_backend.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.execute_wrappers.append(_delay)
@@ -0,0 +1,99 @@
+"""
+Statement export benchmark.
+
+Grows the history of a single account and measures throughput and peak Python memory of its CSV
+statement, plain and gzipped, through ``/accounts/<id>/statement/`` next to the unpaginated
+``get-history`` list clients reformatted before: the statement should stay flat as the history grows.
+Then exports the statements of ``accounts`` accounts with ``export_statements`` in this process and
+with ``workers`` worker processes.
+"""
+
+import random
+import tempfile
+import tracemalloc
+from io import StringIO
+
+from benchmarks import Timer, main
+
+SINCE = "2000-01-01T00:00:00Z"
+
+MODES = {
+    "history_list": ("/accounts/%s/get-history/", {}),
+    "statement_csv": ("/accounts/%s/statement/", {"since": SINCE}),
+    "statement_csv_gzip": ("/accounts/%s/statement/", {"since": SINCE, "gzip": "true"}),
+}
+
+
+def _grow_history(account_id, counterparty_id, rows):
+    from account.models import Transaction
+
+    Transaction.objects.bulk_create([
+        Transaction(sender_account_id=account_id, recipient_account_id=counterparty_id, amount=1)
+        for _ in range(rows)
+    ], batch_size=1000)
+
+
+def _measure(client, uri, params, rows):
+    tracemalloc.start()
+    with Timer() as timer:
+        response = client.get(uri, params, HTTP_ACCEPT_ENCODING="gzip")
+        size = sum(len(chunk) for chunk in response.streaming_content) if response.streaming else len(response.content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert response.status_code == 200, response.status_code
+
+    return {"rows_per_s": round(rows / timer.elapsed, 1), "peak_kb": round(peak / 1024, 1), "bytes": size}
+
+
+def _export(accounts, transactions, workers, seed):
+    from django.core.management import call_command
+
+    from account.models import BankAccount, Customer
+
+    customer = Customer.objects.create(name="bench-statements-export")
+    BankAccount.objects.bulk_create([BankAccount(owner=customer, balance=0) for _ in range(accounts)])
+    account_ids = list(BankAccount.objects.filter(owner=customer).values_list("pk", flat=True))
+    rnd = random.Random(seed)
+    for _ in range(transactions // 1000):
+        from account.models import Transaction
+
+        Transaction.objects.bulk_create([
+            Transaction(sender_account_id=sender_id, recipient_account_id=recipient_id, amount=1)
+            for sender_id, recipient_id in (rnd.sample(account_ids, 2) for _ in range(1000))
+        ])
+
+    results = {}
+    for processes in (0, workers):
+        with tempfile.TemporaryDirectory() as directory, Timer() as timer:
+            call_command(
+                "export_statements", "--since", SINCE, "--accounts", *map(str, account_ids), "--directory", directory,
+                "--gzip", "--workers", str(processes), stdout=StringIO()
+            )
+        results["workers_%s" % processes] = {"accounts_per_s": round(accounts / timer.elapsed, 1)}
+    return results
+
+
+def run(sizes="10000,100000", accounts=2000, transactions=100000, workers=4, seed=42):
+    from django.test import Client
+
+    from account.models import BankAccount, Customer
+
+    client = Client()
+    customer = Customer.objects.create(name="bench-statements")
+    account = BankAccount.objects.create(owner=customer, balance=0)
+    counterparty = BankAccount.objects.create(owner=customer, balance=0)
+
+    results = {"benchmark": "statements", "sizes": {}}
+    rows = 0
+    for size in sorted(int(size) for size in sizes.split(",")):
+        _grow_history(account.pk, counterparty.pk, size - rows)
+        rows = size
+        results["sizes"][size] = {
+            mode: _measure(client, uri % account.pk, params, size) for mode, (uri, params) in MODES.items()
+        }
+    results["export"] = _export(accounts, transactions, workers, seed)
+    return results
+
+
+if __name__ == "__main__":
+    main(run)
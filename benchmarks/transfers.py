@@ -0,0 +1,120 @@
+"""
+Concurrency benchmark for the transfer engine.
+
+Many threads hammer the same few hot accounts with random transfers. The run asserts that money is
+conserved (the total balance never changes, every account matches its recorded transactions and
+its ledger when ``LEDGER_ENTRIES`` is on) and that the achieved throughput is above ``min_tps``.
+"""
+
+import random
+import threading
+from collections import defaultdict
+from decimal import Decimal
+
+from benchmarks import Timer, main, percentile
+
+CENT = Decimal("0.01")
+
+
+def _total_balance(account_ids):
+    from django.db.models import Sum
+
+    from account.models import BankAccount
+
+    # SQLite aggregates decimals as floats, so round back to cents before comparing
+    total = BankAccount.objects.filter(pk__in=account_ids).aggregate(total=Sum("balance"))["total"]
+    return Decimal(total).quantize(CENT)
+
+
+def run(threads=8, transfers=200, accounts=4, balance=1000, min_tps=0.0, seed=42):
+    from django.conf import settings
+    from django.db import connection, close_old_connections
+    from django.db.models import Sum
+
+    from account.ledger import open_ledgers, verify_ledger
+    from account.models import BankAccount, Customer, Transaction
+    from account.transfers import InsufficientFunds, make_transfer
+
+    customer = Customer.objects.create(name="bench-transfers")
+    created = [BankAccount.objects.create(owner=customer, balance=balance) for _ in range(accounts)]
+    open_ledgers(created)
+    account_ids = [account.pk for account in created]
+    initial_total = _total_balance(account_ids)
+
+    latencies = []
+    outcomes = defaultdict(int)
+    errors = []
+    lock = threading.Lock()
+
+    def worker(worker_seed):
+        rnd = random.Random(worker_seed)
+        local_latencies = []
+        local_outcomes = defaultdict(int)
+        try:
+            for _ in range(transfers):
+                sender_id, recipient_id = rnd.sample(account_ids, 2)
+                amount = Decimal(rnd.randint(1, 5000)) / 100
+                with Timer() as timer:
+                    try:
+                        make_transfer(sender_id, recipient_id, amount)
+                        local_outcomes["ok"] += 1
+                    except InsufficientFunds:
+                        local_outcomes["insufficient_funds"] += 1
+                local_latencies.append(timer.elapsed)
+        except Exception as e:
+            with lock:
+                errors.append(repr(e))
+        finally:
+            connection.close()
+            with lock:
+                latencies.extend(local_latencies)
+                for key, value in local_outcomes.items():
+                    outcomes[key] += value
+
+    close_old_connections()
+    workers = [threading.Thread(target=worker, args=(seed + i,)) for i in range(threads)]
+    with Timer() as timer:
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+    assert not errors, "Transfers failed: %s" % errors[:5]
+
+    final_total = _total_balance(account_ids)
+    assert final_total == initial_total, "Total balance changed: %s != %s" % (final_total, initial_total)
+
+    recorded = Transaction.objects.filter(sender_account__in=account_ids).count()
+    assert recorded == outcomes["ok"], "Recorded %s transactions for %s transfers" % (recorded, outcomes["ok"])
+
+    for account in BankAccount.objects.filter(pk__in=account_ids):
+        sent = Transaction.objects.filter(sender_account=account).aggregate(total=Sum("amount"))["total"] or 0
+        received = Transaction.objects.filter(recipient_account=account).aggregate(total=Sum("amount"))["total"] or 0
+        expected = (Decimal(balance) - sent + received).quantize(CENT)
+        assert account.balance.amount == expected, "Account %s balance %s != %s" % (account.pk, account.balance.amount, expected)
+
+    if settings.LEDGER_ENTRIES:
+        mismatches = list(verify_ledger())
+        assert not mismatches, "Ledger does not reconcile: %s" % mismatches[:5]
+
+    attempted = threads * transfers
+    tps = attempted / timer.elapsed if timer.elapsed else 0.0
+    assert tps >= min_tps, "Throughput %.1f transfers/s is below %.1f" % (tps, min_tps)
+
+    return {
+        "benchmark": "transfers",
+        "vendor": connection.vendor,
+        "threads": threads,
+        "accounts": accounts,
+        "attempted": attempted,
+        "succeeded": outcomes["ok"],
+        "insufficient_funds": outcomes["insufficient_funds"],
+        "elapsed_s": round(timer.elapsed, 4),
+        "transfers_per_s": round(tps, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+if __name__ == "__main__":
+    main(run)
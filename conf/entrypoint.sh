@@ -13,5 +13,6 @@ fi
 
 python manage.py flush --no-input
 python manage.py migrate
+python manage.py load_exchange_rates
 
 exec "$@"
\ No newline at end of file
@@ -0,0 +1,36 @@
+import os
+
+bind = "0.0.0.0:8000"
+workers = int(os.environ.get("GUNICORN_WORKERS", 1))
+
+# ASYNC_READ_ENDPOINTS switches to uvicorn workers running the ASGI application, so slow read
+# queries wait on the event loop instead of holding a whole sync worker
+if int(os.environ.get("ASYNC_READ_ENDPOINTS", 0)):
+    wsgi_app = "mock_api.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+else:
+    wsgi_app = "mock_api.wsgi:application"
+
+
+def on_starting(server):
+    # Counters start from zero with every server start, workers of the previous run are gone
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mock_api.settings")
+    from account.metrics import clear_metrics_dir
+    clear_metrics_dir()
+
+
+def post_worker_init(worker):
+    # Connections opened here are reused by requests with SQL_CONN_MAX_AGE or SQL_POOL only
+    from django.conf import settings
+    if settings.DB_WARMUP:
+        from account.connections import warm_up_connections
+        for alias, elapsed in warm_up_connections().items():
+            worker.log.info("Warmed up the '%s' database connection in %.1f ms", alias, elapsed * 1000)
+
+
+def worker_exit(server, worker):
+    # Flush buffered API request logs and metrics before the worker goes away
+    from account.metrics import registry
+    from account.request_log import writer
+    writer.close()
+    registry.flush(force=True)
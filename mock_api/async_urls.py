@@ -0,0 +1,15 @@
+from django.urls import re_path
+
+from account import async_views
+from mock_api.urls import urlpatterns as sync_urlpatterns
+
+# Async-native read endpoints take precedence over the same routes of the sync viewsets,
+# the lookup pattern matches the one of the router
+urlpatterns = [
+    re_path(r'^accounts/(?P<pk>[^/.]+)/get-balance/$', async_views.get_balance, name='accounts-get-balance'),
+    re_path(r'^accounts/(?P<pk>[^/.]+)/get-history/$', async_views.get_history, name='accounts-get-history'),
+    re_path(r'^accounts/(?P<pk>[^/.]+)/events/$', async_views.get_events, name='accounts-get-events'),
+    re_path(r'^accounts/(?P<pk>[^/.]+)/statement/$', async_views.get_account_statement, name='accounts-get-statement'),
+    re_path(r'^customers/(?P<pk>[^/.]+)/accounts-balances/$', async_views.get_balances, name='customers-get-balances'),
+    re_path(r'^customers/(?P<pk>[^/.]+)/statement/$', async_views.get_customer_statement, name='customers-get-statement'),
+] + sync_urlpatterns
@@ -18,13 +18,14 @@ INSTALLED_APPS = [
     'django_extensions',
     'djmoney',
     'rest_framework',
-    'drf_api_logger',
     'drf_spectacular',
 
     'account.apps.AccountConfig',
 ]
 
 MIDDLEWARE = [
+    'account.metrics.MetricsMiddleware',
+    'account.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -32,10 +33,13 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'drf_api_logger.middleware.api_logger_middleware.APILoggerMiddleware'
+    'account.request_log.ApiRequestLogMiddleware'
 ]
 
-ROOT_URLCONF = 'mock_api.urls'
+# Serve read endpoints with async-native views, only useful under an ASGI server (see conf/gunicorn.conf.py)
+ASYNC_READ_ENDPOINTS = int(os.environ.get("ASYNC_READ_ENDPOINTS", default=0))
+
+ROOT_URLCONF = 'mock_api.async_urls' if ASYNC_READ_ENDPOINTS else 'mock_api.urls'
 
 TEMPLATES = [
     {
@@ -54,6 +58,9 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'mock_api.wsgi.application'
+ASGI_APPLICATION = 'mock_api.asgi.application'
+CONN_MAX_AGE = os.environ.get("SQL_CONN_MAX_AGE", "0")
+
 DATABASES = {
     'default': {
         "ENGINE": os.environ.get("SQL_ENGINE", "django.db.backends.sqlite3"),
@@ -62,9 +69,67 @@ DATABASES = {
         "PASSWORD": os.environ.get("SQL_PASSWORD", "password"),
         "HOST": os.environ.get("SQL_HOST", "localhost"),
         "PORT": os.environ.get("SQL_PORT", "5432"),
+        # Seconds a connection is kept for later requests, 0 closes it at the end of every request and an
+        # empty value keeps it for good. Health checks ping a reused connection before a request uses it.
+        "CONN_MAX_AGE": int(CONN_MAX_AGE) if CONN_MAX_AGE else None,
+        "CONN_HEALTH_CHECKS": bool(int(os.environ.get("SQL_CONN_HEALTH_CHECKS", 1))),
     },
 }
 
+# In-process psycopg connection pool (PostgreSQL with psycopg 3 only), meant for the ASGI application where
+# requests run on many threads and persistent connections aren't reused. It replaces persistent connections.
+if int(os.environ.get("SQL_POOL", 0)) and DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"] = {"pool": {
+        "min_size": int(os.environ.get("SQL_POOL_MIN_SIZE", 2)),
+        "max_size": int(os.environ.get("SQL_POOL_MAX_SIZE", 10)),
+        "timeout": float(os.environ.get("SQL_POOL_TIMEOUT", 10)),
+    }}
+
+# Read replicas, comma separated "host[:port]" of PostgreSQL standbys or database file names with SQLite, see
+# account.replicas. Tests read from the test database through them.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(filter(None, os.environ.get("SQL_REPLICAS", "").split(",")), 1):
+    alias = "replica_%s" % index
+    DATABASES[alias] = dict(DATABASES["default"], TEST={"MIRROR": "default"})
+    if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+        DATABASES[alias]["NAME"] = replica
+    else:
+        host, _, port = replica.partition(":")
+        DATABASES[alias].update(HOST=host, PORT=port or DATABASES["default"]["PORT"])
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["account.replicas.ReplicaRouter"]
+
+# URL names of the read-only endpoints served from replicas, and seconds a client which has just written
+# reads from the primary
+REPLICA_READ_VIEWS = set(filter(None, os.environ.get(
+    "REPLICA_READ_VIEWS", "accounts-get-history,customers-get-balances,customers-get-summary,customers-get-summaries"
+).split(",")))
+REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", 5))
+
+# Opens database connections when a gunicorn worker starts instead of within its first request
+DB_WARMUP = int(os.environ.get("DB_WARMUP", 0))
+
+# Balances are cached only when a shared cache backend is configured: a per-process cache would be
+# invalidated by the worker making a transfer only, other gunicorn workers would keep stale balances.
+BALANCE_CACHE_BACKEND = os.environ.get("BALANCE_CACHE_BACKEND", "django.core.cache.backends.dummy.DummyCache")
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'balances': {
+        'BACKEND': BALANCE_CACHE_BACKEND,
+        'LOCATION': os.environ.get("BALANCE_CACHE_LOCATION", "balances"),
+        'TIMEOUT': int(os.environ.get("BALANCE_CACHE_TIMEOUT", 30)),
+        'KEY_PREFIX': 'balances',
+    },
+}
+if not BALANCE_CACHE_BACKEND.endswith("RedisCache"):
+    # Redis is bounded by its own maxmemory/LRU policy, local backends cull above MAX_ENTRIES
+    CACHES['balances']['OPTIONS'] = {'MAX_ENTRIES': int(os.environ.get("BALANCE_CACHE_MAX_ENTRIES", 10000))}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -90,7 +155,85 @@ STATIC_URL = '/static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-DRF_API_LOGGER_DATABASE = True
+# Currencies money can be held in, django-money limits currency choices to them and account.currencies
+# stores them as ISO 4217 numeric codes. Changing it changes the choices, run makemigrations afterwards.
+CURRENCIES = ("GBP", "EUR", "USD")
+
+# Exchange rates of transfers between accounts held in different currencies (see account.exchange), loaded
+# from EXCHANGE_RATES_FILE by load_exchange_rates. Processes check for newly loaded rates at most every
+# EXCHANGE_RATES_REFRESH_INTERVAL seconds.
+EXCHANGE_RATES_FILE = os.environ.get("EXCHANGE_RATES_FILE", os.path.join(BASE_DIR, "conf", "exchange_rates.csv"))
+EXCHANGE_RATES_REFRESH_INTERVAL = float(os.environ.get("EXCHANGE_RATES_REFRESH_INTERVAL", 60))
+
+# API request log, written in batches from a background thread (see account.request_log).
+# "database", "ndjson" (rotating file at API_LOG_FILE) or empty to disable logging.
+API_LOG_SINK = os.environ.get("API_LOG_SINK", "database")
+API_LOG_FILE = os.environ.get("API_LOG_FILE", os.path.join(BASE_DIR, "logs", "api.ndjson"))
+API_LOG_QUEUE_SIZE = int(os.environ.get("API_LOG_QUEUE_SIZE", 10000))
+API_LOG_BATCH_SIZE = int(os.environ.get("API_LOG_BATCH_SIZE", 500))
+API_LOG_FLUSH_INTERVAL = float(os.environ.get("API_LOG_FLUSH_INTERVAL", 2.0))
+# Share of successful requests still logged while the queue is under pressure
+API_LOG_PRESSURE_SAMPLE_RATE = float(os.environ.get("API_LOG_PRESSURE_SAMPLE_RATE", 0.1))
+
+# Per-route request metrics served on /metrics in the Prometheus format (see account.metrics).
+# With several gunicorn workers METRICS_DIR must point to a directory shared by them.
+METRICS_ENABLED = int(os.environ.get("METRICS_ENABLED", default=0))
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 1.0))
+
+TEST_RUNNER = 'mock_api.test_runner.TestRunner'
+
+TRANSACTIONS_BATCH_MAX_SIZE = int(os.environ.get("TRANSACTIONS_BATCH_MAX_SIZE", 10000))
+ONBOARDING_BATCH_MAX_SIZE = int(os.environ.get("ONBOARDING_BATCH_MAX_SIZE", 10000))
+
+# Hot banking accounts whose balance is split into shards, see account.shards, e.g. "42:16,43:8" gives
+# account 42 sixteen shards. Run sync_balance_shards after changing it.
+BALANCE_SHARDS = {
+    int(account): int(shards) for account, shards in
+    (item.split(":") for item in filter(None, os.environ.get("BALANCE_SHARDS", "").split(",")))
+}
+
+# Transfers write a debit and a credit LedgerEntry and new accounts an opening one, see account.ledger. Nothing
+# reads them on the request path, they are an audit trail for verify_ledger, off by default to spare the inserts
+LEDGER_ENTRIES = int(os.environ.get("LEDGER_ENTRIES", default=0))
+
+# Transactional outbox (see account.outbox): every transaction writes an event in its database transaction,
+# relay_outbox publishes them to OUTBOX_SINK, "file:<path>" (NDJSON) or "socket:<path>" (Unix socket), and
+# /accounts/<id>/events/ streams them as Server-Sent Events
+OUTBOX_ENABLED = int(os.environ.get("OUTBOX_ENABLED", default=1))
+OUTBOX_SINK = os.environ.get("OUTBOX_SINK", "file:" + os.path.join(BASE_DIR, "logs", "events.ndjson"))
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", 500))
+# Hours events are kept once every consumer got them, purge_outbox deletes older ones
+OUTBOX_RETENTION_HOURS = int(os.environ.get("OUTBOX_RETENTION_HOURS", 72))
+# Event streams look for new events every EVENTS_POLL_INTERVAL seconds, send a comment every
+# EVENTS_HEARTBEAT_INTERVAL seconds without events and end after EVENTS_STREAM_SECONDS, clients reconnect
+# with the Last-Event-ID header
+EVENTS_POLL_INTERVAL = float(os.environ.get("EVENTS_POLL_INTERVAL", 1.0))
+EVENTS_HEARTBEAT_INTERVAL = float(os.environ.get("EVENTS_HEARTBEAT_INTERVAL", 15.0))
+EVENTS_STREAM_SECONDS = float(os.environ.get("EVENTS_STREAM_SECONDS", 300.0))
+
+# Seconds a response stored for an Idempotency-Key is replayed, purge_idempotency_keys deletes expired ones
+IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))
+
+HISTORY_PAGE_SIZE = int(os.environ.get("HISTORY_PAGE_SIZE", 100))
+HISTORY_MAX_PAGE_SIZE = int(os.environ.get("HISTORY_MAX_PAGE_SIZE", 1000))
+
+# Customers a single bulk portfolio summary request may ask for
+SUMMARY_MAX_CUSTOMERS = int(os.environ.get("SUMMARY_MAX_CUSTOMERS", 1000))
+
+# Routes encoding rows straight to JSON instead of going through their serializers (see account.encoders),
+# the output is the same. Comma-separated route names, empty to always use the serializers.
+FAST_SERIALIZATION_VIEWS = set(filter(None, os.environ.get("FAST_SERIALIZATION_VIEWS", "accounts-get-history").split(",")))
+
+# Monthly transaction partitions (PostgreSQL) created ahead of time by create_transaction_partitions, and months
+# of transactions older than TRANSACTION_ARCHIVE_AFTER_MONTHS moved to TRANSACTION_ARCHIVE_DIR by archive_transactions
+TRANSACTION_PARTITIONS_AHEAD = int(os.environ.get("TRANSACTION_PARTITIONS_AHEAD", 3))
+TRANSACTION_ARCHIVE_AFTER_MONTHS = int(os.environ.get("TRANSACTION_ARCHIVE_AFTER_MONTHS", 12))
+TRANSACTION_ARCHIVE_DIR = os.environ.get("TRANSACTION_ARCHIVE_DIR", os.path.join(BASE_DIR, "archive"))
+
+# Directory export_statements writes statement files to, and its number of worker processes (CPUs by default)
+STATEMENTS_DIR = os.environ.get("STATEMENTS_DIR", os.path.join(BASE_DIR, "statements"))
+STATEMENT_EXPORT_WORKERS = int(os.environ.get("STATEMENT_EXPORT_WORKERS", os.cpu_count() or 1))
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
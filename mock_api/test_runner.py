@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Test runner with API request logging turned off.
+
+    The log writer thread would write to the test database concurrently with the test transactions,
+    tests of the request log enable it explicitly.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.API_LOG_SINK = ""
@@ -1,9 +1,11 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 
 from rest_framework import routers, permissions
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
+from account.metrics import metrics_view
 from account.views import BankingAccountsViewSet, CustomersViewSet, TransactionsViewSet
 
 router = routers.SimpleRouter()
@@ -20,3 +22,6 @@ urlpatterns = [
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/schema/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui')
 ]
+
+if settings.METRICS_ENABLED:
+    urlpatterns.append(path('metrics', metrics_view, name='metrics'))